@@ -0,0 +1,75 @@
+import os
+
+# MongoDB Community localhost (override with LAPD_MONGO_URI)
+MONGO_URI = os.environ.get("LAPD_MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.environ.get("LAPD_MONGO_DB", "lapd")
+
+# Connection pool shared by every router (one client per API process)
+MONGO_MAX_POOL_SIZE = int(os.environ.get("LAPD_MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("LAPD_MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("LAPD_MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("LAPD_MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("LAPD_MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+# Result cache for the full-collection analytic endpoints (Query5, Query7, Query8, Query9)
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get("LAPD_QUERY_CACHE_TTL_SECONDS", "60"))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("LAPD_QUERY_CACHE_MAX_ENTRIES", "256"))
+
+# Largest batch accepted by POST /upvotes/bulk
+UPVOTE_BULK_MAX_ITEMS = int(os.environ.get("LAPD_UPVOTE_BULK_MAX_ITEMS", "1000"))
+
+# Write-behind for report upvote counters: upvotes are stored immediately, report updates are
+# buffered and flushed as one merged update per report (bounded staleness = flush interval)
+UPVOTE_WRITE_BEHIND = os.environ.get("LAPD_UPVOTE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+UPVOTE_FLUSH_INTERVAL_SECONDS = float(os.environ.get("LAPD_UPVOTE_FLUSH_INTERVAL_SECONDS", "1.0"))
+UPVOTE_FLUSH_MAX_PENDING = int(os.environ.get("LAPD_UPVOTE_FLUSH_MAX_PENDING", "1000"))
+# Upper bound on buffered report updates while flushes keep failing (newer ones are dropped past it)
+UPVOTE_BUFFER_LIMIT = int(os.environ.get("LAPD_UPVOTE_BUFFER_LIMIT", "100000"))
+
+# Where upvote details live on the report side:
+#   "embedded" - every upvote in reports.upvotes.list (original schema)
+#   "bucketed" - fixed-size documents in `upvote_buckets`; reports keep the count and recent voters
+UPVOTE_STORAGE = os.environ.get("LAPD_UPVOTE_STORAGE", "embedded")
+UPVOTE_BUCKET_SIZE = int(os.environ.get("LAPD_UPVOTE_BUCKET_SIZE", "100"))
+UPVOTE_RECENT_VOTERS = int(os.environ.get("LAPD_UPVOTE_RECENT_VOTERS", "5"))
+
+# POST /reports/bulk (NDJSON / gzip): records validated and inserted per batch
+REPORT_BULK_BATCH_SIZE = int(os.environ.get("LAPD_REPORT_BULK_BATCH_SIZE", "1000"))
+REPORT_BULK_MAX_LINE_BYTES = int(os.environ.get("LAPD_REPORT_BULK_MAX_LINE_BYTES", str(1024 * 1024)))
+REPORT_BULK_MAX_ERRORS = int(os.environ.get("LAPD_REPORT_BULK_MAX_ERRORS", "1000"))
+
+# Keyset pagination of list-returning endpoints
+DEFAULT_PAGE_SIZE = int(os.environ.get("LAPD_DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.environ.get("LAPD_MAX_PAGE_SIZE", "500"))
+
+# /debug/* endpoints (query plans, ...). They run extra queries, so they are off by default
+DEBUG_ENDPOINTS = os.environ.get("LAPD_DEBUG_ENDPOINTS", "false").lower() in ("1", "true", "yes")
+
+# Mongo commands at least this slow are counted as slow and kept in the slow-query log (GET /metrics/slow-queries)
+SLOW_QUERY_MS = float(os.environ.get("LAPD_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("LAPD_SLOW_QUERY_LOG_SIZE", "200"))
+
+# Build the indexes of services/index_manifest.py that are missing when the API starts (never drops any).
+# Off by default: a build on a large collection holds up startup, use scripts/create_indexes.py instead
+SYNC_INDEXES_ON_STARTUP = os.environ.get("LAPD_SYNC_INDEXES_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# How report descriptions are stored:
+#   "expanded" - every report carries its area, crime, premises, weapon, status and victim labels (original schema)
+#   "compact"  - reports keep only the codes; labels live in `reference_codes` and are added at response time
+REPORT_STORAGE = os.environ.get("LAPD_REPORT_STORAGE", "expanded")
+
+# Reference tables (services/reference_codes.py) re-read the codes other processes added this often; 0 disables
+REFERENCE_REFRESH_SECONDS = float(os.environ.get("LAPD_REFERENCE_REFRESH_SECONDS", "30"))
+
+# Columnar snapshot of reports and upvotes (services/columnar.py), refreshed by scripts/build_columnar.py
+COLUMNAR_DIR = os.environ.get("LAPD_COLUMNAR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "files", "columnar"))
+# Endpoints answered from that snapshot instead of MongoDB, comma-separated (Query2, Query3, Query5, Query6)
+COLUMNAR_ENDPOINTS = [name.strip() for name in os.environ.get("LAPD_COLUMNAR_ENDPOINTS", "").split(",") if name.strip()]
+
+# Reports kept per day (and per area and day) by the Query6 leaderboards (services/leaderboard.py); 0 disables them
+LEADERBOARD_SIZE = int(os.environ.get("LAPD_LEADERBOARD_SIZE", "100"))
+
+# Probabilistic sketches behind approx=true on Query1, Query7 and Query8 (services/sketches.py), maintained on every write
+SKETCHES_ENABLED = os.environ.get("LAPD_SKETCHES", "true").lower() in ("1", "true", "yes")
+# Writes only update in-memory sketch buckets; they are written to MongoDB this often
+SKETCH_FLUSH_INTERVAL_SECONDS = float(os.environ.get("LAPD_SKETCH_FLUSH_INTERVAL_SECONDS", "5.0"))
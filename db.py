@@ -1,17 +1,87 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 
-#MongoDM Community localhost
-client = MongoClient("mongodb://localhost:27017/")
+from config import (MONGO_URI, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+                    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS)
+from services.metrics import command_metrics
 
-# Database instance
-db = client['lapd']
-
-# Define JSON Schema for the collection
+# Collection names
 collection_reports_name = "reports"
-collection_reports = db[collection_reports_name]
-
 collection_upvotes_name = "upvotes"
-collection_upvotes = db[collection_upvotes_name]
-
 collection_officer_name = "officer"
-collection_officers = db[collection_officer_name]
+collection_upvote_buckets_name = "upvote_buckets"
+
+# $sortArray, $topN and $firstN (leaderboards, sketches, officer views) need MongoDB 5.2
+MIN_SERVER_VERSION = (5, 2)
+
+
+class MongoConnection:
+    """Holds the async client used by the API. Opened/closed by main.startup_event/shutdown_event."""
+    client: AsyncMongoClient = None
+    database = None
+
+
+mongo = MongoConnection()
+
+
+async def connect_to_mongo():
+    """Open the shared async client with one tuned connection pool."""
+    if mongo.client is not None:
+        return mongo.database
+
+    mongo.client = AsyncMongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[command_metrics],  # Per-command latency and slow-query log (services/metrics.py)
+    )
+    mongo.database = mongo.client[MONGO_DB_NAME]
+    # Fail fast at startup instead of on the first request
+    await mongo.client.admin.command("ping")
+    build_info = await mongo.client.admin.command("buildInfo")
+    if tuple(build_info["versionArray"][:2]) < MIN_SERVER_VERSION:
+        raise RuntimeError(f"MongoDB {build_info['version']} is too old, the API needs "
+                           f"{'.'.join(map(str, MIN_SERVER_VERSION))} or later.")
+    return mongo.database
+
+
+async def close_mongo_connection():
+    if mongo.client is not None:
+        await mongo.client.close()
+    mongo.client = None
+    mongo.database = None
+
+
+def get_database():
+    if mongo.database is None:
+        raise RuntimeError("MongoDB connection is not initialized. Call connect_to_mongo() first.")
+    return mongo.database
+
+
+def reports_collection():
+    return get_database()[collection_reports_name]
+
+
+def upvotes_collection():
+    return get_database()[collection_upvotes_name]
+
+
+def officers_collection():
+    return get_database()[collection_officer_name]
+
+
+def upvote_buckets_collection():
+    return get_database()[collection_upvote_buckets_name]
+
+
+_sync_client = None
+
+
+def get_sync_database():
+    """Blocking client for the offline scripts (populate_db, create_indexes). Never use it inside a router."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = MongoClient(MONGO_URI)
+    return _sync_client[MONGO_DB_NAME]
@@ -1,19 +1,45 @@
 from fastapi import FastAPI, Query
-from routers import reports, upvotes, officers  # Import your routers
-from pymongo import MongoClient
+from routers import reports, upvotes, officers, debug, metrics, reference  # Import your routers
+from db import connect_to_mongo, close_mongo_connection
+from config import UPVOTE_WRITE_BEHIND, DEBUG_ENDPOINTS, SYNC_INDEXES_ON_STARTUP
+from services import index_manifest, leaderboard, officer_activity, reference_codes, sketches, time_rollups
+from services.metrics import MetricsMiddleware
+from services.officer_search import officer_search_index
+from services.upvote_buffer import upvote_buffer
 app = FastAPI(title="LAPD Report API")
+app.add_middleware(MetricsMiddleware)  # Per-route latency, in-flight requests and errors
+# Include routers
 app.include_router(reports.router)
 app.include_router(upvotes.router)
 app.include_router(officers.router)
-# Include routers
-client = MongoClient("mongodb://localhost:27017/", directConnection=True)
-db = client["lapd"]
-collection = db["reports"]
+app.include_router(metrics.router)
+app.include_router(reference.router)
+if DEBUG_ENDPOINTS:
+    app.include_router(debug.router)
 
 @app.on_event("startup")
 async def startup_event():
+    await connect_to_mongo()
+    await time_rollups.ensure_time_rollups()
+    await reference_codes.ensure_reference_codes()  # Code -> label tables, before anything expands codes
+    reference_codes.reference_codes.start()  # Picks up codes added by other processes
+    # Flag missing or conflicting indexes (metadata reads only); build them only when opted in
+    report = await index_manifest.sync_indexes(build=SYNC_INDEXES_ON_STARTUP)
+    for row in index_manifest.needs_attention(report):
+        print(f"Index {row['collection']}.{row['name']} is {row['status']} (see scripts/create_indexes.py).")
+    await officer_activity.ensure_officer_activity()
+    await leaderboard.ensure_leaderboards()  # Query6 day boards
+    await sketches.ensure_sketches()  # approx=true analytics
+    sketches.sketch_buffer.start()  # Writes the sketch updates of reports and upvotes in batches
+    await officer_search_index.load()  # Officer name search/autocomplete is served from memory
+    if UPVOTE_WRITE_BEHIND:
+        upvote_buffer.start()
     print("Application startup: MongoDB connection initialized.")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await upvote_buffer.stop()  # Flush buffered report upvotes before closing the client
+    await sketches.sketch_buffer.stop()
+    await reference_codes.reference_codes.stop()
+    await close_mongo_connection()
     print("Application shutdown: Closing MongoDB connection.")
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
@@ -25,8 +26,8 @@ class Weapon(BaseModel):
 #class for Location validation
 class LocationInfo(BaseModel):
     location: str
-    lat: float
-    lon: float
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
 #class for upvote validation
 class Upvote(BaseModel):
@@ -34,10 +35,17 @@ class Upvote(BaseModel):
     officer_email: str
     officer_badge_number: str
 
+#class for recent voter summary (bucketed upvote storage)
+class RecentVoter(BaseModel):
+    officer_name: str
+    officer_badge_number: str
+    upvote_time: Optional[datetime] = None
+
 #class for upvotes list validation
 class Upvotes(BaseModel):
     count: int = 0
     list: List[Upvote] = []
+    recent: List[RecentVoter] = []
 
 #class for report validation
 class Report(BaseModel):
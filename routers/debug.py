@@ -0,0 +1,19 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Query
+
+from services.explain import EXPLAIN_REGISTRY, explain_all
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+@router.get("/explain/")
+async def explain_queries(
+        query: Optional[List[str]] = Query(None, description="Registered query names (default: all)")
+):
+    # explain("executionStats") of every registered query with representative parameters
+    try:
+        results = await explain_all(query)
+        return {"status": "success", "ok": all(result["ok"] for result in results),
+                "registered": list(EXPLAIN_REGISTRY), "queries": results}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
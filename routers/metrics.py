@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+
+from services.metrics import command_metrics, render_metrics
+
+router = APIRouter(tags=["Metrics"])
+
+# Prometheus text exposition format 0.0.4
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # HTTP latency/in-flight/errors per route and Mongo command latency per collection and endpoint
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+@router.get("/metrics/slow-queries")
+async def slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    # Most recent Mongo commands over LAPD_SLOW_QUERY_MS, literals replaced by "?"
+    try:
+        return {"status": "success", "threshold_ms": command_metrics.slow_seconds * 1000,
+                "queries": command_metrics.slow_queries(limit)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
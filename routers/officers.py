@@ -1,23 +1,33 @@
-from random import random
+import random
+from bisect import bisect_right
+from typing import Optional
 
 from bson import ObjectId
 
-from db import collection_reports, collection_officers
+from db import officers_collection
 from fastapi import APIRouter, Query, HTTPException
 from datetime import datetime
 from models.officer_model import PoliceOfficer
+from config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from scripts.global_constant import RANKS, DEPARTMENTS
+from services.officer_search import normalize_name, officer_search_index
+from services.pagination import decode_page_token, split_page
 
 router = APIRouter(prefix="/officers", tags=["Officers"])
 
+# Sort order of /officers/find/ pages (also the key stored in its page tokens)
+FIND_OFFICERS_SORT = [("name", 1), ("_id", 1)]
+
 @router.post("/add")
 async def add_officer(officer: PoliceOfficer):
     # Ensure MongoDB connection is active
-    if collection_officers is None:
+    try:
+        collection_officers = officers_collection()
+    except RuntimeError:
         raise HTTPException(status_code=500, detail="Database connection failed.")
 
     # Check if the badge number is already assigned to another officer
-    existing_officer = collection_officers.find_one({"badge_number": officer.badge_number})
+    existing_officer = await collection_officers.find_one({"badge_number": officer.badge_number})
 
     if existing_officer:
         raise HTTPException(status_code=400, detail="Badge number already assigned to another officer.")
@@ -39,8 +49,9 @@ async def add_officer(officer: PoliceOfficer):
     }
 
     try:
-        # Insert the officer into the `officers` collection (async)
-        collection_officers.insert_one(officer_data)
+        # Insert the officer into the `officers` collection
+        await collection_officers.insert_one(officer_data)
+        officer_search_index.add(officer_data)
 
         # Convert `_id` and `date_joined` to JSON-safe format
         officer_data["_id"] = str(officer_data["_id"])
@@ -52,16 +63,33 @@ async def add_officer(officer: PoliceOfficer):
 
 
 @router.get("/find/")
-async def find_officers(name:str):
+async def find_officers(
+        name: str = Query(..., description="Part of the name; case, accents and punctuation are ignored"),
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Officers per page"),
+        page_token: Optional[str] = Query(None, description="`next_page_token` of the previous page")
+):
     # Ensure MongoDB connection is active
-    if collection_officers is None:
+    try:
+        collection_officers = officers_collection()
+    except RuntimeError:
         raise HTTPException(status_code=500, detail="Database connection failed.")
 
-    #  MongoDB Case-Insensitive Search (Using regex)
-    query = {"name": {"$regex": name, "$options": "i"}}  # Case-insensitive search
-
-    officers_cursor = collection_officers.find(query)
-    officers =  officers_cursor.to_list(length=50)  # Limit results to 50
+    try:
+        last_key = decode_page_token(page_token, FIND_OFFICERS_SORT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not normalize_name(name):  # Only punctuation or spaces: would otherwise match every officer
+        raise HTTPException(status_code=400, detail="Name must contain at least one letter or digit.")
+
+    # Substring match on normalized names answered by the in-memory name index, already in (name, _id) order
+    matches = officer_search_index.sorted_matches(name)
+    start = bisect_right(matches, (last_key["name"], last_key["_id"])) if last_key else 0
+    page_ids = [officer_id for _, officer_id in matches[start:start + page_size + 1]]
+
+    # Fetch only this page's documents by _id
+    officers_by_id = {officer["_id"]: officer async for officer in collection_officers.find({"_id": {"$in": page_ids}})}
+    officers = [officers_by_id[officer_id] for officer_id in page_ids if officer_id in officers_by_id]
+    officers, next_page_token = split_page(officers, page_size, FIND_OFFICERS_SORT)
 
     # Convert MongoDB `_id` to string
     for officer in officers:
@@ -70,4 +98,22 @@ async def find_officers(name:str):
     if not officers:
         raise HTTPException(status_code=404, detail="No officers found.")
 
-    return {"message": "Officers found.", "officers": officers}
+    return {"message": "Officers found.", "officers": officers, "page_size": page_size, "next_page_token": next_page_token}
+
+
+@router.get("/autocomplete/")
+async def autocomplete_officers(
+        prefix: str = Query(..., min_length=1, description="Start of the officer's first, last or full name"),
+        limit: int = Query(10, ge=1, le=100, description="Maximum number of suggestions")
+):
+    # Prefix lookup in the in-memory name index, no database round trip
+    return {"status": "success", "prefix": prefix, "officers": officer_search_index.autocomplete(prefix, limit)}
+
+
+@router.get("/search/")
+async def search_officers(
+        q: str = Query(..., min_length=1, description="Officer name, misspellings allowed"),
+        limit: int = Query(10, ge=1, le=100, description="Maximum number of results")
+):
+    # Ranked fuzzy (trigram similarity) match; names containing `q` rank first
+    return {"status": "success", "query": q, "officers": officer_search_index.search(q, limit)}
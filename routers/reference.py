@@ -0,0 +1,54 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services.reference_codes import reference_codes
+
+router = APIRouter(prefix="/reference", tags=["Reference data"])
+
+
+def _table(kind):
+    table = reference_codes.tables.get(kind)
+    if table is None:
+        raise HTTPException(status_code=404, detail=f"Unknown reference table '{kind}'.")
+    return table
+
+
+@router.get("/")
+async def reference_tables():
+    """Reference tables served from memory and their number of codes."""
+    return {"status": "success", "tables": {kind: len(table) for kind, table in reference_codes.tables.items()}}
+
+
+@router.get("/{kind}/")
+async def reference_table(
+        kind: str,
+        codes: Optional[List[str]] = Query(None, description="Only these codes (repeat the parameter)"),
+        q: Optional[str] = Query(None, description="Only labels containing this text (case-insensitive)")
+):
+    table = _table(kind)
+    if codes:
+        rows = []
+        for code in codes:
+            try:
+                code, label = reference_codes.lookup(kind, code)
+            except KeyError:
+                label = None
+            rows.append({"code": code, "label": label})
+    else:
+        rows = [{"code": code, "label": label} for code, label in sorted(table.items())]
+    if q:
+        rows = [row for row in rows if row["label"] and q.lower() in row["label"].lower()]
+    return {"status": "success", "kind": kind, "codes": rows}
+
+
+@router.get("/{kind}/{code}")
+async def reference_lookup(kind: str, code: str):
+    table = _table(kind)
+    if code not in table:
+        await reference_codes.ensure_known({kind: [code]})  # Maybe added by another process since the last refresh
+    try:
+        code, label = reference_codes.lookup(kind, code)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown {kind} code '{code}'.")
+    return {"status": "success", "kind": kind, "code": code, "label": label}
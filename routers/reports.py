@@ -1,380 +1,738 @@
-from db import collection_reports
-from fastapi import APIRouter, Query
-from datetime import datetime
+import asyncio
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from db import reports_collection, collection_reports_name
+from fastapi import APIRouter, Query, Request
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from config import (REPORT_BULK_BATCH_SIZE, REPORT_BULK_MAX_LINE_BYTES, REPORT_BULK_MAX_ERRORS, DEFAULT_PAGE_SIZE,
+                    MAX_PAGE_SIZE, LEADERBOARD_SIZE)
 
 from models.report_model import Report
+from scripts import geo_utils, time_utils
+from services import columnar, leaderboard, sketches, time_rollups
+from services.geo import heatmap_cell
+from services.ndjson import iter_ndjson_lines, ndjson_response, wants_ndjson
+from services.explain import aggregate_command, find_command, register_explain
+from services.officer_activity import (officer_activity_collection, officer_email_links_collection,
+                                       collection_officer_activity_name, collection_officer_email_links_name)
+from services.columnar import columnar_snapshots, snapshot_info
+from services.pagination import decode_page_token, keyset_filter, rows_after, split_page
+from services.query_cache import cached_aggregate, query_cache
+from services.reference_codes import prepare_reports, reference_codes
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
+# Sort orders of the paginated endpoints (also the key stored in their page tokens)
+QUERY2_SORT = [("date_occ", 1)]
+QUERY5_SORT = [("area_count", -1), ("crm_cd", 1), ("weapon_used_cd", 1)]
+QUERY6_SORT = [("upvotes.count", -1), ("dr_no", 1)]
+QUERY8_SORT = [("area_count", -1)]
+QUERY9_SORT = [("officer_email", 1)]
+WITHIN_SORT = [("dr_no", 1)]
+# Select only necessary fields (codes are projected too, compact reports get their labels from reference_codes)
+QUERY6_PROJECTION = {"_id": 0, "dr_no": 1, "date_occ": 1, "area": 1, "area_name": 1, "upvotes.count": 1}
+QUERY8_PROJECTION = {"officer_name": 1, "officer_email": 1, "areas": 1, "area_count": 1}
+SPATIAL_PROJECTION = {"_id": 0, "dr_no": 1, "date_occ": 1, "area": 1, "area_name": 1, "crm_codes.crime_codes": 1,
+                      "crm_codes.crm_cd_desc": 1,
+                      "location_info.location": 1, "location_info.lat": 1, "location_info.lon": 1}
+
+async def crime_rows(rows):
+    """Rows keyed by `crm_cd`, with the crime description from the in-memory reference tables."""
+    await reference_codes.ensure_known({"crime": [row["crm_cd"] for row in rows]})
+    return [reference_codes.with_crime_desc(row) for row in rows]
+
 @router.get("/Query1/")
-async def query1(start_time: str, end_time: str):
+async def query1(
+        request: Request,
+        start_time: str,
+        end_time: str,
+        approx: bool = Query(False, description="Estimate from the write-time sketches, with error bounds"),
+        start_date: Optional[str] = Query(None, description="First day (MM/DD/YYYY), approx=true only"),
+        end_date: Optional[str] = Query(None, description="Last day, inclusive (MM/DD/YYYY), approx=true only")
+):
     if not (start_time.isdigit() and end_time.isdigit() and len(start_time) == 4 and len(end_time) == 4):
         raise ValueError("Invalid time format. Use HHMM (e.g., 0000, 2330).")
     try:
-        # Aggregation Pipeline
-        pipeline = [
-            {
-                "$match": {  # Filter reports by time range
-                    "time_occ": {"$gte": start_time, "$lte": end_time}
-                }
-            },
-            {
-                "$unwind": "$crm_codes.crime_codes"  # Separate each crime code into a new document
-            },
-            {
-                "$group": {  #Count occurrences of each crime code
-                    "_id": "$crm_codes.crime_codes",
-                    "total_reports": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"total_reports": -1}  #Sort in descending order
-            },
-            {
-                "$project": {  #Format output
-                    "crm_cd": "$_id",
-                    "total_reports": 1,
-                    "_id": 0
-                }
-            }
-        ]
-        results = list(collection_reports.aggregate(pipeline))
+        start_minute, end_minute = time_utils.hhmm_to_minute(start_time), time_utils.hhmm_to_minute(end_time)
+        approx_fields = {}
+        if approx:  # Merged Count-Min sketches of the months and days in the range, by hour of day
+            results, error_bounds = await sketches.crime_counts(start_minute, end_minute,
+                                                                *sketches.sketch_range(start_date, end_date))
+            approx_fields = {"approx": True, "error_bounds": error_bounds}
+        elif start_date or end_date:
+            raise ValueError("start_date and end_date need approx=true.")
+        else:
+            # Two prefix-sum lookups per crime code instead of scanning the reports in the time range
+            results = await time_rollups.count_reports_between(start_minute, end_minute)
+        results.sort(key=lambda row: row["total_reports"], reverse=True)  #Sort in descending order
+        results = await crime_rows(results)
+        if wants_ndjson(request):
+            return ndjson_response(results)
         #Format results
-        starttm = start_time[:2] + ":" + start_time[2:4]
-        endtm = end_time[:2] + ":" + end_time[2:4]
-        return {"status": "success","Start_time":starttm,"End_time":endtm, "Number_of_reports_per_crmcd": results}
+        starttm = time_utils.format_hhmm(start_time)
+        endtm = time_utils.format_hhmm(end_time)
+        return {"status": "success","Start_time":starttm,"End_time":endtm, "Number_of_reports_per_crmcd": results,
+                **approx_fields}
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def query2_pipeline(crm_cd, start_minute, end_minute, date_range=None, after_date=None):
+    """Reports per day for one crime code in a time-of-day window (optionally within [start, end) days)."""
+    match = {  # Filter by crime code and time range
+        "crm_codes.crime_codes": crm_cd,
+        "minute_occ": {"$gte": start_minute, "$lte": end_minute}
+    }
+    if date_range:  # Optional date range on the indexed `date_occ`
+        match["date_occ"] = {"$gte": date_range[0], "$lt": date_range[1]}
+    if after_date:
+        match.setdefault("date_occ", {})["$gt"] = after_date
+
+    # Aggregation Pipeline
+    return [
+        {
+            "$match": match
+        },
+        {
+            "$group": {  # Group by date and count reports
+                "_id": "$date_occ",
+                "total_reports": {"$sum": 1}
+            }
+        },
+        {
+            "$sort": {"_id": 1}  # Sort by date (ascending)
+        },
+        {
+            "$project": {  # Format output
+                "date_occ": "$_id",
+                "total_reports": 1,
+                "_id": 0
+            }
+        }
+    ]
+
+def format_query2_row(row):
+    row["date_occ"] = row["date_occ"].strftime(time_utils.QUERY_DATE_FORMAT)
+    return row
+
 @router.get("/Query2/")
-def query2(
+async def query2(
+        request: Request,
         crm_cd: str = Query(..., description="Crime Code (e.g., 510 for Vehicle Theft)"),
         start_time: str = Query(..., description="Start of time range (e.g., 1200 for 12:00)"),
-        end_time: str = Query(..., description="End of time range (e.g., 1800 for 18:00)")
+        end_time: str = Query(..., description="End of time range (e.g., 1800 for 18:00)"),
+        start_date: Optional[str] = Query(None, description="Optional first day (MM/DD/YYYY)"),
+        end_date: Optional[str] = Query(None, description="Optional last day, inclusive (MM/DD/YYYY)"),
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Days per page"),
+        page_token: Optional[str] = Query(None, description="`next_page_token` of the previous page")
 ):
     try:
         # Validate time format (ensure it is four digits)
         if not (start_time.isdigit() and end_time.isdigit() and len(start_time) == 4 and len(end_time) == 4):
             raise ValueError("Invalid time format. Use HHMM (e.g., 0000, 2330).")
+        start_minute, end_minute = time_utils.hhmm_to_minute(start_time), time_utils.hhmm_to_minute(end_time)
 
-        # Aggregation Pipeline
-        pipeline = [
-            {
-                "$match": {  # Filter by crime code and time range
-                    "crm_codes.crime_codes": crm_cd,
-                    "time_occ": {"$gte": start_time, "$lte": end_time}
-                }
-            },
-            {
-                "$group": {  # Group by date and count reports
-                    "_id": "$date_occ",
-                    "total_reports": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}  # Sort by date (ascending)
-            },
-            {
-                "$project": {  # Format output
-                    "date_occ": "$_id",
-                    "total_reports": 1,
-                    "_id": 0
-                }
-            }
-        ]
+        date_range = time_utils.day_range(start_date or end_date, end_date) if (start_date or end_date) else None
+        # Groups are days in ascending order, so the next page only needs reports after the last day
+        last_key = decode_page_token(page_token, QUERY2_SORT)
+        snapshot = columnar_snapshots.for_endpoint("Query2")
+        if snapshot is not None:  # Vectorized over the columnar snapshot (services/columnar.py)
+            results = await asyncio.to_thread(columnar.query2, snapshot, crm_cd, start_minute, end_minute, date_range,
+                                              last_key and last_key["date_occ"])
+            if wants_ndjson(request):
+                return ndjson_response(results, format_query2_row)
+            results = results[:page_size + 1]
+        else:
+            pipeline = query2_pipeline(crm_cd, start_minute, end_minute, date_range, last_key and last_key["date_occ"])
+            if wants_ndjson(request):  # Stream every remaining day instead of one page
+                return ndjson_response(await reports_collection().aggregate(pipeline), format_query2_row)
+            pipeline.insert(-1, {"$limit": page_size + 1})  # One extra row tells whether there is a next page
 
-        # Execute Query
-        results = list(collection_reports.aggregate(pipeline))
-        starttm = start_time[:2] + ":" + start_time[2:4]
-        endtm = end_time[:2] + ":" + end_time[2:4]
-        return {"status": "success","crm_cd":crm_cd,"start_time":starttm,"end_time":endtm,f"Number of reports per day for {crm_cd}": results}
+            # Execute Query
+            cursor = await reports_collection().aggregate(pipeline)
+            results = await cursor.to_list(length=None)
+        results, next_page_token = split_page(results, page_size, QUERY2_SORT)
+        results = [format_query2_row(row) for row in results]
+        starttm = time_utils.format_hhmm(start_time)
+        endtm = time_utils.format_hhmm(end_time)
+        await reference_codes.ensure_known({"crime": [crm_cd]})
+        return {"status": "success","crm_cd":crm_cd,"crm_cd_desc":reference_codes.label("crime", crm_cd),"start_time":starttm,"end_time":endtm,f"Number of reports per day for {crm_cd}": results,
+                "page_size": page_size, "next_page_token": next_page_token, **snapshot_info(snapshot)}
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def query3_pipeline(range_start, range_end):
+    """Three most common crimes per area for the reports of [range_start, range_end)."""
+    # Aggregation Pipeline
+    return [
+        {
+            "$match": {
+                "date_occ": {"$gte": range_start, "$lt": range_end}  # Match specific day(s)
+            }
+        },
+        {
+            "$unwind": "$crm_codes.crime_codes"  # Separate each crime code into a new document
+        },
+        {
+            "$group": {  # Count occurrences of each crime per area
+                "_id": {"area": "$area", "crime": "$crm_codes.crime_codes"},  # Area code: labels are added afterwards
+                "count": {"$sum": 1}
+            }
+        },
+        {
+            "$sort": {"count": -1}  # Sort by frequency (descending)
+        },
+        {
+            "$group": {  # Group by area and keep top 3 crimes
+                "_id": "$_id.area",
+                "top_crimes": {"$push": {"crime_code": "$_id.crime", "count": "$count"}}
+            }
+        },
+        {
+            "$project": {  # Limit to top 3 crimes per area
+                "area": "$_id",
+                "top_crimes": {"$slice": ["$top_crimes", 3]},
+                "_id": 0
+            }
+        }
+    ]
+
+def format_query3_row(row):
+    """Top crimes of an area code -> Query3 row, with the area name and crime descriptions."""
+    top_crimes = [reference_codes.with_crime_desc(crime, "crime_code") for crime in row["top_crimes"]]
+    return {"area_name": reference_codes.label("area", row["area"]), **row, "top_crimes": top_crimes}
+
 @router.get("/Query3/")
-def query3(
-        date:str
+async def query3(
+        request: Request,
+        date:str,
+        end_date: Optional[str] = Query(None, description="Optional last day, inclusive (MM/DD/YYYY)")
 ):
     try:
-        # Convert input date to match stored format (e.g., "03/01/2020 12:00:00 AM")
-        formatted_date = datetime.strptime(date, "%m/%d/%Y").strftime("%m/%d/%Y")
-
-        # Aggregation Pipeline
-        pipeline = [
-            {
-                "$match": {
-                    "date_occ": {"$regex": f"^{formatted_date}"}  # Match specific day
-                }
-            },
-            {
-                "$unwind": "$crm_codes.crime_codes"  # Separate each crime code into a new document
-            },
-            {
-                "$group": {  # Count occurrences of each crime per area
-                    "_id": {"area_name": "$area_name", "crime": "$crm_codes.crime_codes"},
-                    "count": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"count": -1}  # Sort by frequency (descending)
-            },
-            {
-                "$group": {  # Group by area and keep top 3 crimes
-                    "_id": "$_id.area_name",
-                    "top_crimes": {"$push": {"crime_code": "$_id.crime", "count": "$count"}}
-                }
-            },
-            {
-                "$project": {  # Limit to top 3 crimes per area
-                    "area_name": "$_id",
-                    "top_crimes": {"$slice": ["$top_crimes", 3]},
-                    "_id": 0
-                }
-            }
-        ]
+        # Convert input date(s) to a [start, end) range on the indexed `date_occ`
+        range_start, range_end = time_utils.day_range(date, end_date)
+
+        snapshot = columnar_snapshots.for_endpoint("Query3")
+        if snapshot is not None:  # Vectorized over the columnar snapshot (services/columnar.py)
+            results = await asyncio.to_thread(columnar.query3, snapshot, range_start, range_end)
+        else:
+            pipeline = query3_pipeline(range_start, range_end)
 
-        # Execute Query
-        results = list(collection_reports.aggregate(pipeline))
-        return {"status":"success","date":date,"Three_most_common_crimes": results}
+            # Execute Query (one row per area, read whole so its codes can be resolved before streaming)
+            cursor = await reports_collection().aggregate(pipeline)
+            results = await cursor.to_list(length=None)
+        await reference_codes.ensure_known({"area": [row["area"] for row in results],
+                                            "crime": [crime["crime_code"] for row in results for crime in row["top_crimes"]]})
+        if wants_ndjson(request):
+            return ndjson_response(results, format_query3_row)
+        results = [format_query3_row(row) for row in results]
+        return {"status":"success","date":date,"end_date":end_date or date,"Three_most_common_crimes": results, **snapshot_info(snapshot)}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @router.get("/Query4/")
-def query4(start_time: str, end_time: str):
+async def query4(request: Request, start_time: str, end_time: str):
     try:
         # Validate time format (ensure it is four digits)
         if not (start_time.isdigit() and end_time.isdigit() and len(start_time) == 4 and len(end_time) == 4):
             raise ValueError("Invalid time format. Use HHMM (e.g., 0000, 2330).")
-        # Aggregation Pipeline
-        pipeline = [
-            {
-                "$match": {  # Filter reports by time range
-                    "time_occ": {"$gte": start_time, "$lte": end_time}
-                }
-            },
-            {
-                "$unwind": "$crm_codes.crime_codes"  # Separate each crime code into a new document
-            },
-            {
-                "$group": {  # Count occurrences of each crime
-                    "_id": "$crm_codes.crime_codes",
-                    "total_reports": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"total_reports": 1}  #  Sort in ascending order (least common first)
-            },
-            {
-                "$limit": 2  #  Keep only the 2 least common crimes
-            },
-            {
-                "$project": {  #  Format output
-                    "crm_cd": "$_id",
-                    "total_reports": 1,
-                    "_id": 0
-                }
-            }
-        ]
-
-        # Execute Query
-        results = list(collection_reports.aggregate(pipeline))
-        starttm = start_time[:2] + ":" + start_time[2:4]
-        endtm = end_time[:2] + ":" + end_time[2:4]
+        start_minute, end_minute = time_utils.hhmm_to_minute(start_time), time_utils.hhmm_to_minute(end_time)
+        # Two prefix-sum lookups per crime code instead of scanning the reports in the time range
+        results = await time_rollups.count_reports_between(start_minute, end_minute)
+        results.sort(key=lambda row: row["total_reports"])  #  Sort in ascending order (least common first)
+        results = await crime_rows(results[:2])  #  Keep only the 2 least common crimes
+        if wants_ndjson(request):
+            return ndjson_response(results)
+        starttm = time_utils.format_hhmm(start_time)
+        endtm = time_utils.format_hhmm(end_time)
         return {"status":"success","start_time":starttm,"end_time":endtm,"Two_least_common_crimes":results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-@router.get("/Query5/")
-def query5():
-    try:
-        pipeline = [
-            {"$unwind": "$crm_codes.crime_codes"},  # Separate each crime code
-            {
-                "$group": {  # Group by crime code, weapon, and area
-                    "_id": {
-                        "crm_cd": "$crm_codes.crime_codes",
-                        "weapon_desc": "$weapon.weapon_desc",
-                        "area_name": "$area_name"
-                    },
-                    "count": {"$sum": 1}
-                }
-            },
-            {
-                "$group": {  # Collect all areas for each crime-weapon combination
-                    "_id": {
-                        "crm_cd": "$_id.crm_cd",
-                        "weapon_desc": "$_id.weapon_desc"
-                    },
-                    "areas": {"$addToSet": "$_id.area_name"},  #  List of distinct areas
-                    "total_reports": {"$sum": "$count"}
-                }
-            },
-            {
-                "$match": {
-                    "areas.1": {"$exists": True},  # Ensure at least two different areas exist
-                    "_id.weapon_desc": {"$ne": ""}  #  Ignore empty weapon descriptions
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
+def query5_pipeline(last_key=None):
+    """Crime/weapon pairs seen in at least two areas, most widespread first (continuing after `last_key`)."""
+    pipeline = [
+        {"$unwind": "$crm_codes.crime_codes"},  # Separate each crime code
+        {
+            "$group": {  # Group by crime code, weapon, and area
+                "_id": {
+                    "crm_cd": "$crm_codes.crime_codes",
+                    "weapon_used_cd": "$weapon.weapon_used_cd",
+                    "area": "$area"
+                },
+                "count": {"$sum": 1}
+            }
+        },
+        {
+            "$group": {  # Collect all areas for each crime-weapon combination
+                "_id": {
                     "crm_cd": "$_id.crm_cd",
-                    "weapon_desc": "$_id.weapon_desc",
-                    "area_count": {"$size": "$areas"},  # Count distinct areas
-                    "total_reports": 1  # Total number of reports for the crime-weapon
-                }
-            },
-            {
-                "$sort": {"area_count": -1}  #  Sort by number of areas (descending)
+                    "weapon_used_cd": "$_id.weapon_used_cd"
+                },
+                "areas": {"$addToSet": "$_id.area"},  #  List of distinct areas
+                "total_reports": {"$sum": "$count"}
             }
-        ]
+        },
+        {
+            "$match": {
+                "areas.1": {"$exists": True},  # Ensure at least two different areas exist
+                "_id.weapon_used_cd": {"$ne": ""}  #  Ignore reports without a weapon
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "crm_cd": "$_id.crm_cd",
+                "weapon_used_cd": "$_id.weapon_used_cd",
+                "area_count": {"$size": "$areas"},  # Count distinct areas
+                "total_reports": 1  # Total number of reports for the crime-weapon
+            }
+        },
+        {
+            "$sort": dict(QUERY5_SORT)  #  Sort by number of areas (descending), ties in a stable order
+        }
+    ]
+    if last_key:
+        pipeline.append({"$match": keyset_filter(QUERY5_SORT, last_key)})  # Continue after the previous page
+    return pipeline
+
+def format_query5_row(row):
+    """Crime/weapon code pair -> Query5 row, with the crime and weapon descriptions."""
+    return {**reference_codes.with_crime_desc(row), "weapon_desc": reference_codes.label("weapon", row["weapon_used_cd"])}
 
-        results = list(collection_reports.aggregate(pipeline))
-        return {"status":"success","Weapons_used_for_same_crime":results}
+@router.get("/Query5/")
+async def query5(
+        request: Request,
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Crime/weapon pairs per page"),
+        page_token: Optional[str] = Query(None, description="`next_page_token` of the previous page")
+):
+    try:
+        last_key = decode_page_token(page_token, QUERY5_SORT)
+        snapshot = columnar_snapshots.for_endpoint("Query5")
+        if snapshot is not None:  # Computed once per snapshot generation
+            results = rows_after(await asyncio.to_thread(columnar.query5, snapshot), QUERY5_SORT, last_key)
+            if wants_ndjson(request):
+                return ndjson_response(results, format_query5_row)
+            results, cache_info = results[:page_size + 1], None
+        else:
+            pipeline = query5_pipeline(last_key)
+            if wants_ndjson(request):  # Stream every remaining row, bypassing the page limit and the cache
+                return ndjson_response(await reports_collection().aggregate(pipeline), format_query5_row)
+            pipeline.append({"$limit": page_size + 1})
+
+            results, cache_info = await cached_aggregate("query5", reports_collection(), pipeline, [collection_reports_name],
+                                                         page_size=page_size, page_token=page_token)
+        await reference_codes.ensure_known({"weapon": [row["weapon_used_cd"] for row in results],
+                                            "crime": [row["crm_cd"] for row in results]})
+        results = [format_query5_row(row) for row in results]
+        results, next_page_token = split_page(results, page_size, QUERY5_SORT)
+        return {"status":"success","Weapons_used_for_same_crime":results,"cache":cache_info,
+                "page_size": page_size, "next_page_token": next_page_token, **snapshot_info(snapshot)}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def query6_filter(range_start, range_end, single_day, last_key=None, area=None):
+    """Reports of [range_start, range_end) (of one area), continuing after `last_key` in QUERY6_SORT order."""
+    if single_day:
+        # `date_occ` is stored at midnight: an equality lets the (date_occ, upvotes.count, dr_no) index serve the sort
+        query = {"date_occ": range_start}
+    else:
+        query = {"date_occ": {"$gte": range_start, "$lt": range_end}}
+    if area is not None:
+        query["area"] = area
+    if last_key:
+        query = {"$and": [query, keyset_filter(QUERY6_SORT, last_key)]}
+    return query
+
 @router.get("/Query6/")
-def query6(date:str):
+async def query6(
+        request: Request,
+        date:str,
+        end_date: Optional[str] = Query(None, description="Optional last day, inclusive (MM/DD/YYYY)"),
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Reports per page"),
+        page_token: Optional[str] = Query(None, description="`next_page_token` of the previous page"),
+        area: Optional[int] = Query(None, description="Optional area code (e.g., 1 for Central)")
+):
     try:
-        # Convert date string to datetime object
-        specific_date = datetime.strptime(date, "%m/%d/%Y").strftime("%m/%d/%Y")
-
-        reports = collection_reports.find(
-            {"date_occ": {"$regex": f"^{specific_date}"}},
-            {"_id": 0, "dr_no": 1, "date_occ": 1, "area_name": 1, "upvotes.count": 1}  # Select only necessary fields
-        ).sort("upvotes.count", -1).limit(50)
-        # Execute Query
-        results = [dict(report) for report in reports]
-        return {"status":"success","date": date, "top_50_upvoted_reports": results}
+        # Convert date string(s) to a [start, end) datetime range
+        range_start, range_end = time_utils.day_range(date, end_date)
+        last_key = decode_page_token(page_token, QUERY6_SORT)
+        results, backend = None, {}
+        if LEADERBOARD_SIZE and not wants_ndjson(request):
+            # O(days * K) read of the maintained day boards, while the page is within their top entries
+            results = await leaderboard.top_reports(range_start, range_end, leaderboard.ALL_AREAS if area is None else area,
+                                                    last_key, page_size + 1)
+            backend = {"backend": "leaderboard"}
+        if results is None:
+            snapshot = columnar_snapshots.for_endpoint("Query6")
+            backend = snapshot_info(snapshot)
+            if snapshot is not None:  # Upvote counts come from the snapshot's upvotes table
+                limit = None if wants_ndjson(request) else page_size + 1
+                results = await asyncio.to_thread(columnar.query6, snapshot, range_start, range_end, last_key, limit, area)
+                if wants_ndjson(request):
+                    return ndjson_response(results, reference_codes.expand)
+            else:
+                query = query6_filter(range_start, range_end, single_day=not end_date, last_key=last_key, area=area)
+
+                cursor = reports_collection().find(query, QUERY6_PROJECTION).sort(QUERY6_SORT)
+                if wants_ndjson(request):  # Stream every remaining report instead of one page
+                    return ndjson_response(cursor, reference_codes.expand)
+                cursor = cursor.limit(page_size + 1)
+                # Execute Query
+                results = await cursor.to_list(length=None)
+        results = await reference_codes.expand_all(results)
+        results, next_page_token = split_page(results, page_size, QUERY6_SORT)
+        return {"status":"success","date": date, "end_date": end_date or date, "top_50_upvoted_reports": results,
+                "page_size": page_size, "next_page_token": next_page_token, **backend}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
 
+def format_query8_row(officer):
+    """officer_activity document (keyed by badge number) -> Query8 row."""
+    return {
+        "officer_name": officer.get("officer_name"),
+        "officer_email": officer.get("officer_email"),
+        "officer_badge_number": officer["_id"],
+        "area_count": officer.get("area_count", 0),
+        "distinct_areas": officer.get("areas", [])
+    }
+
 @router.get("/Query8/")
-def query8():
+async def query8(
+        request: Request,
+        approx: bool = Query(False, description="Estimate from the write-time sketches, with error bounds"),
+        start_date: Optional[str] = Query(None, description="First day of upvotes (MM/DD/YYYY), approx=true only"),
+        end_date: Optional[str] = Query(None, description="Last day, inclusive (MM/DD/YYYY), approx=true only")
+):
     try:
-        pipeline = pipeline = [
-            {
-                "$unwind": "$upvotes.list"  # Unwind upvotes to process each officer separately
-            },
-            {
-                "$group": {  # Group by officer and collect unique areas
-                    "_id": {
-                        "officer_name": "$upvotes.list.officer_name",
-                        "officer_email": "$upvotes.list.officer_email",
-                        "officer_badge_number": "$upvotes.list.officer_badge_number"
-                    },
-                    "distinct_areas": {"$addToSet": "$area_name"}  #  Collect unique areas
-                }
-            },
-            {
-                "$project": {  # Count the number of distinct areas
-                    "_id": 0,
-                    "officer_name": "$_id.officer_name",
-                    "officer_email": "$_id.officer_email",
-                    "officer_badge_number": "$_id.officer_badge_number",
-                    "area_count": {"$size": "$distinct_areas"},
-                    "distinct_areas": 1
-                }
-            },
-            {
-                "$sort": {"area_count": -1}  # Sort by number of unique areas in descending order
-            },
-            {
-                "$limit": 50  # Limit results to top 50 officers
-            }
-        ]
-
-        results = list(collection_reports.aggregate(pipeline))
+        if approx:  # Union of each officer's daily area sets (counts only, no area lists)
+            results, error_bounds = await sketches.officer_area_counts(*sketches.sketch_range(start_date, end_date))
+            if wants_ndjson(request):
+                return ndjson_response(results)
+            return {"status":"success","Top_officers_according_to_total_areas":results,"approx":True,
+                    "error_bounds":error_bounds}
+        if start_date or end_date:
+            raise ValueError("start_date and end_date need approx=true.")
+        # Top of the `area_count` index of the officer_activity view (area sets are kept per officer)
+        cursor = officer_activity_collection().find({}, QUERY8_PROJECTION).sort(QUERY8_SORT).limit(50)
+        if wants_ndjson(request):
+            return ndjson_response(cursor, format_query8_row)
+        results = [format_query8_row(officer) for officer in await cursor.to_list(length=None)]
         return {"status":"success","Top_officers_according_to_total_areas":results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def format_query9_row(links):
+    """officer_email_links document (keyed by email) -> Query9 row."""
+    return {"officer_email": links["_id"], "badge_numbers": links["badge_numbers"], "reports": links["reports"],
+            "reports_truncated": links.get("reports_truncated", False)}
+
+def query9_filter(last_key=None):
+    """Emails shared by several badge numbers, after the email of `last_key`."""
+    query = {"shared": True}
+    if last_key:
+        query["_id"] = {"$gt": last_key["officer_email"]}
+    return query
+
 @router.get("/Query9/")
-def query9():
+async def query9(
+        request: Request,
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Emails per page"),
+        page_token: Optional[str] = Query(None, description="`next_page_token` of the previous page")
+):
     try:
-        pipeline = [
-            {
-                "$unwind": "$upvotes.list"  # Separate each upvote into individual documents
-            },
-            {
-                "$group": {  # Group by officer email and badge number
-                    "_id": {
-                        "officer_email": "$upvotes.list.officer_email",
-                        "officer_badge_number": "$upvotes.list.officer_badge_number"
-                    },
-                    "reports": {"$addToSet": "$dr_no"}  # Collect report numbers (DR numbers)
-                }
-            },
-            {
-                "$group": {  # Group again by email, collecting badge numbers
-                    "_id": "$_id.officer_email",
-                    "badge_numbers": {"$addToSet": "$_id.officer_badge_number"},
-                    "reports": {"$push": "$reports"}  # Collect all related reports
-                }
-            },
-            {
-                "$match": {  # Ensure the email is linked to more than one badge number
-                    "badge_numbers.1": {"$exists": True}
-                }
-            },
-            {
-                "$project": {  # Format output
-                    "_id": 0,
-                    "officer_email": "$_id",
-                    "badge_numbers": 1,
-                    "reports": {
-                        "$reduce": {  # Flatten the list of reports
-                            "input": "$reports",
-                            "initialValue": [],
-                            "in": {"$setUnion": ["$$value", "$$this"]}
-                        }
-                    }
-                }
-            }
-        ]
+        # Emails linked to more than one badge number, read in email order from the (shared, _id) index
+        last_key = decode_page_token(page_token, QUERY9_SORT)
+        cursor = officer_email_links_collection().find(query9_filter(last_key), {"badge_numbers": 1, "reports": 1, "reports_truncated": 1}).sort("_id", 1)
+        if wants_ndjson(request):  # Stream every remaining email instead of one page
+            return ndjson_response(cursor, format_query9_row)
 
-        results = list(collection_reports.aggregate(pipeline))
-        return {"status":"success","Report_with_same_email_different_badge":results}
+        cursor = cursor.limit(page_size + 1)
+        results = [format_query9_row(links) for links in await cursor.to_list(length=None)]
+        results, next_page_token = split_page(results, page_size, QUERY9_SORT)
+        return {"status":"success","Report_with_same_email_different_badge":results,
+                "page_size": page_size, "next_page_token": next_page_token}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @router.get("/Query10/")
-def query10(officer_name : str):
+async def query10(request: Request, officer_name : str):
     try:
-        pipeline = [
-            {
-                "$match": {  # Filter reports where officer has upvoted
-                    "upvotes.list.officer_name": officer_name
-                }
-            },
-            {
-                "$group": {  # Collect distinct areas
-                    "_id": None,
-                    "areas": {"$addToSet": "$area_name"}
-                }
-            },
-            {
-                "$project": {  # Format output
-                    "_id": 0,
-                    "officer_name": officer_name,
-                    "areas": 1
-                }
-            }
-        ]
-        results = list(collection_reports.aggregate(pipeline))
+        # Union of the area sets of every badge number used under this name (`officer_name` index)
+        areas = set()
+        async for officer in officer_activity_collection().find({"officer_name": officer_name}, {"areas": 1}):
+            areas.update(officer.get("areas", []))
+        results = [{"officer_name": officer_name, "areas": sorted(areas)}] if areas else []
+        if wants_ndjson(request):
+            return ndjson_response(results)
         return {"status":"success","Areas_voted":results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def date_window(start_date, end_date):
+    """Optional `date_occ` filter for the spatial endpoints; both dates None means all time."""
+    if not start_date:
+        return {}
+    range_start, range_end = time_utils.day_range(start_date, end_date)
+    return {"date_occ": {"$gte": range_start, "$lt": range_end}}
+
+def near_pipeline(lat, lon, radius_m, query):
+    """Reports matching `query` within `radius_m` of (lat, lon), nearest first, with `distance_m`."""
+    # $geoNear walks the 2dsphere index outwards from the center, nearest first
+    return [
+        {
+            "$geoNear": {
+                "near": {"type": "Point", "coordinates": [lon, lat]},
+                "key": geo_utils.GEO_POINT_FIELD,
+                "distanceField": "distance_m",
+                "maxDistance": radius_m,
+                "spherical": True,
+                "query": query
+            }
+        },
+        {
+            "$project": {**SPATIAL_PROJECTION, "distance_m": {"$round": ["$distance_m", 1]}}  # Format output
+        }
+    ]
+
+@router.get("/near/")
+async def reports_near(
+        request: Request,
+        lat: float = Query(..., ge=-90, le=90, description="Latitude of the center"),
+        lon: float = Query(..., ge=-180, le=180, description="Longitude of the center"),
+        radius_m: float = Query(1000, gt=0, le=50_000, description="Search radius in meters"),
+        start_date: Optional[str] = Query(None, description="Optional first day (MM/DD/YYYY)"),
+        end_date: Optional[str] = Query(None, description="Optional last day, inclusive (MM/DD/YYYY)"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Closest reports to return")
+):
+    try:
+        pipeline = near_pipeline(lat, lon, radius_m, date_window(start_date, end_date))
+        if wants_ndjson(request):  # Stream every report in the radius
+            return ndjson_response(await reports_collection().aggregate(pipeline), reference_codes.expand)
+        pipeline.insert(1, {"$limit": limit})
+
+        cursor = await reports_collection().aggregate(pipeline)
+        results = await reference_codes.expand_all(await cursor.to_list(length=None))
+        return {"status": "success", "center": {"lat": lat, "lon": lon}, "radius_m": radius_m, "reports": results}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def within_filter(box, query, last_key=None):
+    """Reports matching `query` inside the `box` polygon, continuing after `last_key` in WITHIN_SORT order."""
+    # $geoWithin on the 2dsphere-indexed point
+    query = {geo_utils.GEO_POINT_FIELD: {"$geoWithin": {"$geometry": box}}, **query}
+    if last_key:
+        query = {"$and": [query, keyset_filter(WITHIN_SORT, last_key)]}
+    return query
+
+@router.get("/within/")
+async def reports_within(
+        request: Request,
+        min_lat: float = Query(..., ge=-90, le=90, description="South edge of the box"),
+        min_lon: float = Query(..., ge=-180, le=180, description="West edge of the box"),
+        max_lat: float = Query(..., ge=-90, le=90, description="North edge of the box"),
+        max_lon: float = Query(..., ge=-180, le=180, description="East edge of the box"),
+        start_date: Optional[str] = Query(None, description="Optional first day (MM/DD/YYYY)"),
+        end_date: Optional[str] = Query(None, description="Optional last day, inclusive (MM/DD/YYYY)"),
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Reports per page"),
+        page_token: Optional[str] = Query(None, description="`next_page_token` of the previous page")
+):
+    try:
+        box = geo_utils.bbox_polygon(min_lat, min_lon, max_lat, max_lon)
+        last_key = decode_page_token(page_token, WITHIN_SORT)
+        query = within_filter(box, date_window(start_date, end_date), last_key)
+        cursor = reports_collection().find(query, SPATIAL_PROJECTION).sort(WITHIN_SORT)
+        if wants_ndjson(request):  # Stream every report in the box instead of one page
+            return ndjson_response(cursor, reference_codes.expand)
+        cursor = cursor.limit(page_size + 1)
+        results = await reference_codes.expand_all(await cursor.to_list(length=None))
+        results, next_page_token = split_page(results, page_size, WITHIN_SORT)
+        return {"status": "success", "reports": results, "page_size": page_size, "next_page_token": next_page_token}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def heatmap_pipeline(query, cell_size, crm_cd=None):
+    """Report counts per `cell_size`-degree grid cell for the reports matching `query`, hottest first."""
+    query = dict(query)
+    query[geo_utils.GEO_POINT_FIELD] = {"$type": "object"}  # Reports with usable coordinates only
+    if crm_cd:
+        query["crm_codes.crime_codes"] = crm_cd
+
+    # Count reports per grid cell: cell = floor(coordinate / cell_size)
+    return [
+        {
+            "$match": query
+        },
+        {
+            "$group": {
+                "_id": {
+                    "lat": {"$floor": {"$divide": ["$location_info.lat", cell_size]}},
+                    "lon": {"$floor": {"$divide": ["$location_info.lon", cell_size]}}
+                },
+                "count": {"$sum": 1}
+            }
+        },
+        {
+            "$sort": {"count": -1, "_id.lat": 1, "_id.lon": 1}  # Hottest cells first
+        }
+    ]
+
+@router.get("/heatmap/")
+async def reports_heatmap(
+        request: Request,
+        start_date: str = Query(..., description="First day (MM/DD/YYYY)"),
+        end_date: Optional[str] = Query(None, description="Optional last day, inclusive (MM/DD/YYYY)"),
+        cell_size: float = Query(0.01, ge=0.001, le=1, description="Grid cell size in degrees (0.01 is about 1 km)"),
+        crm_cd: Optional[str] = Query(None, description="Optional crime code filter")
+):
+    try:
+        pipeline = heatmap_pipeline(date_window(start_date, end_date), cell_size, crm_cd)
+        if wants_ndjson(request):
+            return ndjson_response(await reports_collection().aggregate(pipeline), lambda row: heatmap_cell(row, cell_size))
+
+        results, cache_info = await cached_aggregate(
+            "heatmap", reports_collection(), pipeline, [collection_reports_name],
+            start_date=start_date, end_date=end_date, cell_size=cell_size, crm_cd=crm_cd
+        )
+        cells = [heatmap_cell(row, cell_size) for row in results]
+        return {"status": "success", "cell_size": cell_size, "cells": cells, "cache": cache_info}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+# Query shapes checked by the index-usage checks (GET /debug/explain/, scripts/check_query_plans.py),
+# built by the same functions as the endpoints with representative parameters
+EXPLAIN_DAY = datetime(2022, 3, 1)
+EXPLAIN_CENTER = (34.044, -118.247)  # Downtown LA
+
+register_explain("Query1", lambda: find_command(time_rollups.collection_time_rollups_name, {}), allow_collscan=True,
+                 note="Reads every prefix-sum rollup (one small document per crime code); Query4 is the same read")
+register_explain("Query2", lambda: aggregate_command(collection_reports_name, query2_pipeline(
+    "510", 720, 1080, (EXPLAIN_DAY, EXPLAIN_DAY + timedelta(days=30)))))
+register_explain("Query3", lambda: aggregate_command(collection_reports_name, query3_pipeline(
+    EXPLAIN_DAY, EXPLAIN_DAY + timedelta(days=1))))
+register_explain("Query5", lambda: aggregate_command(collection_reports_name, query5_pipeline()), allow_collscan=True,
+                 note="Groups every report by design; served from the query cache")
+register_explain("Query6", lambda: find_command(collection_reports_name, query6_filter(
+    EXPLAIN_DAY, EXPLAIN_DAY + timedelta(days=1), single_day=True), QUERY6_PROJECTION, QUERY6_SORT, DEFAULT_PAGE_SIZE + 1))
+register_explain("leaderboard", lambda: find_command(leaderboard.collection_leaderboards_name, {"_id": {
+    "$gte": leaderboard.board_id(EXPLAIN_DAY), "$lte": leaderboard.board_id(EXPLAIN_DAY + timedelta(days=6))}}))
+register_explain("Query8", lambda: find_command(collection_officer_activity_name, {}, QUERY8_PROJECTION, QUERY8_SORT, 50))
+register_explain("Query9", lambda: find_command(collection_officer_email_links_name, query9_filter(), sort=[("_id", 1)],
+                                                limit=DEFAULT_PAGE_SIZE + 1))
+register_explain("Query10", lambda: find_command(collection_officer_activity_name, {"officer_name": "John Smith"}))
+register_explain("near", lambda: aggregate_command(collection_reports_name, near_pipeline(*EXPLAIN_CENTER, 1000, {})))
+register_explain("within", lambda: find_command(collection_reports_name, within_filter(geo_utils.bbox_polygon(
+    EXPLAIN_CENTER[0] - 0.01, EXPLAIN_CENTER[1] - 0.01, EXPLAIN_CENTER[0] + 0.01, EXPLAIN_CENTER[1] + 0.01), {}),
+    SPATIAL_PROJECTION, WITHIN_SORT, DEFAULT_PAGE_SIZE + 1), allow_blocking_sort=True,
+    note="Pages are a top-k sort by dr_no over the reports in the box")
+register_explain("heatmap", lambda: aggregate_command(collection_reports_name, heatmap_pipeline(
+    {"date_occ": {"$gte": EXPLAIN_DAY, "$lt": EXPLAIN_DAY + timedelta(days=30)}}, 0.01)))
+
+def report_document(report: Report):
+    """Convert a validated `Report` into the stored document (typed dates, minute of day, occurrence time, GeoJSON point)."""
+    report_data = report.model_dump()
+    report_data.update(time_utils.typed_date_fields(report.date_rptd, report.date_occ, report.time_occ))
+    location = report.location_info
+    report_data["location_info"] = geo_utils.location_fields(location.location, location.lat, location.lon)
+    return report_data
+
+async def after_reports_inserted(report_docs):
+    """Keep the derived data (rollups, cached analytics) in step with newly inserted reports."""
+    await time_rollups.record_reports_time(report_docs)
+    await leaderboard.record_leaderboard_reports(report_docs)
+    sketches.record_report_sketches(report_docs)  # Buffered, written by sketches.sketch_buffer
+    query_cache.invalidate(collection_reports_name)
+
 @router.post("/add/")
 async def add_report(report : Report):
-    report_data = report.model_dump()
-    result = collection_reports.insert_one(report_data)
+    try:
+        report_data = report_document(report)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    await prepare_reports([report_data])  # New codes go to reference_codes; labels are dropped in compact mode
+    result = await reports_collection().insert_one(report_data)
     if not result.inserted_id:
         return {"status": "error", "message": "Failed to insert report."}
+    await after_reports_inserted([report_data])
     return {"status": "ok", "message": "Report inserted successfully.","Dr_no": report.dr_no}
+
+@router.post("/bulk/")
+async def bulk_add_reports(request: Request):
+    """
+    Bulk insert reports from a newline-delimited JSON body (one `Report` per line), plain or gzip.
+
+    The body is read as a stream; records are validated and written in unordered batches, and
+    the next batch is only read once the previous one is written.
+    """
+    content_encoding = request.headers.get("content-encoding", "").lower()
+    content_type = request.headers.get("content-type", "").lower()
+    gzipped = True if "gzip" in content_encoding or "gzip" in content_type else None
+
+    summary = {"lines": 0, "accepted": 0, "rejected": 0}
+    errors = []
+    batch = []  # (line number, report document)
+
+    def reject(line_number, error):
+        summary["rejected"] += 1
+        if len(errors) < REPORT_BULK_MAX_ERRORS:
+            errors.append({"line": line_number, "error": error})
+
+    async def write_batch():
+        if not batch:
+            return
+        def reject_batch(error):
+            for line_number, _ in batch:
+                reject(line_number, error)
+            batch.clear()
+
+        try:
+            # Records new codes (an upsert racing with other uploads) and compacts in compact mode
+            documents = await prepare_reports([document for _, document in batch])
+        except Exception as e:
+            reject_batch(str(e))  # Nothing of the batch was inserted
+            return
+        failed = set()
+        try:
+            await reports_collection().insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                reject(batch[error["index"]][0], error.get("errmsg", "Write failed."))
+        except PyMongoError as e:
+            # The batch can't be told apart from a failed one: reject all of it and go on with the next
+            reject_batch(str(e))
+            return
+        inserted = [document for i, document in enumerate(documents) if i not in failed]
+        summary["accepted"] += len(inserted)
+        await after_reports_inserted(inserted)
+        batch.clear()
+
+    try:
+        async for line_number, line in iter_ndjson_lines(request.stream(), gzipped, REPORT_BULK_MAX_LINE_BYTES):
+            summary["lines"] = line_number
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, report_document(Report.model_validate_json(line))))
+            except ValidationError as e:
+                reject(line_number, e.errors(include_url=False, include_input=False, include_context=False))
+            except ValueError as e:
+                reject(line_number, str(e))
+            if len(batch) >= REPORT_BULK_BATCH_SIZE:
+                await write_batch()
+        await write_batch()
+    except (ValueError, zlib.error) as e:
+        # Unreadable body: report what was already written before the failure
+        return {"status": "error", "message": str(e), **summary, "errors": errors}
+    except PyMongoError as e:
+        # Derived views of written reports failed to update: the summary still holds for the written batches
+        return {"status": "error", "message": str(e), **summary, "errors": errors}
+
+    return {"status": "success", **summary, "errors": errors, "errors_truncated": summary["rejected"] > len(errors)}
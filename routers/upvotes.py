@@ -1,81 +1,137 @@
-from bson import ObjectId
+from typing import List, Optional
 
-from db import collection_upvotes, collection_reports
-from fastapi import APIRouter, Query, HTTPException
-from datetime import datetime
+from db import upvotes_collection, collection_upvotes_name
+from fastapi import APIRouter, Query, HTTPException, Request
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+from config import UPVOTE_BULK_MAX_ITEMS, UPVOTE_WRITE_BEHIND
 from models.upvote_model import Upvote
+from services.ndjson import ndjson_response, wants_ndjson
+from services import sketches
+from services.explain import find_command, register_explain
+from services.leaderboard import record_leaderboard_upvotes
+from services.officer_activity import (officer_activity_collection, record_officer_activity,
+                                       collection_officer_activity_name)
+from services.query_cache import query_cache
+from services.upvote_buffer import upvote_buffer
+from services.upvote_store import REPORT_UPVOTE_COLLECTIONS, apply_report_upvotes, upvote_document
+
+DUPLICATE_KEY_ERROR = 11000
 
 router = APIRouter(prefix="/upvotes", tags=["Upvotes"])
 
+OFFICER_PROJECTION = {"officer_name": 1, "officer_email": 1, "total_upvotes": 1}
+QUERY7_SORT = [("total_upvotes", -1)]
+
+def officer_row(officer):
+    """Format an officer_activity document (keyed by badge number) as a Query7 row."""
+    return {
+        "officer_name": officer.get("officer_name"),
+        "officer_email": officer.get("officer_email"),
+        "officer_badge_number": officer["_id"],
+        "total_upvotes": officer.get("total_upvotes", 0)
+    }
+
+async def record_report_upvotes(upvote_docs):
+    """Apply new upvotes to the officer_activity view and sketches now, and to their reports now or through the write-behind buffer."""
+    area_names = await record_officer_activity(upvote_docs)
+    sketches.record_upvote_sketches(upvote_docs, area_names)  # Buffered, written by sketches.sketch_buffer
+    if UPVOTE_WRITE_BEHIND:
+        await upvote_buffer.add(upvote_docs)
+        query_cache.invalidate(collection_upvotes_name)
+    else:
+        await apply_report_upvotes(upvote_docs)
+        await record_leaderboard_upvotes({upvote_data["report_id"] for upvote_data in upvote_docs})
+        query_cache.invalidate(collection_upvotes_name, *REPORT_UPVOTE_COLLECTIONS)
+
 @router.get("/Query7/")
-def query7():
+async def query7(
+        request: Request,
+        approx: bool = Query(False, description="Estimate from the write-time sketches, with error bounds"),
+        start_date: Optional[str] = Query(None, description="First day of upvotes (MM/DD/YYYY), approx=true only"),
+        end_date: Optional[str] = Query(None, description="Last day, inclusive (MM/DD/YYYY), approx=true only")
+):
     try:
-        pipeline = [
-            {
-                "$group": {
-                    "_id": {
-                        "officer_name": "$officer_name",
-                        "officer_email": "$officer_email",
-                        "officer_badge_number": "$officer_badge_number"
-                    },
-                    "total_upvotes": {"$sum": 1}  # Count total upvotes per officer
-                }
-            },
-            {
-                "$project": { #Format results
-                    "_id": 0,
-                    "officer_name": "$_id.officer_name",
-                    "officer_email": "$_id.officer_email",
-                    "officer_badge_number": "$_id.officer_badge_number",
-                    "total_upvotes": "$total_upvotes"
-                }
-            },
-            {"$sort": {"total_upvotes": -1}},  # Sort by highest upvotes
-            {"$limit": 50}  # Limit to top 50 officers
-        ]
-        results = list(collection_upvotes.aggregate(pipeline))
+        if approx:  # Merged Count-Min sketches of the months and days in the range
+            results, error_bounds = await sketches.top_officers(*sketches.sketch_range(start_date, end_date))
+            if wants_ndjson(request):
+                return ndjson_response(results)
+            return {"status":"success","most_active_officers":results,"approx":True,"error_bounds":error_bounds}
+        if start_date or end_date:
+            raise ValueError("start_date and end_date need approx=true.")
+        # Top of the `total_upvotes` index of the officer_activity view
+        cursor = officer_activity_collection().find({}, OFFICER_PROJECTION).sort(QUERY7_SORT).limit(50)
+        if wants_ndjson(request):
+            return ndjson_response(cursor, officer_row)
+        results = [officer_row(officer) for officer in await cursor.to_list(length=None)]
         return {"status":"success","most_active_officers":results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# Query7 is an indexed top-50 read of the officer_activity view (checked by the index-usage checks)
+register_explain("Query7", lambda: find_command(collection_officer_activity_name, {}, OFFICER_PROJECTION, QUERY7_SORT, 50))
+
 @router.post("/add")
 async def upvote(upvote: Upvote):
-    # Check if this officer has already upvoted this report (async)
-    existing_vote = collection_upvotes.find_one({
-        "officer_badge_number": upvote.officer_badge_number,
-        "report_id": upvote.report_id
-    })
+    upvote_data = upvote_document(upvote)
 
-    if existing_vote:
+    try:
+        # Insert upvote into `upvotes` collection; the unique (officer, report) index rejects duplicates
+        await upvotes_collection().insert_one(upvote_data)
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Officer has already voted for this report.")
-
-    #Create the upvote document
-    upvote_data = {
-        "_id": ObjectId(),  # Ensure unique ID
-        "officer_name": upvote.officer_name,
-        "officer_email": upvote.officer_email,
-        "officer_badge_number": upvote.officer_badge_number,
-        "report_id": upvote.report_id,
-        "upvote_time": datetime.utcnow()
-    }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
     try:
-        # Insert upvote into `upvotes` collection
-        collection_upvotes.insert_one(upvote_data)
-
         # Update the report's upvote count
-        collection_reports.update_one(
-            {"dr_no": upvote.report_id},
-            {
-                "$inc": {"upvotes.count": 1},
-                "$addToSet": {"upvotes.list": upvote_data}  # Prevent duplicate votes
-            },
-            upsert=True
-        )
+        await record_report_upvotes([upvote_data])
         upvote_data["_id"] = str(upvote_data["_id"])
 
         return {"message": "Upvote cast successfully.", "upvote": upvote_data}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.post("/bulk")
+async def bulk_upvote(upvotes: List[Upvote]):
+    if len(upvotes) > UPVOTE_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {UPVOTE_BULK_MAX_ITEMS} upvotes per request.")
+
+    upvote_docs = [upvote_document(upvote) for upvote in upvotes]
+    results = [{"index": i, "status": "created", "upvote_id": str(doc["_id"])} for i, doc in enumerate(upvote_docs)]
+    if not upvote_docs:
+        return {"status": "success", "created": 0, "duplicates": 0, "errors": 0, "results": results}
+
+    # One unordered bulk insert; duplicates fail individually on the unique index
+    failed = set()
+    try:
+        await upvotes_collection().bulk_write([InsertOne(doc) for doc in upvote_docs], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            index = error["index"]
+            failed.add(index)
+            if error["code"] == DUPLICATE_KEY_ERROR:
+                results[index] = {"index": index, "status": "duplicate",
+                                  "detail": "Officer has already voted for this report."}
+            else:
+                results[index] = {"index": index, "status": "error", "detail": error.get("errmsg", "")}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    created = [doc for i, doc in enumerate(upvote_docs) if i not in failed]
+    try:
+        # One merged report update per affected report
+        await record_report_upvotes(created)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    duplicates = sum(1 for result in results if result["status"] == "duplicate")
+    return {
+        "status": "success",
+        "created": len(created),
+        "duplicates": duplicates,
+        "errors": len(failed) - duplicates,
+        "results": results
+    }
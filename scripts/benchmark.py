@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import MONGO_DB_NAME
+from scripts import time_utils
+from scripts.synthetic_data import DEFAULT_PROFILE, DEFAULT_SEED
+
+# Seeding drops the collections, so the benchmark refuses to touch the default database
+DEFAULT_DATABASE = "lapd"
+DEFAULT_SIZES = [100_000, 1_000_000, 5_000_000]
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 8
+DEFAULT_WARMUP = 10
+# Bumped whenever the synthetic data changes, so old datasets are regenerated
+DATASET_VERSION = 2
+# Write benchmarks only create documents with this prefix and remove them afterwards
+BENCH_PREFIX = "BENCH"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../benchmark_results")
+collection_benchmark_meta_name = "benchmark_meta"
+
+AREAS = DEFAULT_PROFILE["areas"]
+CRIMES = DEFAULT_PROFILE["crimes"]
+FIRST_DAY = datetime.strptime(DEFAULT_PROFILE["first_day"], "%Y-%m-%d")
+DAYS = DEFAULT_PROFILE["days"]
+
+
+def seed_dataset(size, seed=DEFAULT_SEED, workers=None):
+    """
+    Make the benchmark database hold exactly the first `size` synthetic reports.
+
+    Reports and upvotes come from `scripts/synthetic_data.py`, seeded per chunk, so the same
+    (size, seed) always produces the same data. An existing dataset with the same seed is
+    reused and only grown or trimmed.
+    """
+    from scripts import build_rollups, create_indexes, populate_db, synthetic_data
+
+    meta_collection = populate_db.db[collection_benchmark_meta_name]
+    meta = meta_collection.find_one({"_id": "dataset"})
+    reusable = meta and meta.get("seed") == seed and meta.get("version") == DATASET_VERSION
+    if reusable and meta["size"] == size:
+        print(f"♻️ Reusing the seeded dataset of {size:,} reports.")
+        return
+    started = time.perf_counter()
+
+    if reusable and meta["size"] > size:
+        # Smaller prefix of the same data: drop the tail and its upvotes
+        tail = {"$gte": str(synthetic_data.FIRST_DR_NO + size)}
+        populate_db.collection_reports.delete_many({"dr_no": tail})
+        populate_db.collection_upvotes.delete_many({"report_id": tail})
+        populate_db.db[populate_db.collection_upvote_buckets_name].delete_many({"report_id": tail})
+    else:
+        current = meta["size"] if reusable else 0
+        if not reusable:
+            populate_db.reset_collections()
+            populate_db.collection_reports.create_index("dr_no", unique=True)
+            populate_db.collection_officers.insert_many(synthetic_data.synthetic_officers(seed), ordered=False)
+        synthetic_data.generate_reports(size, current, seed, workers)
+
+    create_indexes.generate_indexes()
+    build_rollups.build_rollups()
+    meta_collection.replace_one({"_id": "dataset"}, {"_id": "dataset", "size": size, "seed": seed,
+                                                     "version": DATASET_VERSION}, upsert=True)
+    print(f"🌱 Dataset of {size:,} reports ready in {time.perf_counter() - started:.1f}s")
+
+
+def _random_day(rng):
+    return (FIRST_DAY + timedelta(days=int(rng.integers(0, DAYS)))).strftime(time_utils.QUERY_DATE_FORMAT)
+
+
+def _random_window(rng):
+    start = int(rng.integers(0, 24 * 60 - 60))
+    end = min(start + int(rng.integers(30, 360)), 24 * 60 - 1)
+    return f"{start // 60:02d}{start % 60:02d}", f"{end // 60:02d}{end % 60:02d}"
+
+
+def _random_month(rng):
+    start = FIRST_DAY + timedelta(days=int(rng.integers(0, DAYS - 31)))
+    return start.strftime(time_utils.QUERY_DATE_FORMAT), (start + timedelta(days=30)).strftime(time_utils.QUERY_DATE_FORMAT)
+
+
+def read_cases(officer_names):
+    """(name, path, params(rng)) of every read endpoint; parameters vary per request."""
+    def query1(rng):
+        start, end = _random_window(rng)
+        return {"start_time": start, "end_time": end}
+
+    def query2(rng):
+        start, end = _random_window(rng)
+        first, last = _random_month(rng)
+        return {"crm_cd": CRIMES[rng.integers(len(CRIMES))]["code"], "start_time": start, "end_time": end,
+                "start_date": first, "end_date": last}
+
+    def near(rng):
+        area = AREAS[rng.integers(len(AREAS))]
+        return {"lat": area["lat"], "lon": area["lon"], "radius_m": 1000}
+
+    def within(rng):
+        area = AREAS[rng.integers(len(AREAS))]
+        return {"min_lat": area["lat"] - 0.01, "min_lon": area["lon"] - 0.01,
+                "max_lat": area["lat"] + 0.01, "max_lon": area["lon"] + 0.01}
+
+    def heatmap(rng):
+        first, last = _random_month(rng)
+        return {"start_date": first, "end_date": last}
+
+    return [
+        ("Query1", "/reports/Query1/", query1),
+        ("Query2", "/reports/Query2/", query2),
+        ("Query3", "/reports/Query3/", lambda rng: {"date": _random_day(rng)}),
+        ("Query4", "/reports/Query4/", query1),
+        ("Query5", "/reports/Query5/", lambda rng: {}),
+        ("Query6", "/reports/Query6/", lambda rng: {"date": _random_day(rng)}),
+        ("Query7", "/upvotes/Query7/", lambda rng: {}),
+        ("Query8", "/reports/Query8/", lambda rng: {}),
+        ("Query9", "/reports/Query9/", lambda rng: {}),
+        ("Query10", "/reports/Query10/", lambda rng: {"officer_name": officer_names[rng.integers(len(officer_names))]}),
+        ("near", "/reports/near/", near),
+        ("within", "/reports/within/", within),
+        ("heatmap", "/reports/heatmap/", heatmap),
+        ("officers_find", "/officers/find/", lambda rng: {"name": officer_names[rng.integers(len(officer_names))][:4]}),
+        ("officers_autocomplete", "/officers/autocomplete/", lambda rng: {"prefix": officer_names[rng.integers(len(officer_names))][:3]}),
+        ("officers_search", "/officers/search/", lambda rng: {"q": officer_names[rng.integers(len(officer_names))]}),
+    ]
+
+
+def bench_report(i):
+    """A valid `Report` body with a benchmark-only DR number."""
+    area = AREAS[i % len(AREAS)]
+    crime = CRIMES[i % len(CRIMES)]
+    return {
+        "dr_no": f"{BENCH_PREFIX}{i}",
+        "date_rptd": "03/02/2022 12:00:00 AM",
+        "date_occ": "03/01/2022 12:00:00 AM",
+        "time_occ": f"{(i % 24):02d}{(i % 60):02d}",
+        "area": area["code"],
+        "area_name": area["name"],
+        "rpt_dist_no": "0101",
+        "crm_codes": {"crime_codes": [crime["code"]], "crm_cd_desc": crime["desc"]},
+        "mocodes": ["0344"],
+        "victim": {"vict_age": 30, "vict_sex": "Male", "vict_descent": "Hispanic/Latin/Mexican"},
+        "premis": {"premis_cd": "101", "premis_desc": "STREET"},
+        "weapon": {"weapon_used_cd": "", "weapon_desc": ""},
+        "location_info": {"location": "100 SYNTHETIC ST", "lat": 34.05, "lon": -118.25},
+        "status": "IC",
+        "status_desc": "Invest Cont",
+    }
+
+
+def bench_upvote(report_index, officer_index):
+    return {
+        "report_id": f"{BENCH_PREFIX}{report_index}",
+        "officer_name": f"Bench Officer {officer_index}",
+        "officer_email": f"bench{officer_index}@example.com",
+        "officer_badge_number": f"{BENCH_PREFIX}{officer_index}",
+    }
+
+
+def write_cases(requests):
+    """(name, method, path, request kwargs(i)) of every write path. Each request writes new documents."""
+    batch = 100
+    bulk_offset = 1_000_000  # DR numbers of bulk-inserted reports, after the single inserts
+    return [
+        ("reports_add", "POST", "/reports/add/", lambda i: {"json": bench_report(i)}),
+        ("reports_bulk", "POST", "/reports/bulk/", lambda i: {
+            "content": "\n".join(json.dumps(bench_report(bulk_offset + i * batch + j)) for j in range(batch)),
+            "headers": {"Content-Type": "application/x-ndjson"}}),
+        # Upvotes target the benchmark reports only, so the seeded dataset is left untouched
+        ("upvotes_add", "POST", "/upvotes/add", lambda i: {"json": bench_upvote(i % requests, i // requests)}),
+        ("upvotes_bulk", "POST", "/upvotes/bulk", lambda i: {
+            "json": [bench_upvote(i % requests, 1_000 + i // requests * batch + j) for j in range(batch)]}),
+        ("officers_add", "POST", "/officers/add", lambda i: {"json": {
+            "badge_number": f"{BENCH_PREFIX}{i}", "name": f"Bench Officer {i}", "email": f"bench{i}@example.com"}}),
+    ]
+
+
+def _failed(response):
+    if response.status_code >= 400:
+        return True
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+        return isinstance(body, dict) and body.get("status") == "error"
+    return False
+
+
+async def measure(client, name, method, path, kwargs_for, requests, concurrency, warmup):
+    """Run `requests` calls (after `warmup` unmeasured ones) with at most `concurrency` in flight."""
+    for i in range(warmup):
+        await client.request(method, path, **kwargs_for(requests + i))
+
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs_for(i))
+            latencies.append(time.perf_counter() - started)
+            errors += _failed(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    result = {
+        "endpoint": name, "method": method, "path": path, "requests": requests, "concurrency": concurrency,
+        "errors": errors, "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3),
+        "mean_ms": round(latencies_ms.mean(), 3), "max_ms": round(latencies_ms.max(), 3),
+        "throughput_rps": round(requests / elapsed, 1),
+    }
+    print(f"{name:<24} p50 {p50:9.2f} ms  p95 {p95:9.2f} ms  p99 {p99:9.2f} ms  "
+          f"{result['throughput_rps']:9.1f} req/s  errors {errors}")
+    return result
+
+
+def remove_bench_documents():
+    """Delete everything the write benchmarks created, then rebuild the derived data."""
+    from scripts import build_rollups, populate_db
+
+    prefix = {"$regex": f"^{BENCH_PREFIX}"}
+    populate_db.collection_reports.delete_many({"dr_no": prefix})
+    populate_db.collection_upvotes.delete_many({"report_id": prefix})
+    populate_db.db[populate_db.collection_upvote_buckets_name].delete_many({"report_id": prefix})
+    populate_db.collection_officers.delete_many({"badge_number": prefix})
+    build_rollups.build_rollups()
+
+
+async def run_benchmarks(size, requests, concurrency, warmup, seed, include_writes):
+    import httpx
+    import main
+    from db import get_sync_database, collection_officer_name
+
+    officer_names = sorted(officer["name"] for officer in get_sync_database()[collection_officer_name].find({}, {"name": 1}))
+    results = []
+    await main.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for name, path, params_for in read_cases(officer_names):
+                rng = np.random.default_rng([seed, len(results)])
+                result = await measure(client, name, "GET", path, lambda i: {"params": params_for(rng)},
+                                       requests, concurrency, warmup)
+                results.append(dict(result, size=size, kind="read"))
+            if include_writes:
+                for name, method, path, kwargs_for in write_cases(requests + warmup):
+                    result = await measure(client, name, method, path, kwargs_for, requests, concurrency, warmup)
+                    results.append(dict(result, size=size, kind="write"))
+    finally:
+        await main.shutdown_event()
+    return results
+
+
+def run_metadata(args):
+    from db import get_sync_database
+    from config import REPORT_STORAGE, UPVOTE_STORAGE, UPVOTE_WRITE_BEHIND
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "mongodb": get_sync_database().client.server_info().get("version"),
+        "database": MONGO_DB_NAME,
+        "seed": args.seed,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "warmup": args.warmup,
+        "upvote_storage": UPVOTE_STORAGE,
+        "upvote_write_behind": UPVOTE_WRITE_BEHIND,
+        "report_storage": REPORT_STORAGE,
+    }
+
+
+def compare(results, baseline_file, threshold=0.2):
+    """Print p95 changes against a previous results file; returns the regressed endpoints."""
+    with open(baseline_file) as f:
+        baseline = {(row["size"], row["endpoint"]): row for row in json.load(f)["results"]}
+    regressions = []
+    for row in results:
+        before = baseline.get((row["size"], row["endpoint"]))
+        if not before or not before["p95_ms"]:
+            continue
+        change = row["p95_ms"] / before["p95_ms"] - 1
+        marker = "⚠️" if change > threshold else "  "
+        print(f"{marker} {row['size']:>10,} {row['endpoint']:<24} p95 {before['p95_ms']:9.2f} -> {row['p95_ms']:9.2f} ms ({change:+.0%})")
+        if change > threshold:
+            regressions.append(row["endpoint"])
+    return regressions
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed synthetic datasets and benchmark every endpoint in-process.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Dataset sizes (reports)")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--seed-workers", type=int, default=None, help="Dataset generator processes (default: CPU count)")
+    parser.add_argument("--skip-writes", action="store_true", help="Only benchmark the read endpoints")
+    parser.add_argument("--output", help="Results file (default: benchmark_results/benchmark-<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare p95 latencies against")
+    args = parser.parse_args()
+
+    if MONGO_DB_NAME == DEFAULT_DATABASE:
+        sys.exit(f"❌ Refusing to seed the '{DEFAULT_DATABASE}' database. Set LAPD_MONGO_DB (e.g. lapd_bench).")
+
+    metadata = run_metadata(args)
+    all_results = []
+    for dataset_size in sorted(args.sizes):
+        seed_dataset(dataset_size, args.seed, args.seed_workers)
+        print(f"📊 Benchmarking {dataset_size:,} reports")
+        all_results += asyncio.run(run_benchmarks(dataset_size, args.requests, args.concurrency, args.warmup,
+                                                  args.seed, not args.skip_writes))
+        if not args.skip_writes:
+            remove_bench_documents()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark-{datetime.utcnow():%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"metadata": metadata, "results": all_results}, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+    if args.compare and compare(all_results, args.compare):
+        sys.exit(1)
@@ -0,0 +1,118 @@
+import argparse
+import copy
+import json
+import os
+from datetime import datetime
+
+import bson
+
+from db import get_sync_database, collection_reports_name
+from scripts.benchmark import RESULTS_DIR
+from scripts.synthetic_data import CHUNK_SIZE, DEFAULT_SEED
+from services.index_manifest import INDEX_MANIFEST
+from services.reference_codes import compact_report, reference_codes
+
+DEFAULT_SIZE = 100_000
+# Scratch collections, dropped when the benchmark ends
+SCRATCH_PREFIX = "storage_benchmark_"
+
+
+def synthetic_reports(size, seed=DEFAULT_SEED):
+    """The first `size` expanded synthetic reports, transformed like the CSV ingest."""
+    from scripts import populate_db, synthetic_data
+
+    reports = []
+    for chunk_index in range((size + CHUNK_SIZE - 1) // CHUNK_SIZE):
+        reports += populate_db.transform_chunk(synthetic_data.synthetic_chunk(chunk_index, seed))
+    return reports[:size]
+
+
+def stored_reports(database, size):
+    """A sample of `size` stored reports, expanded whatever their storage mode."""
+    reference_codes.refresh_sync(database)
+    sample = database[collection_reports_name].aggregate([{"$sample": {"size": size}}])
+    return [reference_codes.expand(report) for report in sample]
+
+
+def bson_sizes(reports):
+    """Average encoded size (bytes) of the reports, expanded and compact."""
+    expanded = [len(bson.encode(report)) for report in reports]
+    compact = [len(bson.encode(compact_report(copy.deepcopy(report)))) for report in reports]
+    return sum(expanded) / len(expanded), sum(compact) / len(compact)
+
+
+def collection_sizes(database, name, reports):
+    """
+    Load `reports` into a scratch collection with the report indexes and read its storage stats.
+
+    The working set is estimated as the uncompressed data size (what the WiredTiger cache holds
+    for documents) plus the index size.
+    """
+    collection = database[name]
+    collection.drop()
+    for start in range(0, len(reports), CHUNK_SIZE):
+        collection.insert_many([{key: value for key, value in report.items() if key != "_id"}
+                                for report in reports[start:start + CHUNK_SIZE]], ordered=False)
+    for spec in INDEX_MANIFEST:
+        if spec.collection == collection_reports_name:
+            collection.create_index(spec.keys, **spec.options())
+    stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    collection.drop()
+    return {
+        "documents": stats["count"],
+        "avg_document_bytes": stats.get("avgObjSize", 0),
+        "data_bytes": stats["size"],
+        "storage_bytes": stats["storageSize"],
+        "index_bytes": stats["totalIndexSize"],
+        "working_set_bytes": stats["size"] + stats["totalIndexSize"],
+    }
+
+
+def _reduction(before, after):
+    return round(1 - after / before, 4) if before else None
+
+
+def benchmark_storage(size=DEFAULT_SIZE, seed=DEFAULT_SEED, from_database=False, offline=False):
+    """Compare expanded and compact report documents: encoded size and, unless `offline`, server-side sizes."""
+    database = None if offline else get_sync_database()
+    reports = stored_reports(database, size) if from_database else synthetic_reports(size, seed)
+    if not reports:
+        raise ValueError("No reports to measure.")
+
+    expanded_bson, compact_bson = bson_sizes(reports)
+    result = {
+        "reports": len(reports),
+        "source": "database" if from_database else f"synthetic (seed {seed})",
+        "bson": {"expanded_avg_bytes": round(expanded_bson, 1), "compact_avg_bytes": round(compact_bson, 1),
+                 "reduction": _reduction(expanded_bson, compact_bson)},
+    }
+    print(f"📦 Average BSON size: {expanded_bson:,.0f} -> {compact_bson:,.0f} bytes "
+          f"({result['bson']['reduction']:.1%} smaller)")
+    if offline:
+        return result
+
+    expanded = collection_sizes(database, SCRATCH_PREFIX + "expanded", reports)
+    compact = collection_sizes(database, SCRATCH_PREFIX + "compact", [compact_report(copy.deepcopy(report)) for report in reports])
+    result["server"] = {"expanded": expanded, "compact": compact,
+                        "reduction": {key: _reduction(expanded[key], compact[key]) for key in expanded if key != "documents"}}
+    for key in ("avg_document_bytes", "data_bytes", "storage_bytes", "index_bytes", "working_set_bytes"):
+        print(f"   {key:<20} {expanded[key]:>15,} -> {compact[key]:>15,}  ({result['server']['reduction'][key]:.1%} smaller)")
+    return result
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure document and working-set sizes of expanded vs compact reports.")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="Reports to measure")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--from-database", action="store_true", help="Sample the stored reports instead of synthetic ones")
+    parser.add_argument("--offline", action="store_true", help="Only compare encoded sizes, without a MongoDB server")
+    parser.add_argument("--output", help="Results file (default: benchmark_results/storage-<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = benchmark_storage(args.size, args.seed, args.from_database, args.offline)
+    output = args.output or os.path.join(RESULTS_DIR, f"storage-{datetime.utcnow():%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {output}")
@@ -0,0 +1,31 @@
+import argparse
+import time
+
+from config import COLUMNAR_DIR
+from db import get_sync_database
+from services.columnar import refresh_snapshot
+
+
+def build_columnar(directory=COLUMNAR_DIR, full=False):
+    """Export new reports and upvotes to the columnar snapshot (everything with `full`)."""
+    started = time.perf_counter()
+    manifest = refresh_snapshot(get_sync_database(), directory, full)
+    elapsed = time.perf_counter() - started
+    for table, state in manifest["tables"].items():
+        print(f"   {table:<8} {state['rows']:>12,} rows in {len(state['segments'])} segments")
+    print(f"🎉 Columnar snapshot generation {manifest['generation']} written to {directory} in {elapsed:.1f}s")
+    return manifest
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the columnar snapshot served by LAPD_COLUMNAR_ENDPOINTS.")
+    parser.add_argument("--dir", default=COLUMNAR_DIR, help="Snapshot directory (default: LAPD_COLUMNAR_DIR)")
+    parser.add_argument("--full", action="store_true", help="Export every document again instead of the new ones")
+    parser.add_argument("--watch", type=float, default=0, help="Keep refreshing every WATCH seconds")
+    args = parser.parse_args()
+
+    build_columnar(args.dir, args.full)
+    while args.watch:
+        time.sleep(args.watch)
+        build_columnar(args.dir)
@@ -0,0 +1,32 @@
+import asyncio
+
+from db import connect_to_mongo, close_mongo_connection
+from services import leaderboard, officer_activity, reference_codes, sketches, time_rollups
+
+
+async def _rebuild():
+    await connect_to_mongo()
+    try:
+        codes = await time_rollups.rebuild_time_rollups()
+        print(f"Time-of-day rollups rebuilt for {codes} crime codes.")
+        codes = await reference_codes.rebuild_reference_codes()
+        print(f"Reference tables rebuilt from {codes} codes.")
+        await reference_codes.reference_codes.refresh()  # Area names of compact reports
+        officers = await officer_activity.rebuild_officer_activity()
+        print(f"Officer activity view rebuilt for {officers} officers.")
+        boards = await leaderboard.rebuild_leaderboards()
+        print(f"Upvote leaderboards rebuilt: {boards} day boards.")
+        buckets = await sketches.rebuild_sketches()
+        print(f"Analytics sketches rebuilt: {buckets} day and month buckets.")
+    finally:
+        await close_mongo_connection()
+
+
+def build_rollups():
+    """Rebuild the precomputed rollups, the officer activity view, the leaderboards and the sketches (run after a bulk load)."""
+    asyncio.run(_rebuild())
+
+
+# Run the function
+if __name__ == "__main__":
+    build_rollups()
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import random
+import sys
+from datetime import timedelta
+
+import numpy as np
+
+from config import COLUMNAR_DIR
+from db import connect_to_mongo, close_mongo_connection, get_sync_database, reports_collection
+from routers.reports import (QUERY6_PROJECTION, QUERY6_SORT, query2_pipeline, query3_pipeline, query5_pipeline,
+                             query6_filter)
+from services import columnar
+from services.columnar import COLUMNAR_QUERIES, NULL, SnapshotReader, refresh_snapshot
+
+DEFAULT_SAMPLES = 5
+DEFAULT_SEED = 7
+QUERY6_LIMIT = 200
+
+
+def sample_parameters(snapshot, samples, seed):
+    """(day, crime code) pairs taken from random snapshot rows, so every check has matching reports."""
+    rng = random.Random(seed)
+    reports = [segment for segment in snapshot.reports if len(segment["dr_no"])]
+    parameters = []
+    while reports and len(parameters) < samples:
+        segment = rng.choice(reports)
+        row = rng.randrange(len(segment["dr_no"]))
+        day, crime = segment["date_occ"][row], segment["crime"][row][0]
+        if not np.isnat(day) and crime != NULL:
+            parameters.append((columnar._datetime(day.tolist()), snapshot.dictionaries["crime"][crime]))
+    return parameters
+
+
+async def _aggregate(pipeline):
+    cursor = await reports_collection().aggregate(pipeline)
+    return await cursor.to_list(length=None)
+
+
+def _query3_rows(rows):
+    """Query3 rows comparable across backends: tied crimes at the top-3 cut-off may differ."""
+    normalized = []
+    for row in rows:
+        counts = [crime["count"] for crime in row["top_crimes"]]
+        cutoff = counts[-1] if len(counts) == 3 else 0
+        normalized.append((row["area"], counts, sorted(crime["crime_code"] for crime in row["top_crimes"] if crime["count"] > cutoff)))
+    return sorted(normalized, key=lambda row: (row[0] is None, row[0] or 0))
+
+
+def _query6_rows(rows):
+    return [(row["dr_no"], row["date_occ"], row.get("area"), row["upvotes"]["count"]) for row in rows]
+
+
+async def _check(snapshot, samples, seed, queries):
+    checks = []  # (query, parameters, mongo rows, columnar rows)
+    for day, crm_cd in sample_parameters(snapshot, samples, seed):
+        week = (day, day + timedelta(days=7))
+        if "Query2" in queries:
+            checks.append(("Query2", f"crm_cd={crm_cd}", await _aggregate(query2_pipeline(crm_cd, 0, 1439)),
+                           columnar.query2(snapshot, crm_cd, 0, 1439)))
+            checks.append(("Query2", f"crm_cd={crm_cd} 12:00-18:00 week of {day:%m/%d/%Y}",
+                           await _aggregate(query2_pipeline(crm_cd, 720, 1080, week)),
+                           columnar.query2(snapshot, crm_cd, 720, 1080, week)))
+        if "Query3" in queries:
+            checks.append(("Query3", f"week of {day:%m/%d/%Y}", _query3_rows(await _aggregate(query3_pipeline(*week))),
+                           _query3_rows(columnar.query3(snapshot, *week))))
+        if "Query6" in queries:
+            for range_end, single_day in ((day + timedelta(days=1), True), (week[1], False)):
+                cursor = reports_collection().find(query6_filter(day, range_end, single_day), QUERY6_PROJECTION)
+                mongo_rows = await cursor.sort(QUERY6_SORT).limit(QUERY6_LIMIT).to_list(length=None)
+                checks.append(("Query6", f"{day:%m/%d/%Y} - {range_end:%m/%d/%Y}", _query6_rows(mongo_rows),
+                               _query6_rows(columnar.query6(snapshot, day, range_end, limit=QUERY6_LIMIT))))
+    if "Query5" in queries:
+        checks.append(("Query5", "all pairs", await _aggregate(query5_pipeline()), columnar.query5(snapshot)))
+    return checks
+
+
+async def _run(snapshot, samples, seed, queries):
+    await connect_to_mongo()
+    try:
+        return await _check(snapshot, samples, seed, queries)
+    finally:
+        await close_mongo_connection()
+
+
+def check_columnar_parity(directory=COLUMNAR_DIR, samples=DEFAULT_SAMPLES, seed=DEFAULT_SEED, queries=None, refresh=False):
+    """
+    Run each columnar query and its MongoDB counterpart on sampled parameters; False on any difference.
+
+    Compare against a quiet database (or right after `refresh`): writes made since the snapshot
+    was refreshed show up as differences.
+    """
+    if refresh:
+        refresh_snapshot(get_sync_database(), directory)
+    snapshot = SnapshotReader(directory, COLUMNAR_QUERIES).current()
+    if snapshot is None:
+        print(f"❌ No columnar snapshot in {directory}. Run python -m scripts.build_columnar first.")
+        return False
+
+    ok = True
+    for query, parameters, mongo_rows, columnar_rows in asyncio.run(_run(snapshot, samples, seed, queries or COLUMNAR_QUERIES)):
+        same = mongo_rows == columnar_rows
+        ok &= same
+        print(f"{'✅' if same else '❌'} {query:<7} {parameters:<45} {len(mongo_rows)} rows")
+        if not same:
+            difference = next((i for i, (a, b) in enumerate(zip(mongo_rows, columnar_rows)) if a != b),
+                              min(len(mongo_rows), len(columnar_rows)))
+            print(f"     first difference at row {difference}:")
+            print(f"     mongo    {mongo_rows[difference] if difference < len(mongo_rows) else '(none)'}")
+            print(f"     columnar {columnar_rows[difference] if difference < len(columnar_rows) else '(none)'}")
+    return ok
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a columnar query returns something else than MongoDB.")
+    parser.add_argument("queries", nargs="*", help=f"Queries to check (default: {', '.join(COLUMNAR_QUERIES)})")
+    parser.add_argument("--dir", default=COLUMNAR_DIR, help="Snapshot directory (default: LAPD_COLUMNAR_DIR)")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="Sampled days / crime codes")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--refresh", action="store_true", help="Refresh the snapshot before comparing")
+    args = parser.parse_args()
+    if not check_columnar_parity(args.dir, args.samples, args.seed, args.queries or None, args.refresh):
+        sys.exit(1)
@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from db import connect_to_mongo, close_mongo_connection
+from routers import reports, upvotes  # Importing the routers registers their query shapes
+from services.explain import explain_all
+
+
+async def _check(names):
+    await connect_to_mongo()
+    try:
+        return await explain_all(names)
+    finally:
+        await close_mongo_connection()
+
+
+def check_query_plans(names=None, as_json=False):
+    """Explain every registered query; returns False if any of them scans the collection or sorts in memory."""
+    results = asyncio.run(_check(names))
+    if as_json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        for result in results:
+            marker = "✅" if result["ok"] else "❌"
+            print(f"{marker} {result['query']:<10} {', '.join(result['problems']) or 'ok'}")
+            if "winning_plan" in result:
+                print(f"     plan: {result['winning_plan']}")
+                print(f"     docs examined {result['docs_examined']}, keys examined {result['keys_examined']}, "
+                      f"returned {result['returned']}, {result['execution_ms']} ms")
+    return all(result["ok"] for result in results)
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a registered query regresses to a COLLSCAN or blocking SORT.")
+    parser.add_argument("queries", nargs="*", help="Query names to check (default: all)")
+    parser.add_argument("--json", action="store_true", help="Print the full results as JSON")
+    args = parser.parse_args()
+    if not check_query_plans(args.queries or None, args.json):
+        sys.exit(1)
@@ -1,37 +1,66 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
-
-def generate_indexes():
-    # Connect to MongoDB
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client["lapd"]
-
-    # Collections
-    crime_reports = db["reports"]
-    upvotes = db["upvotes"]
-    police_officers = db["officer"]
-
-    # 📌 1. Indexes for `crime_reports` collection
-    crime_reports.create_index([("crm_codes.crime_codes", ASCENDING), ("date_occ", ASCENDING)])  # Crime code & date
-    crime_reports.create_index([("area", ASCENDING), ("date_occ", ASCENDING)])  # Area & date for location-based searches
-    crime_reports.create_index([("date_occ", ASCENDING)])  # Fast searches by occurrence date
-    crime_reports.create_index([("weapon.weapon_used_cd", ASCENDING), ("crm_codes.crime_codes", ASCENDING), ("area", ASCENDING)])  # Find weapon usage per crime & area
-
-    # 📌 2. Indexes for `upvotes` collection
-    upvotes.create_index([("report_id", ASCENDING), ("upvote_time", ASCENDING)])  # Find most upvoted reports on a specific day
-    upvotes.create_index([("officer_badge_number", ASCENDING)])  # Find most active officers
-    upvotes.create_index([("officer_badge_number", ASCENDING), ("report_id", ASCENDING)], unique=True)  # Prevent duplicate upvotes
-    upvotes.create_index([("officer_email", ASCENDING), ("officer_badge_number", ASCENDING)])  # Detect multiple badge numbers using same email
-    upvotes.create_index([("officer_badge_number", ASCENDING), ("report_id", ASCENDING)])  # Optimize officer upvotes per report
-
-    # 📌 3. Indexes for `police_officers` collection
-    police_officers.create_index([("badge_number", ASCENDING)], unique=True)  # Unique badge numbers
-    police_officers.create_index([("name", ASCENDING)])  # Search officers by name
-    police_officers.create_index([("department", ASCENDING)])  # Filter by department
-    police_officers.create_index([("date_joined", DESCENDING)])  # Find recently joined officers
-    police_officers.create_index([("active", ASCENDING)])  # Filter active/inactive officers
-
-    print("Indexes created successfully! 🚀")
+import argparse
+import asyncio
+import json
+import sys
+
+from db import connect_to_mongo, close_mongo_connection
+from services.index_manifest import sync_indexes, needs_attention
+
+
+async def _sync(**options):
+    await connect_to_mongo()
+    try:
+        return await sync_indexes(**options)
+    finally:
+        await close_mongo_connection()
+
+
+def _format_size(size):
+    return "-" if size is None else f"{size / 1024 / 1024:,.1f} MB"
+
+
+def generate_indexes(build=True, drop_redundant=False, drop_unmanaged=False, as_json=False):
+    """Bring the indexes in line with services/index_manifest.py; returns False if some still need attention."""
+    report = asyncio.run(_sync(build=build, drop_redundant=drop_redundant, drop_unmanaged=drop_unmanaged))
+    if as_json:
+        print(json.dumps(report, indent=2, default=str))
+        return not needs_attention(report)
+
+    markers = {"ok": "✅", "missing": "➕", "conflict": "⚠️", "redundant": "♻️", "unmanaged": "❔"}
+    collection_name = None
+    for row in report:
+        if row["collection"] != collection_name:
+            collection_name = row["collection"]
+            print(f"📌 {collection_name}")
+        name = row["name"] or "_".join(f"{field}_{direction}" for field, direction in row["keys"].items())
+        line = f"  {markers[row['status']]} {name:<55} {row['status']:<10} {_format_size(row['size_bytes']):>10}"
+        if row["ops"] is not None:
+            line += f"  {row['ops']:>10,} ops"
+        if row["covered_by"]:
+            line += f"  (covered by {row['covered_by']})"
+        if row["action"]:
+            line += f"  -> {row['action']}"
+        print(line)
+
+    attention = needs_attention(report)
+    if attention:
+        print(f"{len(attention)} index(es) need attention: rerun with --drop to drop redundant indexes and rebuild "
+              f"conflicting ones, or --drop-unmanaged to drop everything the manifest doesn't declare.")
+    else:
+        print("Indexes match the manifest! 🚀")
+    return not attention
+
 
 # Run the function
 if __name__ == "__main__":
-    generate_indexes()
+    parser = argparse.ArgumentParser(description="Diff the indexes against the manifest and build the missing ones.")
+    parser.add_argument("--check", action="store_true", help="Only report, don't build anything")
+    parser.add_argument("--drop", action="store_true",
+                        help="Drop redundant (prefix-covered) undeclared indexes and rebuild conflicting ones")
+    parser.add_argument("--drop-unmanaged", action="store_true", help="Drop every index the manifest doesn't declare")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    ok = generate_indexes(build=not args.check, drop_redundant=args.drop and not args.check,
+                          drop_unmanaged=args.drop_unmanaged and not args.check, as_json=args.json)
+    if not ok:
+        sys.exit(1)
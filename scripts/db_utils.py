@@ -2,72 +2,34 @@ from bson import ObjectId
 from idna.idnadata import scripts
 from pymongo import MongoClient, UpdateOne
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 import random
 from faker import Faker
-from db import collection_officers, collection_upvotes, collection_reports
+from faker.providers.internet.en_US import Provider as InternetProvider
+from faker.providers.person.en_US import Provider as PersonProvider
+from db import get_sync_database, collection_officer_name, collection_upvotes_name, collection_reports_name, \
+    collection_upvote_buckets_name
 from models.officer_model import PoliceOfficer
 from models.upvote_model import Upvote
 from scripts import global_constant
+from services import upvote_store
+from services.reference_codes import report_area_name
 
 faker = Faker()
 
+# Offline scripts use the blocking client; the API uses the async one from db.py
+sync_db = get_sync_database()
+collection_officers = sync_db[collection_officer_name]
+collection_upvotes = sync_db[collection_upvotes_name]
+collection_reports = sync_db[collection_reports_name]
+collection_upvote_buckets = sync_db[collection_upvote_buckets_name]
+
 officer_list = []
 officer_collection_list=[]
 upvotes_collection_list=[]
 officer_upvote_tracker = {}
 
-def mapping_gender(gender):
-    if gender == 'F':
-        return 'Female'
-    elif gender == 'M':
-        return 'Male'
-    else:
-        return 'Unknown'
-
-
-def mapping_descent(desc):
-    match desc:
-        case "A":
-            return "Other Asian"
-        case "B":
-            return "Black"
-        case "C":
-            return "Chinese"
-        case "D":
-            return "Cambodian"
-        case "F":
-            return "Filipino"
-        case "G":
-            return "Guamanian"
-        case "H":
-            return "Hispanic/Latin/Mexican"
-        case "I":
-            return "American Indian/Alaskan Native"
-        case "J":
-            return "Japanese"
-        case "K":
-            return "Korean"
-        case "L":
-            return "Laotian"
-        case "O":
-            return "Other"
-        case "P":
-            return "Pacific Islander"
-        case "S":
-            return "Samoan"
-        case "U":
-            return "Hawaiian"
-        case "V":
-            return "Vietnamese"
-        case "W":
-            return "White"
-        case "X":
-            return "Unknown"
-        case "Z":
-            return "Asian Indian"
-
-
 def random_date_joined():
     """Generate a random `date_joined` within the last 30 years as a datetime object."""
     start_date = datetime.now() - timedelta(days=30 * 365)  # 30 years ago
@@ -93,26 +55,49 @@ def clean_crime_code(value):
         return value  # Return as is
     return None  # Return None for missing values
 
-def generate_officers():
-    """Generate random officer data and insert them in bulk into MongoDB."""
-    officer_collection_list = []  # Clear this to avoid memory carryover
-
-    for _ in range(global_constant.NUM_OFFICERS):
-        officer_name = faker.name()
-        officer_email = faker.email()
-        officer_badge_number = str(random.randint(10000, 99999))
-
-        officer_data = {
-            "badge_number": officer_badge_number,
-            "name": officer_name,
-            "email": officer_email,
-            "rank": random.choice(global_constant.RANKS),
-            "department": random.choice(global_constant.DEPARTMENTS),
-            "date_joined": random_date_joined(),
-            "active": random.choice([True, False])
+def synthetic_officers(count, seed, joined_before=None, shared_email_rate=0.02):
+    """
+    `count` officer documents, fully determined by `seed` (vectorized, no per-officer Faker calls).
+
+    Names follow Faker's weighted en_US name lists and badge numbers are unique. A small share
+    of officers reuse another officer's email, like the duplicates Query9 looks for.
+    """
+    rng = np.random.default_rng([seed, count])
+    joined_before = joined_before or datetime.combine(datetime.now().date(), datetime.min.time())
+
+    first_names, first_weights = zip(*PersonProvider.first_names.items())
+    last_names, last_weights = zip(*PersonProvider.last_names.items())
+    first = rng.choice(len(first_names), count, p=np.array(first_weights) / sum(first_weights))
+    last = rng.choice(len(last_names), count, p=np.array(last_weights) / sum(last_weights))
+    badge_space = max(90_000, 10 * count)
+    badge_numbers = 10_000 + rng.choice(badge_space, count, replace=False)
+    domains = InternetProvider.free_email_domains
+    emails = [f"{first_names[f].lower()}.{last_names[l].lower()}{n}@{domains[d]}"
+              for f, l, n, d in zip(first, last, rng.integers(1, 100, count), rng.integers(0, len(domains), count))]
+    for i in np.flatnonzero(rng.random(count) < shared_email_rate):
+        emails[i] = emails[rng.integers(count)]
+    joined_days = rng.integers(0, 30 * 365, count)  # Within 30 years
+    ranks = rng.integers(0, len(global_constant.RANKS), count)
+    departments = rng.integers(0, len(global_constant.DEPARTMENTS), count)
+    active = rng.random(count) < 0.5
+
+    return [
+        {
+            "badge_number": str(badge_numbers[i]),
+            "name": f"{first_names[first[i]]} {last_names[last[i]]}",
+            "email": emails[i],
+            "rank": global_constant.RANKS[ranks[i]],
+            "department": global_constant.DEPARTMENTS[departments[i]],
+            "date_joined": joined_before - timedelta(days=int(joined_days[i])),
+            "active": bool(active[i])
         }
+        for i in range(count)
+    ]
 
-        officer_collection_list.append(officer_data)
+
+def generate_officers():
+    """Generate random officer data and insert them in bulk into MongoDB."""
+    officer_collection_list = synthetic_officers(global_constant.NUM_OFFICERS, seed=random.getrandbits(32))
 
     #  Bulk Insert Officers
     if officer_collection_list:
@@ -142,11 +127,33 @@ from pymongo import UpdateOne
 from bson import ObjectId  #  Import to generate unique MongoDB ObjectIds
 
 
-def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, batch_size=10000):
-    """Efficiently bulk generate upvotes for multiple reports and update MongoDB."""
+def write_upvote_buckets(bucket_upvotes):
+    """Append generated upvotes to their reports' buckets (bucketed upvote storage only)."""
+    if not bucket_upvotes:
+        return
+    area_names = {
+        report["dr_no"]: report_area_name(report)
+        for report in collection_reports.find({"dr_no": {"$in": list(bucket_upvotes)}},
+                                              {"_id": 0, "dr_no": 1, "area": 1, "area_name": 1})
+    }
+    operations = [
+        operation
+        for report_id, report_upvotes in bucket_upvotes.items()
+        for operation in upvote_store.bucket_operations(report_id, report_upvotes, area_names.get(report_id))
+    ]
+    collection_upvote_buckets.bulk_write(operations, ordered=False)
+
+
+def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, batch_size=10000, raise_errors=False):
+    """
+    Efficiently bulk generate upvotes for multiple reports and update MongoDB.
+
+    Write errors are printed and skipped, or raised with `raise_errors` (for callers that retry).
+    """
 
     upvotes_collection_list = []  # Stores bulk upvote data
     operations = []  # Stores MongoDB bulk update operations
+    bucket_upvotes = {}  # report_id -> upvotes, written to `upvote_buckets` in bucketed mode
 
     # Preload officers into a list for fast random selection
     officer_pool = [
@@ -164,6 +171,7 @@ def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, b
         if should_have_upvotes:
             num_upvotes = random.randint(1, 3)  #  Precompute random number
 
+            report_upvotes = []
             for _ in range(num_upvotes):
                 officer = random.choice(officer_pool)  # Faster than calling `get_random_officer()`
 
@@ -177,17 +185,14 @@ def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, b
                 }
 
                 upvotes_collection_list.append(upvote_data)
+                report_upvotes.append(upvote_data)
 
-                # Use `$addToSet` to prevent duplicate upvotes
-                operations.append(UpdateOne(
-                    {"dr_no": report_id},
-                    {
-                        "$inc": {"upvotes.count": 1},
-                        "$addToSet": {"upvotes.list": upvote_data},  #  Prevents duplicate upvotes
-                        "$setOnInsert": {"dr_no": report_id}  #  Ensures report exists
-                    },
-                    upsert=True
-                ))
+            # One merged update per report, in the configured upvote storage mode
+            update = upvote_store.report_upvote_update(report_upvotes)
+            update["$setOnInsert"] = {"dr_no": report_id}  #  Ensures report exists
+            operations.append(UpdateOne({"dr_no": report_id}, update, upsert=True))
+            if upvote_store.is_bucketed():
+                bucket_upvotes[report_id] = report_upvotes
 
         # Insert & update in large batches to optimize performance
         if len(upvotes_collection_list) >= batch_size:
@@ -195,6 +200,8 @@ def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, b
                 collection_upvotes.insert_many(upvotes_collection_list, ordered=False)
                 print(f"Inserted {len(upvotes_collection_list)} upvotes successfully!")
             except Exception as e:
+                if raise_errors:
+                    raise
                 print(f"Bulk insert error: {e}")
             upvotes_collection_list.clear()  # Free memory
 
@@ -202,9 +209,13 @@ def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, b
             try:
                 collection_reports.bulk_write(operations, ordered=False)
                 print(f"Updated {len(operations)} reports with upvotes!")
+                write_upvote_buckets(bucket_upvotes)
             except Exception as e:
+                if raise_errors:
+                    raise
                 print(f"⚠️ Bulk update error: {e}")
             operations.clear()  # Free memory
+            bucket_upvotes.clear()
 
     # Final batch insert & update (if anything remains)
     if upvotes_collection_list:
@@ -212,12 +223,17 @@ def generate_random_upvotes_bulk(report_ids, officer_list, force_upvote=False, b
             collection_upvotes.insert_many(upvotes_collection_list, ordered=False)
             print(f" Inserted {len(upvotes_collection_list)} upvotes successfully!")
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"⚠️ Bulk insert error: {e}")
 
     if operations:
         try:
             collection_reports.bulk_write(operations, ordered=False)
             print(f"Updated {len(operations)} reports with upvotes!")
+            write_upvote_buckets(bucket_upvotes)
         except Exception as e:
+            if raise_errors:
+                raise
             print(f" Bulk update error: {e}")
 
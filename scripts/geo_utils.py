@@ -0,0 +1,49 @@
+import math
+
+# GeoJSON point stored next to location_info.lat/lon and covered by the 2dsphere index
+GEO_POINT_FIELD = "location_info.point"
+EARTH_RADIUS_METERS = 6_378_100
+
+
+def valid_coordinates(lat, lon):
+    """
+    True for a usable (lat, lon) pair.
+
+    The LAPD feed writes 0 for unknown coordinates, so "null island" (0, 0), or either
+    coordinate at 0, is rejected along with missing, NaN and out-of-range values.
+    """
+    if lat is None or lon is None:
+        return False
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return False
+    if math.isnan(lat) or math.isnan(lon) or lat == 0 or lon == 0:
+        return False
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def geo_point(lat, lon):
+    """GeoJSON point ([lon, lat] order) for valid coordinates, otherwise None."""
+    if not valid_coordinates(lat, lon):
+        return None
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+
+def location_fields(location, lat, lon):
+    """Return the `location_info` document stored on every report; invalid coordinates become None."""
+    point = geo_point(lat, lon)
+    return {
+        "location": location,
+        "lat": float(lat) if point else None,
+        "lon": float(lon) if point else None,
+        "point": point,
+    }
+
+
+def bbox_polygon(min_lat, min_lon, max_lat, max_lon):
+    """GeoJSON polygon for a bounding box (counter-clockwise, closed ring)."""
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise ValueError("min_lat/min_lon must be below max_lat/max_lon.")
+    ring = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+    return {"type": "Polygon", "coordinates": [ring]}
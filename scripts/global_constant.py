@@ -3,4 +3,4 @@ NUM_OFFICERS = 5000
 # List of police ranks
 RANKS = ["Officer", "Detective", "Sergeant", "Lieutenant", "Captain", "Deputy Chief", "Chief of Police"]
 # List of police departments
-DEPARTMENTS = ["Homicide", "Narcotics", "Cyber Crime", "Traffic Control", "Patrol", "Forensics", "Special Ops"]
\ No newline at end of file
+DEPARTMENTS = ["Homicide", "Narcotics", "Cyber Crime", "Traffic Control", "Patrol", "Forensics", "Special Ops"]
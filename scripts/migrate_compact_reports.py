@@ -0,0 +1,70 @@
+from pymongo import UpdateOne
+
+from db import get_sync_database, collection_reports_name
+from scripts.migration_utils import migrate_in_batches, migration_parser
+from services.reference_codes import (REPORT_LABEL_FIELDS, VICTIM_FIELDS, collect_labels, compact_report,
+                                      reference_codes)
+
+DEFAULT_BATCH_SIZE = 1_000
+
+# Everything the migration reads from a report: its codes, labels and victim fields
+PROJECTION = {field: 1 for fields in REPORT_LABEL_FIELDS.values() for field in fields} | {field: 1 for field in VICTIM_FIELDS}
+LABEL_FIELDS = [label_field for _, label_field in REPORT_LABEL_FIELDS.values()]
+
+
+def _value(report, field):
+    for key in field.split("."):
+        report = report.get(key) if isinstance(report, dict) else None
+    return report
+
+
+def compact_update(report):
+    """Update dropping a report's labels and storing victim codes instead of labels."""
+    compacted = compact_report({key: value.copy() if isinstance(value, dict) else value for key, value in report.items()})
+    update = {"$unset": {field: "" for field in LABEL_FIELDS}}
+    victim = {field: _value(compacted, field) for field in VICTIM_FIELDS if _value(compacted, field) != _value(report, field)}
+    if victim:
+        update["$set"] = victim
+    return update
+
+
+def expand_update(report):
+    """Update writing a compact report's labels back from the reference dictionaries."""
+    expanded = reference_codes.expand({key: value.copy() if isinstance(value, dict) else value for key, value in report.items()})
+    return {"$set": {field: _value(expanded, field) for field in LABEL_FIELDS + list(VICTIM_FIELDS)}}
+
+
+def migrate_reports(expand=False, batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """
+    Convert stored reports to compact documents (or back to expanded ones with `expand`).
+
+    Labels are saved to `reference_codes` before they are removed from a batch. The API reads
+    both forms while the migration runs.
+    """
+    db = get_sync_database()
+    collection_reports = db[collection_reports_name]
+    reference_codes.refresh_sync(db)
+
+    if expand:
+        query = {"area_name": {"$exists": False}}
+    else:
+        query = {"$or": [{field: {"$exists": True}} for field in LABEL_FIELDS]}
+
+    def make_operations(batch):
+        if expand:
+            return [UpdateOne({"_id": report["_id"]}, expand_update(report)) for report in batch]
+        reference_codes.save_sync(db, collect_labels(batch))  # Labels are stored before they are dropped
+        return [UpdateOne({"_id": report["_id"]}, compact_update(report)) for report in batch]
+
+    migrated, _ = migrate_in_batches(collection_reports, query, make_operations, PROJECTION, batch_size, pause,
+                                     "Report expansion" if expand else "Report compaction")
+    print(f"Set LAPD_REPORT_STORAGE={'expanded' if expand else 'compact'} before restarting the API.")
+    return migrated
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = migration_parser("Convert reports between expanded and compact (code-only) documents.", DEFAULT_BATCH_SIZE)
+    parser.add_argument("--expand", action="store_true", help="Write the labels back into compact reports")
+    args = parser.parse_args()
+    migrate_reports(args.expand, args.batch_size, args.pause)
@@ -0,0 +1,46 @@
+from pymongo import UpdateOne
+
+from db import get_sync_database, collection_reports_name
+from scripts import time_utils
+from scripts.migration_utils import DEFAULT_BATCH_SIZE, migrate_in_batches, migration_parser
+
+
+def build_date_update(report):
+    """Return the $set document converting a report's string dates, or None if it can't be parsed."""
+    try:
+        return time_utils.typed_date_fields(report["date_rptd"], report["date_occ"], report["time_occ"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def migrate_report_dates(batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """Convert the `date_rptd`/`date_occ`/`time_occ` strings of stored reports to typed fields."""
+    collection_reports = get_sync_database()[collection_reports_name]
+    query = {"date_occ": {"$type": "string"}}
+    projection = {"date_rptd": 1, "date_occ": 1, "time_occ": 1}
+
+    skipped = 0
+
+    def make_operations(batch):
+        nonlocal skipped
+        operations = []
+        for report in batch:
+            update = build_date_update(report)
+            if update is None:
+                skipped += 1
+                continue
+            # Guard on the string type so a concurrent writer's typed value is never overwritten
+            operations.append(UpdateOne({"_id": report["_id"], "date_occ": {"$type": "string"}}, {"$set": update}))
+        return operations
+
+    _, migrated = migrate_in_batches(collection_reports, query, make_operations, projection, batch_size, pause,
+                                     "Date migration")
+    print(f"{migrated} reports migrated, {skipped} skipped")
+    return migrated, skipped
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = migration_parser("Convert report date strings to BSON datetimes.")
+    args = parser.parse_args()
+    migrate_report_dates(args.batch_size, args.pause)
@@ -0,0 +1,45 @@
+from pymongo import UpdateOne
+
+from db import get_sync_database, collection_reports_name
+from scripts import geo_utils
+from scripts.migration_utils import DEFAULT_BATCH_SIZE, migrate_in_batches, migration_parser
+
+
+def migrate_report_points(batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """
+    Backfill `location_info.point` for reports loaded before it existed.
+
+    Null-island and missing coordinates get a null point (and null lat/lon), so the 2dsphere
+    index and the spatial endpoints skip them.
+    """
+    collection_reports = get_sync_database()[collection_reports_name]
+    query = {geo_utils.GEO_POINT_FIELD: {"$exists": False}}
+    projection = {"location_info": 1}
+
+    located = unlocated = 0
+
+    def make_operations(batch):
+        nonlocal located, unlocated
+        operations = []
+        for report in batch:
+            location = report.get("location_info") or {}
+            fields = geo_utils.location_fields(location.get("location"), location.get("lat"), location.get("lon"))
+            if fields["point"]:
+                located += 1
+            else:
+                unlocated += 1
+            # Guard on the missing point so a concurrent writer's document is never overwritten
+            operations.append(UpdateOne({"_id": report["_id"], geo_utils.GEO_POINT_FIELD: {"$exists": False}},
+                                        {"$set": {"location_info": fields}}))
+        return operations
+
+    migrate_in_batches(collection_reports, query, make_operations, projection, batch_size, pause, "Point backfill")
+    print(f"{located} reports located, {unlocated} without usable coordinates")
+    return located, unlocated
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = migration_parser("Add GeoJSON points to reports and drop null-island coordinates.")
+    args = parser.parse_args()
+    migrate_report_points(args.batch_size, args.pause)
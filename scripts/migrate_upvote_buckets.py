@@ -0,0 +1,78 @@
+from pymongo import UpdateOne
+
+from config import UPVOTE_RECENT_VOTERS
+from db import get_sync_database, collection_reports_name, collection_upvote_buckets_name
+from scripts.migration_utils import migrate_in_batches, migration_parser
+from services.reference_codes import reference_codes, report_area_name
+from services.upvote_store import UPVOTE_BUCKET_KEY, bucket_operations, recent_voter
+
+DEFAULT_BATCH_SIZE = 1_000
+
+
+def bucketed_voters(collection_buckets, report_ids):
+    """report_id -> badge numbers already in its buckets (an officer upvotes a report at most once)."""
+    voters = {}
+    for bucket in collection_buckets.find({"report_id": {"$in": list(report_ids)}},
+                                          {"report_id": 1, "upvotes.officer_badge_number": 1}):
+        voters.setdefault(bucket["report_id"], set()).update(upvote["officer_badge_number"] for upvote in bucket["upvotes"])
+    return voters
+
+
+def bucket_appends(report, voters):
+    """Operations appending the report's embedded upvotes that aren't bucketed yet to its buckets."""
+    upvotes = [upvote for upvote in report["upvotes"]["list"] if upvote["officer_badge_number"] not in voters]
+    if not upvotes:
+        return []
+    return bucket_operations(report["dr_no"], upvotes, report_area_name(report))
+
+
+def migrate_upvote_buckets(batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """
+    Move embedded `upvotes.list` arrays into `upvote_buckets`.
+
+    Each report keeps `upvotes.count` and gets `upvotes.recent`, a summary of its last voters.
+    Upvotes are appended to the report's existing buckets, like the API does in bucketed mode, so
+    votes embedded again after a first run (API still in embedded mode) are added to the buckets
+    instead of replacing them. Buckets are written before the list is removed, and upvotes already
+    in a bucket are skipped, so an interrupted run can be started again.
+    """
+    db = get_sync_database()
+    collection_reports = db[collection_reports_name]
+    collection_buckets = db[collection_upvote_buckets_name]
+    collection_buckets.create_index(UPVOTE_BUCKET_KEY)
+    reference_codes.refresh_sync(db)  # Area names of compact reports
+
+    query = {"upvotes.list.0": {"$exists": True}}
+    projection = {"dr_no": 1, "area": 1, "area_name": 1, "upvotes.list": 1}
+
+    def make_operations(batch):
+        voters = bucketed_voters(collection_buckets, [report["dr_no"] for report in batch])
+        bucket_ops = [operation for report in batch for operation in bucket_appends(report, voters.get(report["dr_no"], set()))]
+        if bucket_ops:
+            collection_buckets.bulk_write(bucket_ops, ordered=True)  # In order: each append may fill the open bucket
+
+        return [
+            UpdateOne(
+                {"_id": report["_id"]},
+                {
+                    "$push": {"upvotes.recent": {  # Most recent voters, after those of a previous run
+                        "$each": [recent_voter(upvote) for upvote in report["upvotes"]["list"]],
+                        "$slice": -UPVOTE_RECENT_VOTERS
+                    }},
+                    "$unset": {"upvotes.list": ""}
+                }
+            )
+            for report in batch
+        ]
+
+    migrated, _ = migrate_in_batches(collection_reports, query, make_operations, projection, batch_size, pause,
+                                     "Upvote bucket migration")
+    print("Set LAPD_UPVOTE_STORAGE=bucketed before restarting the API.")
+    return migrated
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = migration_parser("Move embedded report upvotes into fixed-size bucket documents.", DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    migrate_upvote_buckets(args.batch_size, args.pause)
@@ -0,0 +1,46 @@
+import argparse
+import time
+
+from pymongo import ASCENDING
+
+DEFAULT_BATCH_SIZE = 5_000
+
+
+def migrate_in_batches(collection, query, make_operations, projection=None, batch_size=DEFAULT_BATCH_SIZE, pause=0.0,
+                       name="Migration"):
+    """
+    Write `make_operations(batch)` to `collection` for every document matching `query`.
+
+    Documents are walked in `_id` batches and only selected while they still match `query`, so a
+    migration can run online while the API keeps serving, and an interrupted run can simply be
+    started again. Returns (documents read, documents modified).
+    """
+    last_id = None
+    documents = modified = 0
+    started = time.perf_counter()
+    while True:
+        batch_query = {"$and": [query, {"_id": {"$gt": last_id}}]} if last_id is not None else query
+        batch = list(collection.find(batch_query, projection).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = make_operations(batch)
+        if operations:
+            modified += collection.bulk_write(operations, ordered=False).modified_count
+        documents += len(batch)
+        print(f"{name}: {documents} documents ...")
+        if pause:
+            time.sleep(pause)  # Throttle to leave write capacity to the API
+
+    elapsed = time.perf_counter() - started
+    print(f"🎉 {name} finished: {documents} documents in {elapsed:.1f}s")
+    return documents, modified
+
+
+def migration_parser(description, batch_size=DEFAULT_BATCH_SIZE):
+    """Command line parser with the batch size and throttling options of every migration."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--batch-size", type=int, default=batch_size)
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    return parser
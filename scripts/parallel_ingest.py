@@ -0,0 +1,180 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import bson
+import pandas as pd
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
+
+from scripts import build_rollups, db_utils
+from scripts.populate_db import (CSV_FILE_PATH, CHUNK_SIZE, CSV_DTYPES, db, collection_reports, collection_officers,
+                                 collection_upvotes, reset_collections, transform_chunk)
+from services.reference_codes import collect_labels, compact_report, is_compact, reference_codes
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../files/ingest_checkpoint.json")
+DEFAULT_WRITERS = 4
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _transform_worker(chunk_index, chunk):
+    """
+    Runs in a worker process: transform a chunk and BSON-encode it so the parent doesn't re-encode.
+    The chunk's code labels are returned for the parent to record (and dropped here in compact mode).
+    """
+    records = transform_chunk(chunk)
+    labels = collect_labels(records)
+    if is_compact():
+        records = [compact_report(record) for record in records]
+    return chunk_index, [bson.encode(record) for record in records], [record["dr_no"] for record in records], labels
+
+
+def _write_chunk(chunk_index, encoded_records, report_ids, labels, officers):
+    """
+    Runs in a writer thread: insert one chunk and generate its upvotes.
+
+    Any failure (upvotes included) raises, so the chunk isn't checkpointed and is retried on resume.
+    """
+    reference_codes.save_sync(db, labels)  # Before the reports, so every stored code has a label
+    documents = [RawBSONDocument(record) for record in encoded_records]
+    try:
+        collection_reports.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Reports already written by an interrupted run are rejected by the unique `dr_no` index.
+        # Those that already got upvotes keep them, the others are upvoted like new reports
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        duplicates = {report_ids[error["index"]] for error in errors}
+        upvoted = set(collection_upvotes.distinct("report_id", {"report_id": {"$in": list(duplicates)}}))
+        report_ids = [report_id for report_id in report_ids if report_id not in upvoted]
+    db_utils.generate_random_upvotes_bulk(report_ids, officers, raise_errors=True)
+    return chunk_index, len(documents)
+
+
+class IngestCheckpoint:
+    """JSON file recording which CSV chunks are fully committed, so an interrupted load can resume."""
+
+    def __init__(self, path, csv_file, chunk_size):
+        self.path = path
+        self.csv_file = os.path.abspath(csv_file)
+        self.chunk_size = chunk_size
+        self.committed = set()
+
+    def load(self):
+        """Load committed chunks; returns False if there is no usable checkpoint for this file/chunk size."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("csv_file") != self.csv_file or data.get("chunk_size") != self.chunk_size:
+            print("⚠️ Checkpoint belongs to another file or chunk size, ignoring it.")
+            return False
+        self.committed = set(data.get("committed", []))
+        return True
+
+    def mark_committed(self, chunk_index):
+        self.committed.add(chunk_index)
+        self.save()
+
+    def save(self):
+        data = {"csv_file": self.csv_file, "chunk_size": self.chunk_size, "committed": sorted(self.committed)}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)  # Atomic, a crash never leaves a half-written checkpoint
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load_csv_parallel(csv_file, chunk_size=CHUNK_SIZE, workers=None, writers=DEFAULT_WRITERS,
+                      checkpoint_path=DEFAULT_CHECKPOINT_PATH, restart=False):
+    """
+    Parallel, resumable CSV ingest.
+
+    A process pool transforms chunks while a bounded pool of writer threads runs unordered
+    `insert_many` calls. Committed chunks are recorded in the checkpoint file: a failed chunk
+    is reported and skipped, and running the command again only processes what is missing.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = IngestCheckpoint(checkpoint_path, csv_file, chunk_size)
+
+    if restart or not checkpoint.load():
+        checkpoint.clear()
+        reset_collections()
+        collection_reports.create_index("dr_no", unique=True)
+        officers = db_utils.generate_officers()
+        checkpoint.save()
+    else:
+        print(f"↩️ Resuming: {len(checkpoint.committed)} chunks already committed.")
+        officers = list(collection_officers.find({}, {"_id": 0, "name": 1, "email": 1, "badge_number": 1}))
+
+    # Bound the chunks held in memory (queued for transform or write) to a few per worker
+    max_in_flight = 2 * (workers + writers)
+    total_rows = 0
+    failed_chunks = []
+    started = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as transform_pool, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=writers) as write_pool:
+        in_flight = {}  # future -> ("transform" | "write", chunk_index)
+
+        def drain(return_when):
+            nonlocal total_rows
+            done, _ = concurrent.futures.wait(in_flight, return_when=return_when)
+            for future in done:
+                kind, chunk_index = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed_chunks.append(chunk_index)
+                    print(f"❌ Chunk {chunk_index} failed during {kind}: {e}")
+                    continue
+                if kind == "transform":
+                    _, encoded_records, report_ids, labels = result
+                    write_future = write_pool.submit(_write_chunk, chunk_index, encoded_records, report_ids, labels,
+                                                     officers)
+                    in_flight[write_future] = ("write", chunk_index)
+                else:
+                    _, rows = result
+                    checkpoint.mark_committed(chunk_index)
+                    total_rows += rows
+                    elapsed = time.perf_counter() - started
+                    print(f"Committed chunk {chunk_index}: {total_rows} reports ({total_rows / elapsed:,.0f} rows/sec)")
+
+        reader = pd.read_csv(csv_file, chunksize=chunk_size, dtype=CSV_DTYPES)
+        for chunk_index, chunk in enumerate(reader):
+            if chunk_index in checkpoint.committed:
+                continue
+            in_flight[transform_pool.submit(_transform_worker, chunk_index, chunk)] = ("transform", chunk_index)
+            while len(in_flight) >= max_in_flight:
+                drain(concurrent.futures.FIRST_COMPLETED)
+
+        while in_flight:
+            drain(concurrent.futures.FIRST_COMPLETED)
+
+    elapsed = time.perf_counter() - started
+    print(f"🎉 Imported {total_rows} reports in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    if failed_chunks:
+        print(f"⚠️ {len(failed_chunks)} chunks failed {sorted(failed_chunks)}; run again to resume them.")
+    else:
+        checkpoint.clear()
+        build_rollups.build_rollups()
+    return total_rows, failed_chunks
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel, resumable load of the LAPD crime CSV.")
+    parser.add_argument("csv_file", nargs="?", default=CSV_FILE_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Transform processes (default: CPU count)")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS, help="Concurrent insert_many writers")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and reload from scratch")
+    args = parser.parse_args()
+    load_csv_parallel(args.csv_file, args.chunk_size, args.workers, args.writers, args.checkpoint, args.restart)
@@ -1,10 +1,20 @@
+import argparse
 import concurrent.futures
 import os
+import time
 from datetime import datetime
 import pandas as pd
-from db import db, collection_reports_name, collection_reports, collection_upvotes_name, collection_officers, \
-    collection_officer_name, collection_upvotes
-from scripts import db_utils
+from pymongo.errors import BulkWriteError
+from db import get_sync_database, collection_reports_name, collection_upvotes_name, collection_officer_name, \
+    collection_upvote_buckets_name
+from scripts import build_rollups, db_utils, geo_utils, time_utils
+from services.reference_codes import (SEX_LABELS, DESCENT_LABELS, collection_reference_codes_name, descent_label,
+                                      prepare_reports_sync, sex_label)
+
+db = get_sync_database()
+collection_reports = db[collection_reports_name]
+collection_upvotes = db[collection_upvotes_name]
+collection_officers = db[collection_officer_name]
 
 
 # Path to CSV file
@@ -13,13 +23,11 @@ CSV_FILE_PATH = os.path.join(BASE_DIR, "../files/cd.csv")
 
 
 def transform_row(row):
-    # Convert DATE OCC (Ensure it's in MM/DD/YYYY format)
-    date_occ_str = row["DATE OCC"].split(" ")[0]  # Remove time portion if it exists
-    date_occ = datetime.strptime(date_occ_str, "%m/%d/%Y")  # Convert to datetime
+    # Store DATE RPTD / DATE OCC as native datetimes plus the combined occurrence timestamp
+    # and the minute of the day, so queries can use indexed range predicates
+    time_occ = str(int(row["TIME OCC"])).zfill(4)  # Ensure 4-digit HHMM format
+    date_fields = time_utils.typed_date_fields(row["Date Rptd"], row["DATE OCC"], time_occ)
 
-    # Convert TIME OCC (Ensure it's in HHMM format)
-    time_occ_str = str(int(row["TIME OCC"])).zfill(4)  # Ensure 4-digit format
-    time_occ = time_occ_str# Store as an integer (e.g., 2130 for 21:30)
     # Extract first crime description
     primary_crime_desc = str(row.get("Crm Cd Desc", "")).strip()
 
@@ -36,9 +44,7 @@ def transform_row(row):
     }
     return {
         "dr_no": str(row["DR_NO"]),
-        "date_rptd": row["Date Rptd"],
-        "date_occ": str(row["DATE OCC"]),
-        "time_occ": time_occ,
+        **date_fields,
         "area": int(row["AREA"]),
         "area_name": row["AREA NAME"],
         "rpt_dist_no": str(row["Rpt Dist No"]),
@@ -49,8 +55,8 @@ def transform_row(row):
 
         "victim": {
             "vict_age": int(row["Vict Age"]) if pd.notna(row["Vict Age"]) else None,
-            "vict_sex": db_utils.mapping_gender(row["Vict Sex"]),
-            "vict_descent": db_utils.mapping_descent(row["Vict Descent"])
+            "vict_sex": sex_label(row["Vict Sex"]),
+            "vict_descent": descent_label(row["Vict Descent"])
         },
 
         "premis": {
@@ -63,11 +69,8 @@ def transform_row(row):
             "weapon_desc": str(row["Weapon Desc"]) if pd.notna(row["Weapon Desc"]) else ""
         },
 
-        "location_info": {
-            "location": row["LOCATION"],
-            "lat": float(row["LAT"]) if pd.notna(row["LAT"]) else None,
-            "lon": float(row["LON"]) if pd.notna(row["LON"]) else None
-        },
+        # lat/lon plus a GeoJSON point for the 2dsphere index; null-island/missing coordinates are dropped
+        "location_info": geo_utils.location_fields(row["LOCATION"], row["LAT"], row["LON"]),
 
         "status": row["Status"],
         "status_desc": row["Status Desc"],
@@ -78,40 +81,204 @@ def transform_row(row):
     }
 
 
+# Rows read, transformed and written per batch by the streaming ingest
+CHUNK_SIZE = 10_000
+DUPLICATE_KEY_ERROR = 11000
+
+# Code columns are read as strings so "101" never becomes "101.0"
+CSV_DTYPES = {
+    "DR_NO": str,
+    "Rpt Dist No": str,
+    "Premis Cd": str,
+    "Weapon Used Cd": str,
+    "Crm Cd 1": str,
+    "Crm Cd 2": str,
+    "Crm Cd 3": str,
+    "Crm Cd 4": str,
+    "Mocodes": str,
+}
+
+
+def _column_or_empty(chunk, column):
+    """Column as stripped strings with "" for missing values (vectorized `clean_text`)."""
+    if column not in chunk:
+        return [""] * len(chunk)
+    return chunk[column].fillna("").astype(str).str.strip().tolist()
+
+
+def _nullable(series):
+    """Python objects with None instead of NaN/NaT, ready for BSON encoding."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _lapd_datetimes(series):
+    """Vectorized `time_utils.parse_lapd_datetime`: full LAPD timestamps, or date-only values ("03/01/2020")."""
+    parsed = pd.to_datetime(series, format=time_utils.LAPD_DATETIME_FORMAT, errors="coerce")
+    retry = parsed.isna() & series.notna()
+    if retry.any():
+        dates = series[retry].astype(str).str.strip().str.split(" ").str[0]
+        parsed[retry] = pd.to_datetime(dates, format=time_utils.QUERY_DATE_FORMAT, errors="coerce")
+    return parsed
+
+
+def transform_chunk(chunk):
+    """Vectorized `transform_row` for a whole DataFrame chunk. Returns the report documents."""
+    # Dates and time of day
+    date_rptd = _lapd_datetimes(chunk["Date Rptd"])
+    date_occ = _lapd_datetimes(chunk["DATE OCC"]).dt.normalize()
+    time_occ = pd.to_numeric(chunk["TIME OCC"], errors="coerce").fillna(0).astype(int)
+    minute_occ = (time_occ // 100) * 60 + time_occ % 100
+    occurred_at = date_occ + pd.to_timedelta(minute_occ, unit="m")
+    time_occ_str = time_occ.astype(str).str.zfill(4)
+
+    # Crime codes: up to 4 per report, keep the 3-digit code and drop missing ones
+    code_columns = [
+        chunk[f"Crm Cd {i}"].str.strip().str[:3] if f"Crm Cd {i}" in chunk else pd.Series(None, index=chunk.index)
+        for i in range(1, 5)
+    ]
+    crime_codes = [
+        [code for code in codes if isinstance(code, str) and code and code.lower() != "nan"]
+        for codes in zip(*(column.tolist() for column in code_columns))
+    ]
+
+    # Victim demographics
+    vict_age = pd.to_numeric(chunk["Vict Age"], errors="coerce").astype("Int64")
+    vict_sex = chunk["Vict Sex"].map(SEX_LABELS).fillna("Unknown")
+    vict_descent = chunk["Vict Descent"].map(DESCENT_LABELS)
+
+    mocodes = chunk["Mocodes"].fillna("").str.split()
+    # Coordinates: the feed uses 0 for unknown, drop those (and anything out of range) before building points
+    lat = pd.to_numeric(chunk["LAT"], errors="coerce")
+    lon = pd.to_numeric(chunk["LON"], errors="coerce")
+    valid = lat.between(-90, 90) & lon.between(-180, 180) & (lat != 0) & (lon != 0)
+    lat, lon = lat.where(valid), lon.where(valid)
+
+    columns = zip(
+        chunk["DR_NO"].astype(str).tolist(), _nullable(date_rptd), _nullable(date_occ), time_occ_str.tolist(),
+        minute_occ.tolist(), _nullable(occurred_at), chunk["AREA"].astype(int).tolist(),
+        _column_or_empty(chunk, "AREA NAME"), _column_or_empty(chunk, "Rpt Dist No"), crime_codes,
+        _column_or_empty(chunk, "Crm Cd Desc"), mocodes.tolist(), _nullable(vict_age), vict_sex.tolist(),
+        _nullable(vict_descent), _column_or_empty(chunk, "Premis Cd"), _column_or_empty(chunk, "Premis Desc"),
+        _column_or_empty(chunk, "Weapon Used Cd"), _column_or_empty(chunk, "Weapon Desc"),
+        _column_or_empty(chunk, "LOCATION"), _nullable(lat), _nullable(lon), _column_or_empty(chunk, "Status"),
+        _column_or_empty(chunk, "Status Desc"),
+    )
+    return [
+        {
+            "dr_no": dr_no,
+            "date_rptd": rptd,
+            "date_occ": occ,
+            "time_occ": hhmm,
+            "minute_occ": minute,
+            "occurred_at": occurred,
+            "area": area,
+            "area_name": area_name,
+            "rpt_dist_no": rpt_dist_no,
+            "crm_codes": {"crime_codes": codes, "crm_cd_desc": crm_cd_desc},
+            "mocodes": mo,
+            "victim": {"vict_age": age, "vict_sex": sex, "vict_descent": descent},
+            "premis": {"premis_cd": premis_cd, "premis_desc": premis_desc},
+            "weapon": {"weapon_used_cd": weapon_cd, "weapon_desc": weapon_desc},
+            "location_info": {
+                "location": location, "lat": y, "lon": x,
+                "point": {"type": "Point", "coordinates": [x, y]} if y is not None else None,
+            },
+            "status": status,
+            "status_desc": status_desc,
+            "upvotes": {"count": 0, "list": []},
+        }
+        for (dr_no, rptd, occ, hhmm, minute, occurred, area, area_name, rpt_dist_no, codes, crm_cd_desc, mo, age,
+             sex, descent, premis_cd, premis_desc, weapon_cd, weapon_desc, location, y, x, status,
+             status_desc) in columns
+    ]
+
+
 def bulk_insert(data):
-    """Insert data into MongoDB in bulk."""
+    """Insert data into MongoDB in bulk (recording new codes, compacted in compact storage mode)."""
     if data:
-        collection_reports.insert_many(data)
+        collection_reports.insert_many(prepare_reports_sync(db, data), ordered=False)
 
 
-def load_csv_to_mongodb(csv_file):
-    """Loads CSV data efficiently into MongoDB."""
-    CHUNK_SIZE = 10_000
+def insert_new_reports(records):
+    """`bulk_insert` skipping reports whose `dr_no` is already stored; returns the dr_no of the inserted ones."""
+    try:
+        bulk_insert(records)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        duplicates = {error["index"] for error in errors}
+        return [record["dr_no"] for index, record in enumerate(records) if index not in duplicates]
+    return [record["dr_no"] for record in records]
+
+
+def reset_collections():
+    """Drop and recreate the reports, officers and upvotes collections."""
+    collection_reports.drop()  # 🗑️ Drop old collection to start fresh
+    collection_officers.drop()
+    collection_upvotes.drop()
+    db[collection_upvote_buckets_name].drop()
+    db[collection_reference_codes_name].drop()
+    print("🗑️ Collection dropped successfully.")
+
+    try:
+        db.create_collection(collection_upvotes_name)
+        db.create_collection(collection_officer_name)
+        db.create_collection(collection_reports_name)
+        print("✅ Collection schema updated to expect strings for all codes!")
+    except Exception as e:
+        print(f"⚠️ Schema creation skipped (might already exist): {e}")
+
+
+def load_csv_streaming(csv_file, chunk_size=CHUNK_SIZE):
+    """
+    Streams the CSV into MongoDB chunk by chunk.
 
+    Each chunk is transformed with vectorized column operations, written with one unordered
+    `insert_many` and upvoted before the next chunk is read, so peak memory depends on
+    `chunk_size` and not on the size of the file.
+    """
     try:
-        collection_reports.drop()  # 🗑️ Drop old collection to start fresh
-        collection_officers.drop()
-        collection_upvotes.drop()
-        print("🗑️ Collection dropped successfully.")
-
-        try:
-            db.create_collection(collection_upvotes_name)
-            db.create_collection(collection_officer_name)
-            db.create_collection(collection_reports_name)
-            print("✅ Collection schema updated to expect strings for all codes!")
-        except Exception as e:
-            print(f"⚠️ Schema creation skipped (might already exist): {e}")
+        reset_collections()
+        collection_reports.create_index("dr_no", unique=True)
+        list_officers = db_utils.generate_officers()
+
+        total_rows = 0
+        started = time.perf_counter()
+        for chunk in pd.read_csv(csv_file, chunksize=chunk_size, dtype=CSV_DTYPES):
+            records = transform_chunk(chunk)
+            # A duplicate `dr_no` in the file only skips that row, not the rest of the load
+            report_ids = insert_new_reports(records)
+            db_utils.generate_random_upvotes_bulk(report_ids, list_officers)
+
+            total_rows += len(records)
+            elapsed = time.perf_counter() - started
+            skipped = f", {len(records) - len(report_ids)} duplicates skipped" if len(report_ids) < len(records) else ""
+            print(f"Imported {total_rows} reports ({total_rows / elapsed:,.0f} rows/sec{skipped})")
+
+        elapsed = time.perf_counter() - started
+        print(f"🎉 Done all! {total_rows} reports in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+        build_rollups.build_rollups()
+    except Exception as e:
+        print(f"❌ Error occurred: {e}")
+
+
+def load_csv_to_mongodb(csv_file):
+    """Loads the whole CSV in memory and inserts it in one batch (kept for small files)."""
+    try:
+        reset_collections()
         list_officers = db_utils.generate_officers()
         list_records = []
         list_record_ids=[]
         for _, row in pd.read_csv(csv_file).iterrows():  # ✅ Use `.iterrows()`
             list_records.append(transform_row(row))
             list_record_ids.append(str(row["DR_NO"]))
-        collection_reports.insert_many(list_records)
+        collection_reports.insert_many(prepare_reports_sync(db, list_records))
         print("🎉 All data imported successfully!")
-        collection_reports.create_index("dr_no")
+        collection_reports.create_index("dr_no", unique=True)
         print("index created")
         db_utils.generate_random_upvotes_bulk(list_record_ids,list_officers)
+        build_rollups.build_rollups()
         print("🎉 Done all!")
     except Exception as e:
         print(f"❌ Error occurred: {e}")
@@ -119,4 +286,13 @@ def load_csv_to_mongodb(csv_file):
 
 # Run the function
 if __name__ == "__main__":
-    load_csv_to_mongodb("/Users/kbousinis/PycharmProjects/lapdMongoDatabase/files/cd.csv")
+    parser = argparse.ArgumentParser(description="Load the LAPD crime CSV into MongoDB.")
+    parser.add_argument("csv_file", nargs="?", default=CSV_FILE_PATH)
+    parser.add_argument("--mode", choices=["streaming", "in-memory"], default="streaming")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.mode == "streaming":
+        load_csv_streaming(args.csv_file, args.chunk_size)
+    else:
+        load_csv_to_mongodb(args.csv_file)
@@ -0,0 +1,552 @@
+import argparse
+import concurrent.futures
+import json
+import math
+import multiprocessing
+import os
+import struct
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+from config import UPVOTE_BUCKET_SIZE, UPVOTE_RECENT_VOTERS
+from scripts import global_constant, time_utils
+
+DEFAULT_SEED = 42
+# Reports are generated in fixed chunks seeded by chunk index: a dataset is the same whatever the
+# number of workers, and a dataset of any size is a prefix of every larger one
+CHUNK_SIZE = 10_000
+FIRST_DR_NO = 200_000_000
+# Upvotes per upvoted report follow a Zipf law with this exponent (must be > 1, lower is more skewed)
+DEFAULT_UPVOTE_SKEW = 2.0
+DEFAULT_UPVOTE_RATE = 0.2  # Share of reports with at least one upvote
+DEFAULT_MAX_UPVOTES = 1000
+# Officer popularity: the k-th most active officer votes with weight 1 / k ** skew
+DEFAULT_OFFICER_SKEW = 1.0
+# Chunks generated but not yet written, per worker process
+IN_FLIGHT_PER_WORKER = 2
+
+
+def _table(rows, *columns):
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _delay_weights(same_day=0.45, daily=0.12, max_days=365):
+    """Days between occurrence and report: most same day, then a geometric tail."""
+    days = np.arange(1, max_days + 1)
+    return [same_day] + ((1 - same_day) * daily * (1 - daily) ** (days - 1)).round(8).tolist()
+
+
+def _age_weights(no_person=27.0, mean=38.0, std=15.0):
+    """Victim age 0 means no person victim (vehicle theft, vandalism...), otherwise roughly normal."""
+    ages = np.arange(1, 100)
+    person = np.exp(-0.5 * ((ages - mean) / std) ** 2)
+    return [no_person] + (person / person.sum() * (100 - no_person)).round(6).tolist()
+
+
+# Approximate shares of the LAPD 2020-2024 feed. `--fit files/cd.csv` measures them on the real file
+DEFAULT_PROFILE = {
+    "first_day": "2020-01-01",
+    "days": 5 * 365,
+    "weekdays": [14.1, 13.9, 14.0, 14.1, 15.4, 14.5, 14.0],  # Monday first
+    "areas": _table([
+        (1, "Central", 34.044, -118.247, 0.012, 7.0), (2, "Rampart", 34.068, -118.275, 0.012, 4.6),
+        (3, "Southwest", 34.018, -118.305, 0.015, 5.6), (4, "Hollenbeck", 34.044, -118.206, 0.015, 3.7),
+        (5, "Harbor", 33.758, -118.289, 0.025, 4.0), (6, "Hollywood", 34.098, -118.331, 0.012, 5.3),
+        (7, "Wilshire", 34.059, -118.344, 0.015, 4.8), (8, "West LA", 34.046, -118.444, 0.025, 4.6),
+        (9, "Van Nuys", 34.184, -118.446, 0.02, 4.3), (10, "West Valley", 34.194, -118.538, 0.025, 4.0),
+        (11, "Northeast", 34.113, -118.250, 0.02, 4.2), (12, "77th Street", 33.970, -118.283, 0.015, 6.4),
+        (13, "Newton", 34.012, -118.257, 0.012, 4.9), (14, "Pacific", 33.985, -118.418, 0.025, 5.8),
+        (15, "N Hollywood", 34.172, -118.388, 0.02, 5.1), (16, "Foothill", 34.253, -118.411, 0.025, 3.4),
+        (17, "Devonshire", 34.257, -118.531, 0.025, 4.1), (18, "Southeast", 33.938, -118.267, 0.015, 5.0),
+        (19, "Mission", 34.273, -118.468, 0.025, 3.9), (20, "Olympic", 34.050, -118.292, 0.01, 5.0),
+        (21, "Topanga", 34.193, -118.599, 0.025, 4.1),
+    ], "code", "name", "lat", "lon", "spread", "weight"),
+    "crimes": _table([
+        ("510", "VEHICLE - STOLEN", 11.0, 0.01),
+        ("624", "BATTERY - SIMPLE ASSAULT", 7.5, 0.97),
+        ("354", "THEFT OF IDENTITY", 6.3, 0.0),
+        ("330", "BURGLARY FROM VEHICLE", 6.2, 0.01),
+        ("740", "VANDALISM - FELONY ($400 & OVER, ALL CHURCH VANDALISMS)", 6.1, 0.04),
+        ("310", "BURGLARY", 5.9, 0.01),
+        ("230", "ASSAULT WITH DEADLY WEAPON, AGGRAVATED ASSAULT", 5.5, 1.0),
+        ("440", "THEFT PLAIN - PETTY ($950 & UNDER)", 5.2, 0.01),
+        ("626", "INTIMATE PARTNER - SIMPLE ASSAULT", 4.9, 0.97),
+        ("442", "SHOPLIFTING - PETTY THEFT ($950 & UNDER)", 3.6, 0.02),
+        ("331", "THEFT FROM MOTOR VEHICLE - GRAND ($950.01 AND OVER)", 3.4, 0.0),
+        ("341", "THEFT-GRAND ($950.01 & OVER)EXCPT,GUNS,FOWL,LIVESTK,PROD", 3.4, 0.01),
+        ("210", "ROBBERY", 3.3, 0.95),
+        ("745", "VANDALISM - MISDEAMEANOR ($399 OR UNDER)", 3.2, 0.04),
+        ("420", "THEFT FROM MOTOR VEHICLE - PETTY ($950 & UNDER)", 2.7, 0.0),
+        ("930", "CRIMINAL THREATS - NO WEAPON DISPLAYED", 2.3, 0.6),
+        ("236", "INTIMATE PARTNER - AGGRAVATED ASSAULT", 1.8, 1.0),
+        ("900", "VIOLATION OF COURT ORDER", 1.3, 0.2),
+        ("480", "BIKE - STOLEN", 0.8, 0.0),
+        ("350", "THEFT, PERSON", 0.5, 0.3),
+    ], "code", "desc", "weight", "weapon_rate"),
+    "second_crime_rate": 0.07,
+    "premises": _table([
+        ("101", "STREET", 25.0), ("501", "SINGLE FAMILY DWELLING", 17.0), ("502", "MULTI-UNIT DWELLING (APARTMENT, DUPLEX, ETC)", 12.0),
+        ("108", "PARKING LOT", 7.0), ("203", "OTHER BUSINESS", 5.0), ("102", "SIDEWALK", 4.5),
+        ("122", "VEHICLE, PASSENGER/TRUCK", 3.0), ("210", "RESTAURANT/FAST FOOD", 2.0), ("707", "GARAGE/CARPORT", 1.5),
+        ("404", "DEPARTMENT STORE", 1.3), ("402", "MARKET", 1.2), ("503", "HOTEL", 1.0),
+    ], "code", "desc", "weight"),
+    "weapons": _table([
+        ("400", "STRONG-ARM (HANDS, FIST, FEET OR BODILY FORCE)", 55.0), ("500", "UNKNOWN WEAPON/OTHER WEAPON", 10.0),
+        ("511", "VERBAL THREAT", 7.0), ("102", "HAND GUN", 6.0), ("200", "KNIFE WITH BLADE 6INCHES OR LESS", 3.0),
+        ("109", "SEMI-AUTOMATIC PISTOL", 2.0), ("106", "UNKNOWN FIREARM", 2.0), ("207", "OTHER KNIFE", 2.0),
+        ("307", "VEHICLE", 1.5), ("512", "MACE/PEPPER SPRAY", 1.0),
+    ], "code", "desc", "weight"),
+    "statuses": _table([
+        ("IC", "Invest Cont", 80.0), ("AO", "Adult Other", 11.0), ("AA", "Adult Arrest", 8.0),
+        ("JA", "Juv Arrest", 0.3), ("JO", "Juv Other", 0.2),
+    ], "code", "desc", "weight"),
+    "hours": [4.3, 2.7, 2.3, 1.9, 1.6, 1.5, 2.0, 2.5, 3.5, 3.8, 4.0, 4.0,
+              6.6, 4.7, 4.8, 5.2, 5.3, 5.6, 6.3, 5.7, 5.6, 5.1, 4.6, 4.2],
+    "minute_on_hour": 0.35,  # Times are mostly rounded: HH00, then HH30
+    "minute_half_hour": 0.08,
+    "report_delay_days": _delay_weights(),
+    "victim_age": _age_weights(),
+    # Sex / descent codes ("" = missing), for reports with and without a person victim
+    "victim_sex": {"person": {"M": 52.0, "F": 46.0, "X": 2.0}, "no_person": {"": 70.0, "X": 30.0}},
+    "victim_descent": {
+        "person": {"H": 40.0, "W": 27.0, "B": 18.0, "O": 9.0, "A": 3.0, "X": 2.0, "K": 0.5, "F": 0.5},
+        "no_person": {"": 70.0, "X": 30.0},
+    },
+    "mocodes": _table([
+        ("0344", 20.0), ("1822", 9.0), ("0416", 8.0), ("0329", 7.0), ("0913", 6.0), ("2000", 6.0), ("1300", 5.0),
+        ("0400", 5.0), ("1402", 4.0), ("0325", 4.0), ("1609", 3.0), ("0444", 3.0), ("1202", 2.5), ("0421", 2.5),
+    ], "code", "weight"),
+    "mocode_counts": [14.0, 30.0, 25.0, 15.0, 10.0, 6.0],  # Mocodes per report, 0 first
+    "unknown_location_rate": 0.002,  # The real feed has (0, 0) for unknown coordinates
+}
+
+
+def _probabilities(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+class ReportDistributions:
+    """A profile turned into the arrays `synthetic_chunk` samples from."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.first_day = datetime.strptime(profile["first_day"], "%Y-%m-%d")
+        self.days = profile["days"]
+        self.weekdays = _probabilities(profile["weekdays"])
+        self.areas = profile["areas"]
+        self.area_p = _probabilities([area["weight"] for area in self.areas])
+        self.area_centers = np.array([(area["lat"], area["lon"], area["spread"]) for area in self.areas])
+        self.crimes = profile["crimes"]
+        self.crime_p = _probabilities([crime["weight"] for crime in self.crimes])
+        self.weapon_rate = np.array([crime["weapon_rate"] for crime in self.crimes])
+        self.premises, self.premis_p = profile["premises"], _probabilities([p["weight"] for p in profile["premises"]])
+        self.weapons, self.weapon_p = profile["weapons"], _probabilities([w["weight"] for w in profile["weapons"]])
+        self.statuses, self.status_p = profile["statuses"], _probabilities([s["weight"] for s in profile["statuses"]])
+        self.hour_p = _probabilities(profile["hours"])
+        self.delay_p = _probabilities(profile["report_delay_days"])
+        self.age_p = _probabilities(profile["victim_age"])
+        self.victim = {
+            field: {kind: (list(codes), _probabilities(list(codes.values()))) for kind, codes in tables.items()}
+            for field, tables in (("sex", profile["victim_sex"]), ("descent", profile["victim_descent"]))
+        }
+        self.mocodes = np.array([mocode["code"] for mocode in profile["mocodes"]])
+        self.mocode_p = _probabilities([mocode["weight"] for mocode in profile["mocodes"]])
+        self.mocode_count_p = _probabilities(profile["mocode_counts"])
+
+
+@lru_cache(maxsize=None)
+def load_distributions(profile_path=None):
+    """Distributions of a fitted profile file (the built-in profile without a path), once per process."""
+    if profile_path is None:
+        return ReportDistributions(DEFAULT_PROFILE)
+    with open(profile_path) as f:
+        return ReportDistributions(json.load(f))
+
+
+def _victim_codes(rng, tables, person):
+    codes = np.empty(len(person), dtype=object)
+    for kind, mask in (("person", person), ("no_person", ~person)):
+        values, p = tables[kind]
+        codes[mask] = np.array(values, dtype=object)[rng.choice(len(values), mask.sum(), p=p)]
+    codes[codes == ""] = None
+    return codes
+
+
+def synthetic_chunk(chunk_index, seed=DEFAULT_SEED, chunk_size=CHUNK_SIZE, distributions=None):
+    """One chunk of LAPD-CSV-shaped rows, fully determined by (seed, chunk_index)."""
+    dist = distributions or load_distributions()
+    rng = np.random.default_rng([seed, chunk_index])
+    n = chunk_size
+    first_id = chunk_index * chunk_size
+
+    # When: day (by weekday), time of day (mostly rounded) and reporting delay
+    weekday = rng.choice(7, n, p=dist.weekdays)
+    day = (rng.integers(0, math.ceil(dist.days / 7), n) * 7 + (weekday - dist.first_day.weekday()) % 7) % dist.days
+    occurred = pd.Series(dist.first_day + pd.to_timedelta(day, unit="D"))
+    reported = occurred + pd.to_timedelta(rng.choice(len(dist.delay_p), n, p=dist.delay_p), unit="D")
+    rounding = rng.random(n)
+    minute = np.where(rounding < dist.profile["minute_on_hour"], 0,
+                      np.where(rounding < dist.profile["minute_on_hour"] + dist.profile["minute_half_hour"], 30,
+                               rng.integers(0, 60, n)))
+    time_occ = rng.choice(24, n, p=dist.hour_p) * 100 + minute
+
+    # Where
+    area = rng.choice(len(dist.areas), n, p=dist.area_p)
+    centers = dist.area_centers[area]
+    lat = np.round(centers[:, 0] + rng.normal(0, 1, n) * centers[:, 2], 4)
+    lon = np.round(centers[:, 1] + rng.normal(0, 1, n) * centers[:, 2], 4)
+    unknown_location = rng.random(n) < dist.profile["unknown_location_rate"]
+    lat[unknown_location] = 0.0
+    lon[unknown_location] = 0.0
+
+    # What
+    crime = rng.choice(len(dist.crimes), n, p=dist.crime_p)
+    second_crime = np.where(rng.random(n) < dist.profile["second_crime_rate"],
+                            rng.choice(len(dist.crimes), n, p=dist.crime_p), -1)
+    weapon = np.where(rng.random(n) < dist.weapon_rate[crime], rng.choice(len(dist.weapons), n, p=dist.weapon_p), -1)
+    premis = rng.choice(len(dist.premises), n, p=dist.premis_p)
+    status = rng.choice(len(dist.statuses), n, p=dist.status_p)
+    mocode_counts = np.minimum(rng.choice(len(dist.mocode_count_p), n, p=dist.mocode_count_p), len(dist.mocodes))
+    # Weighted sampling without replacement for every row at once (Gumbel top-k)
+    mocode_keys = np.log(dist.mocode_p) + rng.gumbel(size=(n, len(dist.mocodes)))
+    drawn = dist.mocodes[np.argsort(-mocode_keys, axis=1)[:, :max(mocode_counts.max(), 1)]]
+    mocodes = [" ".join(codes[:k]) if k else None for codes, k in zip(drawn.tolist(), mocode_counts.tolist())]
+
+    # Who
+    age = rng.choice(len(dist.age_p), n, p=dist.age_p)
+    person = age > 0
+
+    return pd.DataFrame({
+        "DR_NO": [str(FIRST_DR_NO + i) for i in range(first_id, first_id + n)],
+        "Date Rptd": reported.dt.strftime(time_utils.LAPD_DATETIME_FORMAT),
+        "DATE OCC": occurred.dt.strftime(time_utils.LAPD_DATETIME_FORMAT),
+        "TIME OCC": time_occ,
+        "AREA": [dist.areas[i]["code"] for i in area],
+        "AREA NAME": [dist.areas[i]["name"] for i in area],
+        "Rpt Dist No": [f"{dist.areas[a]['code'] * 100 + d:04d}" for a, d in zip(area, rng.integers(1, 99, n))],
+        "Crm Cd 1": [dist.crimes[i]["code"] for i in crime],
+        "Crm Cd 2": [dist.crimes[i]["code"] if i >= 0 else None for i in second_crime],
+        "Crm Cd Desc": [dist.crimes[i]["desc"] for i in crime],
+        "Mocodes": mocodes,
+        "Vict Age": age,
+        "Vict Sex": _victim_codes(rng, dist.victim["sex"], person),
+        "Vict Descent": _victim_codes(rng, dist.victim["descent"], person),
+        "Premis Cd": [dist.premises[i]["code"] for i in premis],
+        "Premis Desc": [dist.premises[i]["desc"] for i in premis],
+        "Weapon Used Cd": [dist.weapons[i]["code"] if i >= 0 else None for i in weapon],
+        "Weapon Desc": [dist.weapons[i]["desc"] if i >= 0 else None for i in weapon],
+        "LOCATION": [f"{100 * int(x)} SYNTHETIC ST" for x in rng.integers(1, 200, n)],
+        "LAT": lat,
+        "LON": lon,
+        "Status": [dist.statuses[i]["code"] for i in status],
+        "Status Desc": [dist.statuses[i]["desc"] for i in status],
+    })
+
+
+def officer_popularity(officer_count, seed, skew=DEFAULT_OFFICER_SKEW):
+    """Voting probability of each officer: Zipf weights over a seeded ranking of the officers."""
+    ranks = np.random.default_rng([seed, officer_count, 1]).permutation(officer_count) + 1
+    return _probabilities(1.0 / ranks ** skew)
+
+
+def synthetic_upvotes(rng, report_count, officer_p, rate=DEFAULT_UPVOTE_RATE, skew=DEFAULT_UPVOTE_SKEW,
+                      max_upvotes=DEFAULT_MAX_UPVOTES):
+    """
+    (report index, officer index) pairs of the upvotes of `report_count` reports.
+
+    A `rate` share of the reports is upvoted; their upvote counts follow a Zipf law with
+    exponent `skew` (most get one or two, a few get hundreds) and voters are drawn by officer
+    popularity. An officer votes for a report at most once.
+    """
+    upvoted = rng.random(report_count) < rate
+    counts = np.where(upvoted, np.minimum(rng.zipf(skew, report_count), min(max_upvotes, len(officer_p))), 0)
+    reports = np.repeat(np.arange(report_count), counts)
+    officers = np.minimum(np.searchsorted(np.cumsum(officer_p), rng.random(len(reports))), len(officer_p) - 1)
+    pairs = np.unique(reports * len(officer_p) + officers)
+    return pairs // len(officer_p), pairs % len(officer_p)
+
+
+def _upvote_id(upvote_time, serial):
+    """Deterministic ObjectId: the upvote time and a dataset-wide serial number."""
+    return ObjectId(struct.pack(">IQ", int(upvote_time.timestamp()) & 0xFFFFFFFF, serial))
+
+
+def attach_upvotes(records, chunk_index, seed, officers, officer_p, bucketed, **upvote_options):
+    """
+    Generate the upvotes of a chunk's report documents and store them on the reports in the
+    configured storage mode. Returns (upvote documents, upvote bucket documents).
+    """
+    rng = np.random.default_rng([seed, chunk_index, 2])
+    report_index, officer_index = synthetic_upvotes(rng, len(records), officer_p, **upvote_options)
+    delays = rng.integers(0, 30 * 24 * 3600, len(report_index))  # Within 30 days of the report
+
+    upvotes_by_report = {}
+    upvote_docs = []
+    for j, (r, o, delay) in enumerate(zip(report_index.tolist(), officer_index.tolist(), delays.tolist())):
+        report, officer = records[r], officers[o]
+        upvote_time = (report["date_rptd"] or report["date_occ"]) + timedelta(seconds=delay)
+        upvote_data = {
+            "_id": _upvote_id(upvote_time, chunk_index << 32 | j),
+            "officer_name": officer["name"],
+            "officer_email": officer["email"],
+            "officer_badge_number": officer["badge_number"],
+            "report_id": report["dr_no"],
+            "upvote_time": upvote_time,
+        }
+        upvote_docs.append(upvote_data)
+        upvotes_by_report.setdefault(r, []).append(upvote_data)
+
+    bucket_docs = []
+    for r, report_upvotes in upvotes_by_report.items():
+        report_upvotes.sort(key=lambda upvote_data: upvote_data["upvote_time"])
+        report = records[r]
+        report["upvotes"]["count"] = len(report_upvotes)
+        if not bucketed:
+            report["upvotes"]["list"] = report_upvotes
+            continue
+        report["upvotes"]["recent"] = [
+            {key: upvote_data[key] for key in ("officer_name", "officer_badge_number", "upvote_time")}
+            for upvote_data in report_upvotes[-UPVOTE_RECENT_VOTERS:]
+        ]
+        for start in range(0, len(report_upvotes), UPVOTE_BUCKET_SIZE):
+            batch = report_upvotes[start:start + UPVOTE_BUCKET_SIZE]
+            bucket_docs.append({"report_id": report["dr_no"], "count": len(batch), "upvotes": batch,
+                                "area_name": report["area_name"]})
+    return upvote_docs, bucket_docs
+
+
+@lru_cache(maxsize=None)
+def _officers(seed, officer_count):
+    from scripts import db_utils
+    return db_utils.synthetic_officers(officer_count, seed, joined_before=load_distributions().first_day)
+
+
+def synthetic_officers(seed=DEFAULT_SEED, officer_count=global_constant.NUM_OFFICERS):
+    """The officers of a synthetic dataset (the same in every worker process)."""
+    return _officers(seed, officer_count)
+
+
+def write_chunk(chunk_index, first_row, last_row, seed, profile_path, officer_count, officer_skew, upvote_options):
+    """
+    Runs in a worker process: generate one chunk, transform it like the CSV ingest and insert
+    rows [first_row, last_row) of it with their upvotes. Returns the number of reports written.
+    """
+    from scripts import populate_db
+    from services import upvote_store
+
+    distributions = load_distributions(profile_path)
+    chunk = synthetic_chunk(chunk_index, seed, CHUNK_SIZE, distributions)
+    records = populate_db.transform_chunk(chunk)
+    officers = synthetic_officers(seed, officer_count)
+    # Upvotes are drawn for the whole chunk, so a partial chunk is a prefix of the full one
+    upvote_docs, bucket_docs = attach_upvotes(records, chunk_index, seed, officers,
+                                              officer_popularity(officer_count, seed, officer_skew),
+                                              upvote_store.is_bucketed(), **upvote_options)
+    kept = {record["dr_no"] for record in records[first_row:last_row]}
+
+    populate_db.bulk_insert(records[first_row:last_row])
+    upvote_docs = [upvote_data for upvote_data in upvote_docs if upvote_data["report_id"] in kept]
+    if upvote_docs:
+        populate_db.collection_upvotes.insert_many(upvote_docs, ordered=False)
+    bucket_docs = [bucket for bucket in bucket_docs if bucket["report_id"] in kept]
+    if bucket_docs:
+        populate_db.db[populate_db.collection_upvote_buckets_name].insert_many(bucket_docs, ordered=False)
+    return last_row - first_row
+
+
+def generate_reports(size, start=0, seed=DEFAULT_SEED, workers=None, profile_path=None,
+                     officer_count=global_constant.NUM_OFFICERS, officer_skew=DEFAULT_OFFICER_SKEW, **upvote_options):
+    """
+    Insert synthetic reports [start, size) with their upvotes.
+
+    Chunks are generated, transformed and inserted by a pool of processes. At most a few
+    chunks per worker are in flight, so memory doesn't grow with `size`.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = [
+        (chunk_index, max(start - chunk_index * CHUNK_SIZE, 0), min(size - chunk_index * CHUNK_SIZE, CHUNK_SIZE),
+         seed, profile_path, officer_count, officer_skew, upvote_options)
+        for chunk_index in range(start // CHUNK_SIZE, math.ceil(size / CHUNK_SIZE))
+    ]
+    total_rows = 0
+    started = time.perf_counter()
+
+    def progress(rows):
+        nonlocal total_rows
+        total_rows += rows
+        elapsed = time.perf_counter() - started
+        print(f"Generated {start + total_rows:,} / {size:,} reports ({total_rows / elapsed:,.0f} rows/sec)")
+
+    if workers == 1:
+        for task in tasks:
+            progress(write_chunk(*task))
+        return total_rows
+
+    # Fresh interpreters: a forked child must not inherit the parent's MongoClient
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = set()
+        for task in tasks:
+            in_flight.add(pool.submit(write_chunk, *task))
+            if len(in_flight) >= IN_FLIGHT_PER_WORKER * workers:
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    progress(future.result())
+        for future in concurrent.futures.as_completed(in_flight):
+            progress(future.result())
+    return total_rows
+
+
+def _weights(counter, limit=None):
+    return [(key, float(count)) for key, count in counter.most_common(limit)]
+
+
+def fit_profile(csv_file, chunk_size=CHUNK_SIZE):
+    """Measure the distributions of a real LAPD CSV, streamed in chunks, as a profile for the generator."""
+    from scripts.populate_db import CSV_DTYPES
+
+    counts = {name: Counter() for name in ("area", "crime", "premis", "weapon", "status", "hour", "minute", "weekday",
+                                           "delay", "age", "mocode", "mocode_count")}
+    victim = {field: {"person": Counter(), "no_person": Counter()} for field in ("sex", "descent")}
+    names, descs, weapon_counts = {}, {}, Counter()
+    coordinates = {}  # area -> [count, sum lat, sum lon, sum lat^2, sum lon^2]
+    rows, second_crimes, unknown_locations = 0, 0, 0
+    first_day, last_day = None, None
+
+    for chunk in pd.read_csv(csv_file, chunksize=chunk_size, dtype=CSV_DTYPES):
+        rows += len(chunk)
+        occurred = pd.to_datetime(chunk["DATE OCC"], format=time_utils.LAPD_DATETIME_FORMAT, errors="coerce")
+        reported = pd.to_datetime(chunk["Date Rptd"], format=time_utils.LAPD_DATETIME_FORMAT, errors="coerce")
+        first_day = occurred.min() if first_day is None else min(first_day, occurred.min())
+        last_day = occurred.max() if last_day is None else max(last_day, occurred.max())
+        counts["weekday"].update(occurred.dt.weekday.dropna().astype(int).value_counts().to_dict())
+        counts["delay"].update((reported - occurred).dt.days.clip(0, 365).dropna().astype(int).value_counts().to_dict())
+        time_occ = pd.to_numeric(chunk["TIME OCC"], errors="coerce").dropna().astype(int)
+        counts["hour"].update((time_occ // 100).value_counts().to_dict())
+        counts["minute"].update((time_occ % 100).value_counts().to_dict())
+
+        counts["area"].update(chunk["AREA"].value_counts().to_dict())
+        names.update(chunk.drop_duplicates("AREA").set_index("AREA")["AREA NAME"].to_dict())
+        lat, lon = pd.to_numeric(chunk["LAT"], errors="coerce"), pd.to_numeric(chunk["LON"], errors="coerce")
+        known = (lat != 0) & (lon != 0) & lat.notna() & lon.notna()
+        unknown_locations += int((~known).sum())
+        for area, group in pd.DataFrame({"area": chunk["AREA"], "lat": lat, "lon": lon})[known].groupby("area"):
+            sums = coordinates.setdefault(area, [0, 0.0, 0.0, 0.0, 0.0])
+            sums[0] += len(group)
+            sums[1] += group["lat"].sum()
+            sums[2] += group["lon"].sum()
+            sums[3] += (group["lat"] ** 2).sum()
+            sums[4] += (group["lon"] ** 2).sum()
+
+        crime = chunk["Crm Cd 1"].str.strip().str[:3]
+        counts["crime"].update(crime.value_counts().to_dict())
+        descs.update(pd.DataFrame({"crime": crime, "desc": chunk["Crm Cd Desc"]}).dropna()
+                     .drop_duplicates("crime").set_index("crime")["desc"].to_dict())
+        weapon_counts.update(crime[chunk["Weapon Used Cd"].notna()].value_counts().to_dict())
+        second_crimes += int(chunk["Crm Cd 2"].notna().sum())
+        for name, code, desc in (("premis", "Premis Cd", "Premis Desc"), ("weapon", "Weapon Used Cd", "Weapon Desc"),
+                                 ("status", "Status", "Status Desc")):
+            pairs = chunk[[code, desc]].dropna()
+            counts[name].update(pairs[code].value_counts().to_dict())
+            descs.update({(name, key): value for key, value in pairs.drop_duplicates(code).values})
+
+        age = pd.to_numeric(chunk["Vict Age"], errors="coerce").fillna(0).astype(int).clip(0, 99)
+        counts["age"].update(age.value_counts().to_dict())
+        for field, column in (("sex", "Vict Sex"), ("descent", "Vict Descent")):
+            values = chunk[column].fillna("").astype(str).str.strip().replace("-", "")
+            victim[field]["person"].update(values[age > 0].value_counts().to_dict())
+            victim[field]["no_person"].update(values[age <= 0].value_counts().to_dict())
+        mocodes = chunk["Mocodes"].fillna("").str.split()
+        counts["mocode_count"].update(mocodes.str.len().clip(0, 10).value_counts().to_dict())
+        counts["mocode"].update(mocodes.explode().dropna().value_counts().to_dict())
+
+    def areas():
+        for code, count in counts["area"].most_common():
+            n, lat_sum, lon_sum, lat_sq, lon_sq = coordinates.get(code, [0, 0.0, 0.0, 0.0, 0.0])
+            if not n:
+                continue
+            lat, lon = lat_sum / n, lon_sum / n
+            spread = math.sqrt(max((lat_sq / n - lat ** 2 + lon_sq / n - lon ** 2) / 2, 0))
+            yield {"code": int(code), "name": str(names[code]).strip(), "lat": round(float(lat), 4), "lon": round(float(lon), 4),
+                   "spread": round(min(spread, 0.05), 4), "weight": float(count)}
+
+    on_hour = sum(count for minute, count in counts["minute"].items() if minute == 0) / max(rows, 1)
+    half_hour = sum(count for minute, count in counts["minute"].items() if minute == 30) / max(rows, 1)
+    return {
+        "first_day": first_day.strftime("%Y-%m-%d"),
+        "days": (last_day - first_day).days + 1,
+        "weekdays": [float(counts["weekday"][day]) for day in range(7)],
+        "areas": list(areas()),
+        "crimes": [{"code": code, "desc": str(descs.get(code, "")).strip(), "weight": count,
+                    "weapon_rate": round(weapon_counts[code] / count, 4)}
+                   for code, count in _weights(counts["crime"], 150)],
+        "second_crime_rate": round(second_crimes / max(rows, 1), 4),
+        "premises": [{"code": code, "desc": str(descs[("premis", code)]).strip(), "weight": count}
+                     for code, count in _weights(counts["premis"], 150)],
+        "weapons": [{"code": code, "desc": str(descs[("weapon", code)]).strip(), "weight": count}
+                    for code, count in _weights(counts["weapon"], 80)],
+        "statuses": [{"code": code, "desc": str(descs[("status", code)]).strip(), "weight": count}
+                     for code, count in _weights(counts["status"])],
+        "hours": [float(counts["hour"][hour]) for hour in range(24)],
+        "minute_on_hour": round(on_hour, 4),
+        "minute_half_hour": round(half_hour, 4),
+        "report_delay_days": [float(counts["delay"][day]) for day in range(366)],
+        "victim_age": [float(counts["age"][age]) for age in range(100)],
+        "victim_sex": {kind: dict(_weights(counter)) for kind, counter in victim["sex"].items()},
+        "victim_descent": {kind: dict(_weights(counter)) for kind, counter in victim["descent"].items()},
+        "mocodes": [{"code": code, "weight": count} for code, count in _weights(counts["mocode"], 300)],
+        "mocode_counts": [float(counts["mocode_count"][k]) for k in range(11)],
+        "unknown_location_rate": round(unknown_locations / max(rows, 1), 4),
+    }
+
+
+def generate_dataset(size, seed=DEFAULT_SEED, workers=None, profile_path=None, officer_count=global_constant.NUM_OFFICERS,
+                     officer_skew=DEFAULT_OFFICER_SKEW, **upvote_options):
+    """Replace the reports, officers and upvotes with a synthetic dataset of `size` reports."""
+    from scripts import build_rollups, create_indexes, populate_db
+
+    started = time.perf_counter()
+    populate_db.reset_collections()
+    populate_db.collection_reports.create_index("dr_no", unique=True)
+    populate_db.collection_officers.insert_many(synthetic_officers(seed, officer_count), ordered=False)
+    generate_reports(size, 0, seed, workers, profile_path, officer_count, officer_skew, **upvote_options)
+    create_indexes.generate_indexes()
+    build_rollups.build_rollups()
+    print(f"🎉 {size:,} synthetic reports in {time.perf_counter() - started:.1f}s")
+
+
+# Run the function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seeded synthetic LAPD reports, generated and inserted in parallel.")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Number of reports")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", type=int, default=None, help="Generator processes (default: CPU count)")
+    parser.add_argument("--profile", help="Profile JSON written by --fit (default: built-in approximations)")
+    parser.add_argument("--fit", metavar="CSV", help="Write the distributions of a real CSV to --profile and exit")
+    parser.add_argument("--officers", type=int, default=global_constant.NUM_OFFICERS)
+    parser.add_argument("--officer-skew", type=float, default=DEFAULT_OFFICER_SKEW,
+                        help="Zipf exponent of officer activity (0 = uniform)")
+    parser.add_argument("--upvote-rate", type=float, default=DEFAULT_UPVOTE_RATE, help="Share of upvoted reports")
+    parser.add_argument("--upvote-skew", type=float, default=DEFAULT_UPVOTE_SKEW,
+                        help="Zipf exponent (> 1) of upvotes per upvoted report, lower is more skewed")
+    parser.add_argument("--max-upvotes", type=int, default=DEFAULT_MAX_UPVOTES)
+    args = parser.parse_args()
+
+    if args.fit:
+        if not args.profile:
+            parser.error("--fit needs --profile to write to")
+        with open(args.profile, "w") as f:
+            json.dump(fit_profile(args.fit), f, indent=1)
+        print(f"✅ Profile written to {args.profile}")
+    else:
+        if args.upvote_skew <= 1:
+            parser.error("--upvote-skew must be greater than 1")
+        generate_dataset(args.size, args.seed, args.workers, args.profile, args.officers, args.officer_skew,
+                         rate=args.upvote_rate, skew=args.upvote_skew, max_upvotes=args.max_upvotes)
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+# Format used by the LAPD feed (e.g. "03/01/2020 12:00:00 AM")
+LAPD_DATETIME_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+# Format accepted by the query endpoints (e.g. "03/01/2020")
+QUERY_DATE_FORMAT = "%m/%d/%Y"
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_lapd_datetime(value):
+    """Parse an LAPD date string ("03/01/2020 12:00:00 AM" or "03/01/2020") into a datetime."""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    try:
+        return datetime.strptime(value, LAPD_DATETIME_FORMAT)
+    except ValueError:
+        return datetime.strptime(value.split(" ")[0], QUERY_DATE_FORMAT)
+
+
+def parse_query_date(value):
+    """Parse a MM/DD/YYYY query parameter into a datetime at midnight."""
+    return datetime.strptime(value, QUERY_DATE_FORMAT)
+
+
+def hhmm_to_minute(hhmm):
+    """Convert an "HHMM" string (or int like 2130) into the minute of the day (0-1439)."""
+    hhmm = str(hhmm).strip().zfill(4)
+    if not (hhmm.isdigit() and len(hhmm) == 4):
+        raise ValueError("Invalid time format. Use HHMM (e.g., 0000, 2330).")
+    hours, minutes = int(hhmm[:2]), int(hhmm[2:])
+    if hours > 23 or minutes > 59:
+        raise ValueError("Invalid time format. Use HHMM (e.g., 0000, 2330).")
+    return hours * 60 + minutes
+
+
+def format_hhmm(hhmm):
+    """Format "2130" as "21:30" for responses."""
+    return hhmm[:2] + ":" + hhmm[2:4]
+
+
+def combine_occurred_at(date_occ, minute_occ):
+    """Build the full occurrence timestamp from the day and the minute of the day."""
+    if date_occ is None:
+        return None
+    day = datetime(date_occ.year, date_occ.month, date_occ.day)
+    return day + timedelta(minutes=minute_occ or 0)
+
+
+def day_range(start_date, end_date=None):
+    """Half-open [start, end) datetime range covering the given MM/DD/YYYY day(s), inclusive of end_date."""
+    start = parse_query_date(start_date)
+    end = parse_query_date(end_date) if end_date else start
+    if end < start:
+        raise ValueError("end_date must not be before start_date.")
+    return start, end + timedelta(days=1)
+
+
+def typed_date_fields(date_rptd, date_occ, time_occ):
+    """Return the typed date/time fields stored on every report document."""
+    date_occ = parse_lapd_datetime(date_occ)
+    if date_occ is not None:
+        date_occ = datetime(date_occ.year, date_occ.month, date_occ.day)  # The time of day lives in minute_occ
+    minute_occ = hhmm_to_minute(time_occ)
+    return {
+        "date_rptd": parse_lapd_datetime(date_rptd),
+        "date_occ": date_occ,
+        "time_occ": str(time_occ).zfill(4),
+        "minute_occ": minute_occ,
+        "occurred_at": combine_occurred_at(date_occ, minute_occ),
+    }
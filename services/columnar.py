@@ -0,0 +1,427 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from config import COLUMNAR_DIR, COLUMNAR_ENDPOINTS
+from db import collection_reports_name, collection_upvotes_name
+
+# On-disk layout: immutable segments, one memory-mappable .npy file per column
+#   <dir>/manifest.json                    generation, segments, export watermarks and the dictionaries
+#   <dir>/reports/<segment>/<column>.npy   dr_no, date_occ (days), minute_occ, area, crime (n x 4), weapon
+#   <dir>/upvotes/<segment>/<column>.npy   id (ObjectId bytes), report_id
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+TABLES = (collection_reports_name, collection_upvotes_name)
+# Endpoints that have a columnar implementation below. The others already read rollups or views.
+COLUMNAR_QUERIES = ("Query2", "Query3", "Query5", "Query6")
+
+MAX_CRIME_CODES = 4  # crm_cd, crm_cd_2 .. crm_cd_4
+NULL = -1  # Missing minute, area or dictionary code
+DICTIONARIES = ("crime", "weapon")  # Append-only: codes keep their index across refreshes
+SEGMENT_ROWS = 1_000_000  # Exports are cut into segments of this size; small trailing segments are merged
+EXPORT_BATCH_SIZE = 10_000
+# Documents are exported in _id order. Writer clocks can lag, so every refresh re-reads this far back
+REFRESH_OVERLAP = timedelta(minutes=5)
+# Readers look for a newer manifest at most this often
+RELOAD_CHECK_SECONDS = 1.0
+
+REPORT_PROJECTION = {"dr_no": 1, "date_occ": 1, "minute_occ": 1, "area": 1, "crm_codes.crime_codes": 1,
+                     "weapon.weapon_used_cd": 1}
+UPVOTE_PROJECTION = {"report_id": 1}
+
+
+# ---------------------------------------------------------------------------------------------
+# Export (scripts/build_columnar.py)
+# ---------------------------------------------------------------------------------------------
+
+def read_manifest(directory=COLUMNAR_DIR):
+    """The current manifest, or None if there is no snapshot (or one of an older layout)."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return manifest if manifest.get("version") == SNAPSHOT_VERSION else None
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)  # Readers see the previous snapshot or this one, never a mix
+
+
+def _write_segment(directory, table, columns):
+    name = uuid.uuid4().hex
+    path = os.path.join(directory, table, name)
+    os.makedirs(path)
+    for column, values in columns.items():
+        np.save(os.path.join(path, f"{column}.npy"), values)
+    return {"name": name, "rows": len(next(iter(columns.values())))}
+
+
+def _read_segment(directory, table, segment, mmap_mode="r"):
+    path = os.path.join(directory, table, segment["name"])
+    return {file[:-len(".npy")]: np.load(os.path.join(path, file), mmap_mode=mmap_mode)
+            for file in os.listdir(path) if file.endswith(".npy")}
+
+
+class _Dictionary:
+    """Code -> position in an append-only list stored in the manifest."""
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.index = {value: i for i, value in enumerate(self.values)}
+
+    def encode(self, value):
+        if value is None or value == "":
+            return NULL
+        value = str(value)
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
+
+
+def _object_id_bytes(value):
+    return value.binary if isinstance(value, ObjectId) else str(value).encode()
+
+
+def report_columns(reports, dictionaries):
+    """Report documents -> column arrays (codes dictionary-encoded, dates as days)."""
+    crime = np.full((len(reports), MAX_CRIME_CODES), NULL, dtype=np.int32)
+    for row, report in enumerate(reports):
+        for i, code in enumerate((report.get("crm_codes") or {}).get("crime_codes", [])[:MAX_CRIME_CODES]):
+            crime[row, i] = dictionaries["crime"].encode(code)
+    return {
+        "dr_no": np.array([str(report["dr_no"]).encode() for report in reports]),
+        "date_occ": np.array([report.get("date_occ") if isinstance(report.get("date_occ"), datetime) else None
+                              for report in reports], dtype="datetime64[D]"),
+        "minute_occ": np.array([report.get("minute_occ") if isinstance(report.get("minute_occ"), int) else NULL
+                                for report in reports], dtype=np.int16),
+        "area": np.array([report.get("area") if isinstance(report.get("area"), int) else NULL
+                          for report in reports], dtype=np.int16),
+        "crime": crime,
+        "weapon": np.array([dictionaries["weapon"].encode((report.get("weapon") or {}).get("weapon_used_cd"))
+                            for report in reports], dtype=np.int32),
+    }
+
+
+def upvote_columns(upvotes, dictionaries):
+    """Upvote documents -> column arrays. Reports are joined by dr_no when a snapshot is loaded."""
+    return {
+        "id": np.array([_object_id_bytes(upvote["_id"]) for upvote in upvotes]),
+        "report_id": np.array([str(upvote["report_id"]).encode() for upvote in upvotes]),
+    }
+
+
+# Per table: the key that identifies a row, how documents become columns and what is read
+EXPORTS = {
+    collection_reports_name: ("dr_no", report_columns, REPORT_PROJECTION),
+    collection_upvotes_name: ("id", upvote_columns, UPVOTE_PROJECTION),
+}
+
+
+def _concatenate(segments):
+    return {column: np.concatenate([segment[column] for segment in segments]) for column in segments[0]}
+
+
+def _export(database, directory, table, dictionaries, since=None, known_keys=None):
+    """
+    Write the documents of `table` created after `since` (all of them if None) as new segments.
+
+    Rows whose key is already in `known_keys` (the overlap window) are skipped. Returns the new
+    segments and the newest _id time seen.
+    """
+    key, to_columns, projection = EXPORTS[table]
+    query = {"_id": {"$gt": ObjectId.from_datetime(since)}} if since else {}
+    segments, batch, newest = [], [], since
+
+    def flush(batch):
+        columns = to_columns(batch, dictionaries)
+        keep = np.ones(len(batch), dtype=bool)
+        if known_keys is not None and len(known_keys):
+            keep &= ~np.isin(columns[key], known_keys)
+        _, first = np.unique(columns[key], return_index=True)
+        keep &= np.isin(np.arange(len(batch)), first)  # Duplicates within the batch
+        if keep.any():
+            segments.append(_write_segment(directory, table, {column: values[keep] for column, values in columns.items()}))
+
+    for document in database[table].find(query, projection).sort("_id", ASCENDING).batch_size(EXPORT_BATCH_SIZE):
+        batch.append(document)
+        if isinstance(document["_id"], ObjectId):
+            created = document["_id"].generation_time.replace(tzinfo=None)
+            newest = max(newest, created) if newest else created
+        if len(batch) >= SEGMENT_ROWS:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return segments, newest
+
+
+def _merge_tail(directory, table, segments):
+    """Merge trailing segments while they fit in one SEGMENT_ROWS segment; returns the new list."""
+    count = 0
+    while count < len(segments) and sum(segment["rows"] for segment in segments[-count - 1:]) <= SEGMENT_ROWS:
+        count += 1
+    if count < 2:
+        return segments
+    merged = _concatenate([_read_segment(directory, table, segment, mmap_mode=None) for segment in segments[-count:]])
+    return segments[:-count] + [_write_segment(directory, table, merged)]
+
+
+def _table_keys(directory, table, segments):
+    key = EXPORTS[table][0]
+    if not segments:
+        return None
+    return np.concatenate([_read_segment(directory, table, segment)[key] for segment in segments])
+
+
+def refresh_snapshot(database, directory=COLUMNAR_DIR, full=False):
+    """
+    Bring the snapshot in `directory` up to date with the `reports` and `upvotes` collections.
+
+    Only documents created since the previous refresh are read and written as new segments; a
+    table whose row count then differs from its collection (deletes, or documents with
+    historical _ids such as the synthetic upvotes) is exported again in full. Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    existing = read_manifest(directory)
+    previous = None if full else existing
+    dictionaries = {kind: _Dictionary(previous["dictionaries"][kind] if previous else []) for kind in DICTIONARIES}
+    tables = {}
+    for table in TABLES:
+        state = previous and previous["tables"][table]
+        if state:
+            since = datetime.fromisoformat(state["watermark"]) - REFRESH_OVERLAP if state["watermark"] else None
+            known_keys = _table_keys(directory, table, state["segments"])
+            segments, newest = _export(database, directory, table, dictionaries, since, known_keys)
+            segments = _merge_tail(directory, table, state["segments"] + segments)
+            watermark = max(filter(None, [newest, datetime.fromisoformat(state["watermark"]) if state["watermark"] else None]),
+                            default=None)
+            if sum(segment["rows"] for segment in segments) == database[table].estimated_document_count():
+                tables[table] = {"segments": segments, "watermark": watermark and watermark.isoformat(), "full": False}
+                continue
+        segments, newest = _export(database, directory, table, dictionaries)
+        tables[table] = {"segments": segments, "watermark": newest and newest.isoformat(), "full": True}
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "generation": existing["generation"] + 1 if existing else 1,
+        "refreshed_at": datetime.utcnow().isoformat(),
+        "tables": {table: {"segments": state["segments"], "watermark": state["watermark"],
+                           "rows": sum(segment["rows"] for segment in state["segments"])}
+                   for table, state in tables.items()},
+        "dictionaries": {kind: dictionary.values for kind, dictionary in dictionaries.items()},
+    }
+    _write_manifest(directory, manifest)
+
+    # Segments no longer listed are removed (open memory maps of running readers stay valid)
+    for table, state in tables.items():
+        live = {segment["name"] for segment in state["segments"]}
+        table_dir = os.path.join(directory, table)
+        for name in os.listdir(table_dir) if os.path.isdir(table_dir) else []:
+            if name not in live:
+                shutil.rmtree(os.path.join(table_dir, name), ignore_errors=True)
+    return manifest
+
+
+# ---------------------------------------------------------------------------------------------
+# Read side (API)
+# ---------------------------------------------------------------------------------------------
+
+class ColumnarSnapshot:
+    """One generation of the snapshot: memory-mapped segments and the decoded dictionaries."""
+
+    def __init__(self, directory, manifest):
+        self.generation = manifest["generation"]
+        self.refreshed_at = manifest["refreshed_at"]
+        self.dictionaries = {kind: np.array(values, dtype=object) for kind, values in manifest["dictionaries"].items()}
+        self.codes = {kind: {value: i for i, value in enumerate(values)} for kind, values in manifest["dictionaries"].items()}
+        self.tables = {table: [_read_segment(directory, table, segment) for segment in manifest["tables"][table]["segments"]]
+                       for table in TABLES}
+        self.rows = {table: manifest["tables"][table]["rows"] for table in TABLES}
+        self._memo = {}
+
+    @property
+    def reports(self):
+        return self.tables[collection_reports_name]
+
+    def info(self):
+        return {"generation": self.generation, "refreshed_at": self.refreshed_at, "rows": self.rows}
+
+    def memo(self, key, compute):
+        """`compute()` once per snapshot generation (segments never change)."""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def report_offsets(self):
+        return np.cumsum([0] + [len(segment["dr_no"]) for segment in self.reports])[:-1]
+
+    def upvote_counts(self):
+        """Upvotes per report row, counted from the upvotes table (joined on dr_no)."""
+        def compute():
+            if not self.reports:
+                return np.zeros(0, dtype=np.int64)
+            index = pd.Index(np.concatenate([segment["dr_no"] for segment in self.reports]))
+            counts = np.zeros(len(index), dtype=np.int64)
+            for segment in self.tables[collection_upvotes_name]:
+                rows = index.get_indexer(segment["report_id"])
+                counts += np.bincount(rows[rows >= 0], minlength=len(index))
+            return counts
+        return self.memo("upvote_counts", compute)
+
+
+class SnapshotReader:
+    """Serves the latest snapshot in `directory`, reloading it when the manifest is replaced."""
+
+    def __init__(self, directory=COLUMNAR_DIR, endpoints=COLUMNAR_ENDPOINTS):
+        self.directory = directory
+        self.endpoints = frozenset(endpoints)
+        self._snapshot = None
+        self._manifest_mtime = None
+        self._checked_at = None
+
+    def current(self):
+        """The loaded snapshot, or None if none has been built."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return self._snapshot
+        self._checked_at = now
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST_FILE)).st_mtime_ns
+            if mtime != self._manifest_mtime:
+                manifest = read_manifest(self.directory)
+                self._snapshot = ColumnarSnapshot(self.directory, manifest) if manifest else None
+                self._manifest_mtime = mtime
+        except FileNotFoundError:
+            pass  # No snapshot yet, or a refresh removed a segment while we loaded: keep the previous one
+        return self._snapshot
+
+    def for_endpoint(self, endpoint):
+        """The snapshot if `endpoint` is routed to the columnar backend and one exists, else None (Mongo)."""
+        return self.current() if endpoint in self.endpoints else None
+
+
+columnar_snapshots = SnapshotReader()
+
+
+def snapshot_info(snapshot):
+    """Extra response fields telling that (and how fresh) a result came from the snapshot."""
+    return {"backend": "columnar", "snapshot": snapshot.info()} if snapshot is not None else {}
+
+
+def _day(value):
+    return np.datetime64(value.date() if isinstance(value, datetime) else value, "D")
+
+
+def _datetime(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def _date_mask(dates, range_start, range_end):
+    return (dates >= _day(range_start)) & (dates < _day(range_end))
+
+
+def query2(snapshot, crm_cd, start_minute, end_minute, date_range=None, after_date=None):
+    """Query2 rows (reports per day for one crime code in a time-of-day window), in date order."""
+    code = snapshot.codes["crime"].get(crm_cd)
+    if code is None:
+        return []
+    totals = {}
+    for segment in snapshot.reports:
+        dates = segment["date_occ"]
+        mask = (segment["crime"] == code).any(axis=1)
+        mask &= (segment["minute_occ"] >= start_minute) & (segment["minute_occ"] <= end_minute) & ~np.isnat(dates)
+        if date_range:
+            mask &= _date_mask(dates, *date_range)
+        if after_date:
+            mask &= dates > _day(after_date)
+        days, counts = np.unique(dates[mask], return_counts=True)
+        for day, count in zip(days.tolist(), counts.tolist()):
+            totals[day] = totals.get(day, 0) + count
+    return [{"date_occ": _datetime(day), "total_reports": count} for day, count in sorted(totals.items())]
+
+
+def _area(value):
+    return None if value == NULL else int(value)
+
+
+def query3(snapshot, range_start, range_end):
+    """Query3 rows (three most common crimes per area of [range_start, range_end)), ties by crime code."""
+    partials = []
+    for segment in snapshot.reports:
+        rows = np.flatnonzero(_date_mask(segment["date_occ"], range_start, range_end))
+        crime = segment["crime"][rows]
+        area = np.broadcast_to(segment["area"][rows][:, None], crime.shape)
+        valid = crime != NULL
+        partials.append(pd.DataFrame({"area": area[valid], "crime": crime[valid]}).value_counts())
+    if not partials:
+        return []
+    counts = pd.concat(partials).groupby(level=["area", "crime"]).sum().rename("count").reset_index()
+    counts["crime_code"] = snapshot.dictionaries["crime"][counts["crime"].to_numpy()]
+    counts = counts.sort_values(["area", "count", "crime_code"], ascending=[True, False, True])
+    return [{"area": _area(area),
+             "top_crimes": [{"crime_code": code, "count": int(count)}
+                            for code, count in zip(group["crime_code"][:3], group["count"][:3])]}
+            for area, group in counts.groupby("area", sort=True)]
+
+
+def query5(snapshot):
+    """Every Query5 row (crime/weapon pairs seen in at least two areas) in QUERY5_SORT order."""
+    def compute():
+        partials = []
+        for segment in snapshot.reports:
+            crime = segment["crime"]
+            weapon = np.broadcast_to(segment["weapon"][:, None], crime.shape)
+            area = np.broadcast_to(segment["area"][:, None], crime.shape)
+            valid = (crime != NULL) & (weapon != NULL)  # Reports without a weapon are ignored
+            partials.append(pd.DataFrame({"crime": crime[valid], "weapon": weapon[valid], "area": area[valid]}).value_counts())
+        if not partials:
+            return []
+        counts = pd.concat(partials).groupby(level=["crime", "weapon", "area"]).sum().rename("count").reset_index()
+        pairs = counts.groupby(["crime", "weapon"]).agg(area_count=("area", "size"), total_reports=("count", "sum"))
+        pairs = pairs[pairs["area_count"] >= 2].reset_index()
+        rows = [{"crm_cd": snapshot.dictionaries["crime"][crime], "weapon_used_cd": snapshot.dictionaries["weapon"][weapon],
+                 "area_count": int(area_count), "total_reports": int(total_reports)}
+                for crime, weapon, area_count, total_reports in pairs.itertuples(index=False)]
+        rows.sort(key=lambda row: (-row["area_count"], row["crm_cd"], row["weapon_used_cd"]))
+        return rows
+    return snapshot.memo("query5", compute)
+
+
+def query6(snapshot, range_start, range_end, last_key=None, limit=None, area=None):
+    """Query6 rows (reports of [range_start, range_end), of one area, by upvotes desc, dr_no asc) after `last_key`."""
+    upvote_counts = snapshot.upvote_counts()
+    dr_no, dates, areas, counts = [], [], [], []
+    for offset, segment in zip(snapshot.report_offsets(), snapshot.reports):
+        mask = _date_mask(segment["date_occ"], range_start, range_end)
+        if area is not None:
+            mask &= segment["area"] == area
+        rows = np.flatnonzero(mask)
+        dr_no.append(segment["dr_no"][rows])
+        dates.append(segment["date_occ"][rows])
+        areas.append(segment["area"][rows])
+        counts.append(upvote_counts[rows + offset])
+    if not dr_no:
+        return []
+    dr_no, dates, areas, counts = (np.concatenate(column) for column in (dr_no, dates, areas, counts))
+    if last_key:  # Keyset on (upvotes.count desc, dr_no asc), like pagination.keyset_filter
+        # Reports without upvotes count 0 here (a page served by MongoDB may end on a null count)
+        last_count, last_dr_no = last_key["upvotes.count"] or 0, str(last_key["dr_no"]).encode()
+        keep = (counts < last_count) | ((counts == last_count) & (dr_no > last_dr_no))
+        dr_no, dates, areas, counts = dr_no[keep], dates[keep], areas[keep], counts[keep]
+    order = np.lexsort((dr_no, -counts))[:limit]
+    return [{"dr_no": dr_no[i].decode(), "date_occ": _datetime(dates[i].tolist()), "area": _area(areas[i]),
+             "upvotes": {"count": int(counts[i])}}
+            for i in order]
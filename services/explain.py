@@ -0,0 +1,130 @@
+from db import get_database
+
+# Children of a plan stage in explain output
+_CHILD_KEYS = ("inputStage", "innerStage", "outerStage", "thenStage", "elseStage")
+
+
+class ExplainQuery:
+    """A query shape checked by the plan checks: `build()` returns the command to explain."""
+
+    def __init__(self, name, build, allow_collscan=False, allow_blocking_sort=False, note=""):
+        self.name = name
+        self.build = build
+        self.allow_collscan = allow_collscan  # Intentional full scans (tiny collections, whole-collection rollups)
+        self.allow_blocking_sort = allow_blocking_sort  # Bounded top-k sorts no index order can serve
+        self.note = note
+
+
+# Registered by the routers next to the endpoints they mirror, keyed by endpoint name
+EXPLAIN_REGISTRY = {}
+
+
+def register_explain(name, build, allow_collscan=False, allow_blocking_sort=False, note=""):
+    EXPLAIN_REGISTRY[name] = ExplainQuery(name, build, allow_collscan, allow_blocking_sort, note)
+
+
+def aggregate_command(collection_name, pipeline):
+    return {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}}
+
+
+def find_command(collection_name, filter, projection=None, sort=None, limit=None):
+    command = {"find": collection_name, "filter": filter}
+    if projection:
+        command["projection"] = projection
+    if sort:
+        command["sort"] = dict(sort)
+    if limit:
+        command["limit"] = limit
+    return command
+
+
+def _find_key(document, key):
+    """First value stored under `key` anywhere in a nested explain document."""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _walk_stages(stage):
+    if not isinstance(stage, dict):
+        return
+    yield stage
+    for key in _CHILD_KEYS:
+        yield from _walk_stages(stage.get(key))
+    for child in stage.get("inputStages", []):
+        yield from _walk_stages(child)
+
+
+def _describe(stage):
+    """Compact plan tree: "LIMIT <- FETCH <- IXSCAN(date_occ_1_upvotes.count_-1_dr_no_1)"."""
+    parts = []
+    for plan_stage in _walk_stages(stage):
+        name = plan_stage.get("stage", "?")
+        if plan_stage.get("indexName"):
+            name += f"({plan_stage['indexName']})"
+        parts.append(name)
+    return " <- ".join(parts)
+
+
+def summarize_explain(query, collection_name, explain):
+    """Winning plan, documents examined vs returned and the problems found in one explain output."""
+    planner = _find_key(explain, "queryPlanner") or {}
+    winning_plan = planner.get("winningPlan", {})
+    winning_plan = winning_plan.get("queryPlan", winning_plan)  # Slot-based engine wraps the classic tree
+    stats = _find_key(explain, "executionStats") or {}
+    stages = list(_walk_stages(winning_plan))
+
+    collscan = any(stage.get("stage") == "COLLSCAN" for stage in stages)
+    blocking_sort = any(stage.get("stage") == "SORT" for stage in stages)  # In-memory sort (no index order)
+    problems = []
+    if collscan and not query.allow_collscan:
+        problems.append("COLLSCAN")
+    if blocking_sort and not query.allow_blocking_sort:
+        problems.append("blocking SORT")
+    return {
+        "query": query.name,
+        "collection": collection_name,
+        "winning_plan": _describe(winning_plan),
+        "indexes": sorted({stage["indexName"] for stage in stages if stage.get("indexName")}),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "collscan": collscan,
+        "collscan_allowed": query.allow_collscan,
+        "blocking_sort": blocking_sort,
+        "problems": problems,
+        "ok": not problems,
+        "note": query.note,
+    }
+
+
+async def explain_query(query):
+    """Run explain("executionStats") for one registered query."""
+    command = query.build()
+    collection_name = command.get("aggregate") or command.get("find")
+    explain = await get_database().command("explain", command, verbosity="executionStats")
+    return summarize_explain(query, collection_name, explain)
+
+
+async def explain_all(names=None):
+    """Explain every registered query (or only `names`), in registration order."""
+    results = []
+    for name, query in EXPLAIN_REGISTRY.items():
+        if names and name not in names:
+            continue
+        try:
+            results.append(await explain_query(query))
+        except Exception as e:
+            results.append({"query": name, "ok": False, "problems": [f"explain failed: {e}"]})
+    return results
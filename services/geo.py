@@ -0,0 +1,17 @@
+from pymongo import GEOSPHERE
+
+from scripts.geo_utils import GEO_POINT_FIELD
+
+GEO_INDEX_KEY = [(GEO_POINT_FIELD, GEOSPHERE)]
+
+
+def heatmap_cell(row, cell_size):
+    """Turn a {"_id": {"lat": bin, "lon": bin}, "count"} group into the cell's bounds and count."""
+    south, west = row["_id"]["lat"] * cell_size, row["_id"]["lon"] * cell_size
+    return {
+        "south": round(south, 6),
+        "west": round(west, 6),
+        "north": round(south + cell_size, 6),
+        "east": round(west + cell_size, 6),
+        "count": row["count"],
+    }
@@ -0,0 +1,216 @@
+from pymongo import ASCENDING, DESCENDING
+
+from db import (get_database, collection_reports_name, collection_upvotes_name, collection_officer_name,
+                collection_upvote_buckets_name)
+from services.geo import GEO_INDEX_KEY
+from services.leaderboard import collection_leaderboards_name
+from services.officer_activity import (OFFICER_ACTIVITY_INDEXES, EMAIL_LINKS_SHARED_KEY,
+                                       collection_officer_activity_name, collection_officer_email_links_name)
+from services.reference_codes import collection_reference_codes_name
+from services.sketches import SKETCH_BUCKET_KEY, collection_sketches_name
+from services.time_rollups import collection_time_rollups_name
+from services.upvote_store import UPVOTE_UNIQUE_KEY, UPVOTE_BUCKET_KEY
+
+# Report identity: upvote updates, report lookups and duplicate-free ingestion
+REPORT_ID_KEY = [("dr_no", ASCENDING)]
+# Crime code + time of day (+ days) (Query2)
+REPORT_CRIME_TIME_KEY = [("crm_codes.crime_codes", ASCENDING), ("date_occ", ASCENDING), ("minute_occ", ASCENDING)]
+# Reports of a day range, a day's reports by upvotes (Query3, Query6 pages)
+REPORT_DAY_UPVOTES_KEY = [("date_occ", ASCENDING), ("upvotes.count", DESCENDING), ("dr_no", ASCENDING)]
+
+# Key types that can't be served by (or serve) a prefix of a plain B-tree index
+_SPECIAL_KEY_TYPES = {"2d", "2dsphere", "text", "hashed"}
+# Index options under which an index is not interchangeable with one on the same keys
+_BEHAVIOUR_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation")
+
+
+class IndexSpec:
+    """One declared index: keys, options and the reader that justifies its write cost."""
+
+    def __init__(self, collection, keys, unique=False, note=""):
+        self.collection = collection
+        self.keys = [(field, direction) for field, direction in keys]
+        self.unique = unique
+        self.note = note
+
+    def options(self):
+        return {"unique": True} if self.unique else {}
+
+
+# Every index the API relies on. Anything else found on these collections is reported as unmanaged
+INDEX_MANIFEST = [
+    IndexSpec(collection_reports_name, REPORT_ID_KEY, unique=True, note="Report by dr_no, upvote counter updates"),
+    IndexSpec(collection_reports_name, REPORT_CRIME_TIME_KEY, note="Query2"),
+    IndexSpec(collection_reports_name, REPORT_DAY_UPVOTES_KEY, note="Query3, Query6"),
+    IndexSpec(collection_reports_name, GEO_INDEX_KEY, note="near, within, heatmap"),
+    IndexSpec(collection_upvotes_name, UPVOTE_UNIQUE_KEY, unique=True, note="Rejects duplicate upvotes"),
+    IndexSpec(collection_upvote_buckets_name, UPVOTE_BUCKET_KEY, note="Open bucket of a report (bucketed storage)"),
+    IndexSpec(collection_officer_name, [("badge_number", ASCENDING)], unique=True, note="Unique badge numbers"),
+    IndexSpec(collection_officer_activity_name, OFFICER_ACTIVITY_INDEXES[0], note="Query7"),
+    IndexSpec(collection_officer_activity_name, OFFICER_ACTIVITY_INDEXES[1], note="Query8"),
+    IndexSpec(collection_officer_activity_name, OFFICER_ACTIVITY_INDEXES[2], note="Query10"),
+    IndexSpec(collection_officer_email_links_name, EMAIL_LINKS_SHARED_KEY, note="Query9 pages"),
+    IndexSpec(collection_sketches_name, SKETCH_BUCKET_KEY, note="approx=true date ranges (Query1, Query7, Query8)"),
+]
+# Collections inspected even though they only need their _id index
+MANIFEST_COLLECTIONS = sorted({spec.collection for spec in INDEX_MANIFEST}
+                              | {collection_time_rollups_name, collection_reference_codes_name, collection_leaderboards_name})
+
+
+def _keys(info):
+    return [(field, direction) for field, direction in info["key"]]
+
+
+def _is_plain(info):
+    """B-tree index without options that change what it indexes or enforces."""
+    return (all(direction not in _SPECIAL_KEY_TYPES for _, direction in _keys(info))
+            and not any(info.get(option) for option in _BEHAVIOUR_OPTIONS))
+
+
+def _covers(keys, other_keys):
+    """Whether an index on `other_keys` serves every query an index on `keys` can (prefix, same or all-reversed order)."""
+    if len(keys) > len(other_keys):
+        return False
+    prefix = other_keys[:len(keys)]
+    if [field for field, _ in keys] != [field for field, _ in prefix]:
+        return False
+    same = all(direction == other for (_, direction), (_, other) in zip(keys, prefix))
+    reversed_ = all(direction == -other for (_, direction), (_, other) in zip(keys, prefix))
+    return same or reversed_
+
+
+def find_redundant(existing):
+    """
+    {name: covering index name} for the indexes of one collection that another index makes redundant.
+
+    An index is redundant when it is a plain B-tree index whose keys are a prefix of another
+    index's keys. Unique, sparse, partial and TTL indexes are never redundant (they enforce or
+    expire something), and partial or sparse indexes never cover others. Of two identical
+    plain indexes, only the second by name is reported.
+    """
+    redundant = {}
+    for name, info in sorted(existing.items()):
+        if name == "_id_" or not _is_plain(info):
+            continue
+        for other_name, other in sorted(existing.items()):
+            if other_name == name or other_name in redundant or other.get("sparse") or other.get("partialFilterExpression"):
+                continue
+            if any(direction in _SPECIAL_KEY_TYPES for _, direction in _keys(other)):
+                continue
+            if _covers(_keys(info), _keys(other)):
+                redundant[name] = other_name
+                break
+    return redundant
+
+
+def diff_collection(specs, existing):
+    """
+    Compare the declared indexes of a collection with `index_information()`.
+
+    Indexes are matched by key pattern, not by name. Returns rows with a status of
+    "ok", "missing", "conflict" (same keys, different options), "redundant" or "unmanaged".
+    """
+    rows = []
+    matched = set()
+    for spec in specs:
+        name = next((name for name, info in existing.items() if _keys(info) == spec.keys), None)
+        if name is None:
+            rows.append({"spec": spec, "name": None, "status": "missing"})
+            continue
+        matched.add(name)
+        status = "ok" if bool(existing[name].get("unique")) == spec.unique else "conflict"
+        rows.append({"spec": spec, "name": name, "status": status})
+
+    redundant = find_redundant(existing)
+    for row in rows:
+        if row["name"] in redundant and row["status"] == "ok":
+            row["status"] = "redundant"  # The manifest itself declares a prefix of another index
+            row["covered_by"] = redundant[row["name"]]
+    for name in sorted(set(existing) - matched - {"_id_"}):
+        row = {"spec": None, "name": name, "status": "unmanaged", "keys": _keys(existing[name])}
+        if name in redundant:
+            row.update(status="redundant", covered_by=redundant[name])
+        rows.append(row)
+    return rows
+
+
+async def _collection_stats(collection):
+    """Index sizes (bytes) and $indexStats usage counters by index name; empty if the server refuses."""
+    sizes, usage = {}, {}
+    try:
+        cursor = await collection.aggregate([{"$collStats": {"storageStats": {}}}])
+        for stats in await cursor.to_list(length=None):
+            sizes.update(stats.get("storageStats", {}).get("indexSizes", {}))
+        cursor = await collection.aggregate([{"$indexStats": {}}])
+        for stats in await cursor.to_list(length=None):
+            usage[stats["name"]] = {"ops": stats["accesses"]["ops"], "since": stats["accesses"]["since"]}
+    except Exception:
+        pass  # Missing collection or no clusterMonitor privileges
+    return sizes, usage
+
+
+def _report_row(collection_name, row, sizes, usage, action=None):
+    spec = row["spec"]
+    return {
+        "collection": collection_name,
+        "name": row["name"],
+        "keys": dict(spec.keys if spec else row["keys"]),
+        "unique": spec.unique if spec else None,
+        "status": row["status"],
+        "covered_by": row.get("covered_by"),
+        "action": action,
+        "size_bytes": sizes.get(row["name"]),
+        "ops": usage.get(row["name"], {}).get("ops"),
+        "ops_since": usage.get(row["name"], {}).get("since"),
+        "note": spec.note if spec else "",
+    }
+
+
+async def sync_indexes(build=True, drop_redundant=False, drop_unmanaged=False):
+    """
+    Diff every manifest collection against the server and report each index.
+
+    Missing indexes are built when `build` is set. With `drop_redundant`, unmanaged indexes
+    covered by another index are dropped and conflicting indexes are rebuilt with the declared
+    options; `drop_unmanaged` drops every index the manifest doesn't declare. Declared indexes
+    are never dropped (except to rebuild them).
+    """
+    database = get_database()
+    report = []
+    for collection_name in MANIFEST_COLLECTIONS:
+        collection = database[collection_name]
+        specs = [spec for spec in INDEX_MANIFEST if spec.collection == collection_name]
+        existing = await collection.index_information()
+        rows = diff_collection(specs, existing)
+
+        actions = {}
+        for row in rows:
+            spec, name, status = row["spec"], row["name"], row["status"]
+            try:
+                if status == "missing" and build:
+                    await collection.create_index(spec.keys, **spec.options())
+                    actions[id(row)] = "built"
+                elif status == "conflict" and build and drop_redundant:
+                    await collection.drop_index(name)
+                    try:
+                        await collection.create_index(spec.keys, **spec.options())
+                    except Exception:
+                        # E.g. duplicate keys under a new unique constraint: put the old index back
+                        await collection.create_index(spec.keys, name=name, unique=bool(existing[name].get("unique")))
+                        raise
+                    actions[id(row)] = "rebuilt"
+                elif spec is None and (drop_unmanaged or (drop_redundant and status == "redundant")):
+                    await collection.drop_index(name)
+                    actions[id(row)] = "dropped"
+            except Exception as e:
+                actions[id(row)] = f"failed: {e}"
+
+        sizes, usage = await _collection_stats(collection)
+        report.extend(_report_row(collection_name, row, sizes, usage, actions.get(id(row))) for row in rows)
+    return report
+
+
+def needs_attention(report):
+    """Rows that are not simply "ok" after the actions taken."""
+    return [row for row in report
+            if row["status"] != "ok" and row["action"] not in ("built", "rebuilt", "dropped")]
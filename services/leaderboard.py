@@ -0,0 +1,161 @@
+from datetime import timedelta
+
+from pymongo import UpdateOne
+
+from config import LEADERBOARD_SIZE
+from db import get_database, reports_collection, collection_reports_name
+
+# Most upvoted reports of each day, maintained on every report insert and upvote:
+#   {"_id": "<scope>:<YYYY-MM-DD>", "date_occ", "area", "entries": [{"dr_no", "area", "count"}, ...]}
+# The scope is "all" (every area), an area code, or "none" for reports without one. Entries are
+# the day's LEADERBOARD_SIZE reports with most upvotes, by count desc then dr_no, like Query6.
+collection_leaderboards_name = "report_leaderboards"
+ALL_AREAS = "all"
+NO_AREA = "none"
+ENTRY_SORT = {"count": -1, "dr_no": 1}
+
+
+def leaderboards_collection():
+    return get_database()[collection_leaderboards_name]
+
+
+def board_id(day, area=ALL_AREAS):
+    scope = NO_AREA if area is None else area
+    return f"{scope}:{day:%Y-%m-%d}"
+
+
+def _entry(report):
+    return {"dr_no": report["dr_no"], "area": report.get("area"), "count": (report.get("upvotes") or {}).get("count") or 0}
+
+
+def merge_top_entries(field, entries, sort_by, key, size):
+    """
+    Expression merging `entries` into the array `field`: sorted by `sort_by`, first entry of each
+    `key`, at most `size` entries.
+
+    With a sort that puts the highest count first, the entry kept for a key is its highest count,
+    so concurrent or replayed updates can't lower a count. `$sortArray` needs MongoDB 5.2
+    (checked by db.connect_to_mongo).
+    """
+    merged = {"$sortArray": {"input": {"$concatArrays": [{"$ifNull": [f"${field}", []]}, {"$literal": entries}]},
+                             "sortBy": sort_by}}
+    unique = {"$reduce": {
+        "input": merged,
+        "initialValue": [],
+        "in": {"$cond": [{"$in": [f"$$this.{key}", f"$$value.{key}"]}, "$$value", {"$concatArrays": ["$$value", ["$$this"]]}]},
+    }}
+    return {"$slice": [unique, size]}
+
+
+def merge_update(day, area, entries):
+    """Pipeline update folding `entries` into a board (upserted)."""
+    return [{"$set": {"date_occ": day, "area": None if area == ALL_AREAS else area,
+                      "entries": merge_top_entries("entries", entries, ENTRY_SORT, "dr_no", LEADERBOARD_SIZE)}}]
+
+
+async def record_leaderboard_reports(reports):
+    """Fold reports (new ones, or ones whose upvote count changed) into their day and area boards."""
+    if not LEADERBOARD_SIZE:
+        return
+    boards = {}
+    for report in reports:
+        if report.get("date_occ") is None:
+            continue
+        for area in (ALL_AREAS, report.get("area")):
+            boards.setdefault((report["date_occ"], area), []).append(_entry(report))
+    operations = [UpdateOne({"_id": board_id(day, area)}, merge_update(day, area, entries), upsert=True)
+                  for (day, area), entries in boards.items()]
+    if operations:
+        await leaderboards_collection().bulk_write(operations, ordered=False)
+
+
+async def record_leaderboard_upvotes(report_ids):
+    """Re-read the upvote counters of these reports and fold them into the boards."""
+    if not LEADERBOARD_SIZE or not report_ids:
+        return
+    cursor = reports_collection().find({"dr_no": {"$in": list(report_ids)}},
+                                       {"_id": 0, "dr_no": 1, "date_occ": 1, "area": 1, "upvotes.count": 1})
+    await record_leaderboard_reports(await cursor.to_list(length=None))
+
+
+def _entry_after(entry, last_key):
+    """Keyset on (upvotes.count desc, dr_no asc), the Query6 order."""
+    last_count, last_dr_no = last_key["upvotes.count"] or 0, last_key["dr_no"]  # Boards count missing upvotes as 0
+    return entry["count"] < last_count or (entry["count"] == last_count and entry["dr_no"] > last_dr_no)
+
+
+async def top_reports(range_start, range_end, area=ALL_AREAS, last_key=None, limit=LEADERBOARD_SIZE):
+    """
+    Query6 rows of [range_start, range_end) from the day boards, or None if they can't answer.
+
+    A report only belongs to its own day, so the top of a range is the top of the union of the
+    day boards: O(days * LEADERBOARD_SIZE), whatever the number of reports. The union is exact up
+    to LEADERBOARD_SIZE rows (all of them when no board is full); deeper pages need the reports.
+    """
+    first, last = board_id(range_start, area), board_id(range_end - timedelta(days=1), area)
+    cursor = leaderboards_collection().find({"_id": {"$gte": first, "$lte": last}}, {"date_occ": 1, "entries": 1})
+    rows, complete = [], True
+    async for board in cursor:
+        complete &= len(board["entries"]) < LEADERBOARD_SIZE
+        rows += [{"dr_no": entry["dr_no"], "date_occ": board["date_occ"], "area": entry["area"],
+                  "upvotes": {"count": entry["count"]}} for entry in board["entries"]]
+    rows.sort(key=lambda row: (-row["upvotes"]["count"], row["dr_no"]))
+    if not complete:
+        rows = rows[:LEADERBOARD_SIZE]
+    if last_key:
+        rows = [row for row in rows if _entry_after({"dr_no": row["dr_no"], "count": row["upvotes"]["count"]}, last_key)]
+    if len(rows) < limit and not complete:
+        return None
+    return rows[:limit]
+
+
+async def rebuild_leaderboards():
+    """
+    Recompute every board from `reports`: area boards with one grouping, then the all-area
+    boards from the area boards (the top of a day is the top of its area tops).
+    """
+    area_pipeline = [
+        {"$match": {"date_occ": {"$type": "date"}}},
+        {"$group": {
+            "_id": {"date_occ": "$date_occ", "area": "$area"},
+            "entries": {"$topN": {
+                "n": LEADERBOARD_SIZE,
+                "sortBy": {"upvotes.count": -1, "dr_no": 1},
+                "output": {"dr_no": "$dr_no", "area": "$area", "count": {"$ifNull": ["$upvotes.count", 0]}},
+            }},
+        }},
+        {"$project": {
+            "_id": {"$concat": [{"$ifNull": [{"$toString": "$_id.area"}, NO_AREA]}, ":",
+                                {"$dateToString": {"date": "$_id.date_occ", "format": "%Y-%m-%d"}}]},
+            "date_occ": "$_id.date_occ",
+            "area": "$_id.area",
+            "entries": 1,
+        }},
+        {"$out": collection_leaderboards_name},
+    ]
+    all_pipeline = [
+        {"$unwind": "$entries"},
+        {"$group": {
+            "_id": "$date_occ",
+            "entries": {"$topN": {"n": LEADERBOARD_SIZE, "sortBy": {"entries.count": -1, "entries.dr_no": 1},
+                                  "output": "$entries"}},
+        }},
+        {"$project": {
+            "_id": {"$concat": [f"{ALL_AREAS}:", {"$dateToString": {"date": "$_id", "format": "%Y-%m-%d"}}]},
+            "date_occ": "$_id",
+            "area": {"$literal": None},
+            "entries": 1,
+        }},
+        {"$merge": {"into": collection_leaderboards_name, "whenMatched": "replace"}},
+    ]
+    cursor = await get_database()[collection_reports_name].aggregate(area_pipeline, allowDiskUse=True)
+    await cursor.to_list(length=None)
+    cursor = await leaderboards_collection().aggregate(all_pipeline, allowDiskUse=True)
+    await cursor.to_list(length=None)
+    return await leaderboards_collection().estimated_document_count()
+
+
+async def ensure_leaderboards():
+    """Build the boards once if they have never been built (called at startup)."""
+    if LEADERBOARD_SIZE and await leaderboards_collection().estimated_document_count() == 0:
+        await rebuild_leaderboards()
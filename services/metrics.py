@@ -0,0 +1,285 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from pymongo import monitoring
+
+from config import SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE
+
+# Latency buckets (seconds) shared by HTTP requests and Mongo commands
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"  # 404s are grouped so random paths can't blow up the label set
+
+# ASGI scope of the request being served; the router stores the matched route in it
+current_request_scope = ContextVar("current_request_scope", default=None)
+
+
+def current_endpoint():
+    """Route template ("/reports/Query6/") of the request this code runs for, "" outside requests."""
+    scope = current_request_scope.get()
+    if scope is None:
+        return ""
+    return getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A labelled metric rendered in the Prometheus text exposition format."""
+    kind = ""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()  # Driver events may be published from background threads
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value, *extra in self.samples():
+            lines.append(f"{name}{_format_labels(self.label_names, labels, *extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts, total = self._values.get(labels, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bisect_left(self.buckets, value)] += 1  # Per-bucket counts, made cumulative when rendered
+            self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", labels, cumulative, [("le", le)]))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+# HTTP
+http_requests = Counter("lapd_http_requests_total", "HTTP requests by route, method and status code.",
+                        ("route", "method", "status"))
+http_errors = Counter("lapd_http_request_errors_total", "HTTP requests that raised or returned a 5xx status.",
+                      ("route", "method"))
+http_in_flight = Gauge("lapd_http_requests_in_flight", "HTTP requests currently being served.", ("method",))
+http_latency = Histogram("lapd_http_request_duration_seconds", "HTTP request latency until the last body byte.",
+                         ("route", "method"))
+
+# MongoDB commands
+mongo_latency = Histogram("lapd_mongodb_command_duration_seconds", "MongoDB command latency.",
+                          ("command", "collection", "endpoint"))
+mongo_documents = Counter("lapd_mongodb_command_documents_returned_total", "Documents returned by MongoDB commands.",
+                          ("command", "collection", "endpoint"))
+mongo_failures = Counter("lapd_mongodb_command_failures_total", "Failed MongoDB commands.",
+                         ("command", "collection", "endpoint"))
+mongo_slow = Counter("lapd_mongodb_slow_commands_total", "MongoDB commands slower than the slow-query threshold.",
+                     ("command", "collection", "endpoint"))
+mongo_slow_threshold = Gauge("lapd_mongodb_slow_command_threshold_seconds", "Slow-query threshold.")
+mongo_slow_threshold.set(value=SLOW_QUERY_MS / 1000)
+
+REGISTRY = [http_requests, http_errors, http_in_flight, http_latency,
+            mongo_latency, mongo_documents, mongo_failures, mongo_slow, mongo_slow_threshold]
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _shape(value, depth=0):
+    """Command with every literal replaced by "?": shows the query shape without the data in it."""
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        return {key: _shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shape(item, depth + 1) for item in value[:5]] + (["..."] if len(value) > 5 else [])
+    return "?"
+
+
+def _documents_returned(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    return reply.get("n", 0) if isinstance(reply.get("n"), int) else 0
+
+
+# Keys of a command document that are not part of the query shape
+_COMMAND_NOISE = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "documents", "updates", "deletes"}
+# Commands the driver sends for its own bookkeeping
+_IGNORED_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Records every MongoDB command in the metrics above, tagged by collection and by the route
+    that issued it, and keeps the last `log_size` commands slower than `slow_ms` in memory.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_size=SLOW_QUERY_LOG_SIZE):
+        self.slow_seconds = slow_ms / 1000
+        self.slow_log = deque(maxlen=log_size)
+        self._pending = {}  # (connection, request id) -> (collection, endpoint, command shape)
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        if not isinstance(collection, str):
+            collection = ""
+        shape = _shape({key: value for key, value in command.items() if key not in _COMMAND_NOISE})
+        with self._lock:
+            if len(self._pending) > 10_000:  # Events of a dropped connection never complete
+                self._pending.clear()
+            self._pending[(event.connection_id, event.request_id)] = (collection, current_endpoint(), shape)
+
+    def _finish(self, event, failed, reply=None):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, endpoint, shape = pending
+        labels = (event.command_name, collection, endpoint)
+        seconds = event.duration_micros / 1_000_000
+        documents = _documents_returned(reply) if reply else 0
+
+        mongo_latency.observe(labels, seconds)
+        if failed:
+            mongo_failures.inc(labels)
+        else:
+            mongo_documents.inc(labels, documents)
+        if seconds >= self.slow_seconds:
+            mongo_slow.inc(labels)
+            self.slow_log.append({
+                "time": datetime.utcnow().isoformat(),
+                "command": event.command_name,
+                "collection": collection,
+                "endpoint": endpoint,
+                "duration_ms": round(seconds * 1000, 3),
+                "documents_returned": documents,
+                "failed": failed,
+                "shape": shape,
+            })
+
+    def succeeded(self, event):
+        self._finish(event, failed=False, reply=event.reply)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def slow_queries(self, limit=None):
+        """Most recent slow commands first."""
+        entries = list(self.slow_log)[::-1]
+        return entries[:limit] if limit else entries
+
+
+# Registered on the API's async client in db.connect_to_mongo
+command_metrics = CommandMetrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, in-flight requests and errors.
+
+    Requests are labelled with the route template, not the raw path. The route is only known
+    once the router has matched it, so the scope is published in `current_request_scope` and
+    Mongo commands issued by the handler are tagged from it. Latency runs until the last body
+    chunk is sent, so streamed responses are fully counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        token = current_request_scope.set(scope)
+        status = 500
+        http_in_flight.inc((method,))
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            labels = (current_endpoint(), method)
+            http_in_flight.dec((method,))
+            http_latency.observe(labels, time.perf_counter() - started)
+            http_requests.inc(labels + (str(status),))
+            if status >= 500:
+                http_errors.inc(labels)
+            current_request_scope.reset(token)
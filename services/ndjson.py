@@ -0,0 +1,115 @@
+import json
+import zlib
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Largest block produced by one decompress call, so a small gzip body can't expand all at once
+DECOMPRESS_BLOCK_BYTES = 256 * 1024
+
+
+def _decompress(decompressor, data):
+    block = decompressor.decompress(data, DECOMPRESS_BLOCK_BYTES)
+    yield block
+    while decompressor.unconsumed_tail:
+        yield decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_BLOCK_BYTES)
+
+
+async def iter_ndjson_lines(byte_stream, gzipped=None, max_line_bytes=1024 * 1024):
+    """
+    Yield (line_number, line) from an async stream of (optionally gzip-compressed) NDJSON bytes.
+
+    Only the current partial line is buffered, so memory does not grow with the body size.
+    `gzipped=None` detects gzip from the magic bytes of the first chunk.
+    """
+    decompressor = None
+    buffer = b""
+    line_number = 0
+    first_chunk = True
+
+    async for chunk in byte_stream:
+        if not chunk:
+            continue
+        if first_chunk:
+            first_chunk = False
+            if gzipped is None:
+                gzipped = chunk[:2] == GZIP_MAGIC
+            if gzipped:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        blocks = _decompress(decompressor, chunk) if decompressor else (chunk,)
+        for block in blocks:
+            buffer += block
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                yield line_number, line.rstrip(b"\r")
+            if len(buffer) > max_line_bytes:
+                raise ValueError(f"Line {line_number + 1} exceeds {max_line_bytes} bytes.")
+
+    if decompressor:
+        buffer += decompressor.flush()
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.rstrip(b"\r")
+    if buffer.strip():
+        yield line_number + 1, buffer.rstrip(b"\r")
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Documents serialized per chunk written to the response
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson(request):
+    """Streaming is opt-in with `Accept: application/x-ndjson`."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_dumps(document):
+    return json.dumps(document, default=_json_default)
+
+
+async def _iterate(rows):
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def _ndjson_chunks(rows, transform):
+    lines = []
+    try:
+        async for row in _iterate(rows):
+            lines.append(ndjson_dumps(transform(row) if transform else row))
+            if len(lines) >= STREAM_BATCH_SIZE:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+    except Exception as e:
+        # Headers are already sent: report the failure as the last line
+        lines.append(ndjson_dumps({"status": "error", "message": str(e)}))
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def ndjson_response(rows, transform=None):
+    """
+    Stream `rows` (an async cursor or a list) as newline-delimited JSON.
+
+    Documents are written in batches as the cursor yields them, so neither time-to-first-byte
+    nor memory depends on the size of the result.
+    """
+    return StreamingResponse(_ndjson_chunks(rows, transform), media_type=NDJSON_MEDIA_TYPE)
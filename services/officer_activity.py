@@ -0,0 +1,152 @@
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from db import get_database, collection_reports_name
+from services.reference_codes import is_compact, label_expression
+from services.upvote_store import officer_upvote_source, report_area_names
+
+# Materialized per-officer upvote activity, maintained on every upvote write:
+#   officer_activity:     {"_id": badge number, "officer_name", "officer_email", "total_upvotes", "areas", "area_count"}
+#   officer_email_links:  {"_id": email, "badge_numbers", "reports", "reports_truncated",
+#                          "shared": more than one badge number}
+# The officer name and email are those of the officer's latest upvote.
+collection_officer_activity_name = "officer_activity"
+collection_officer_email_links_name = "officer_email_links"
+# Reports kept per email (the lowest report ids), so a link document stays far below 16MB
+EMAIL_LINK_MAX_REPORTS = 1000
+
+OFFICER_ACTIVITY_INDEXES = [
+    [("total_upvotes", DESCENDING)],  # Most active officers (Query7)
+    [("area_count", DESCENDING)],  # Officers by distinct areas (Query8)
+    [("officer_name", ASCENDING)],  # Areas voted by an officer (Query10)
+]
+# Emails shared by several badge numbers, in email order (Query9 pages)
+EMAIL_LINKS_SHARED_KEY = [("shared", ASCENDING), ("_id", ASCENDING)]
+
+
+def officer_activity_collection():
+    return get_database()[collection_officer_activity_name]
+
+
+def officer_email_links_collection():
+    return get_database()[collection_officer_email_links_name]
+
+
+async def ensure_officer_activity_indexes():
+    """Indexes the officer analytics read from (no-op if they already exist)."""
+    for keys in OFFICER_ACTIVITY_INDEXES:
+        await officer_activity_collection().create_index(keys)
+    await officer_email_links_collection().create_index(EMAIL_LINKS_SHARED_KEY)
+
+
+def _union(field, values):
+    return {"$setUnion": [{"$ifNull": [f"${field}", []]}, values]}
+
+
+def _capped_reports(reports):
+    """Set `reports` to its EMAIL_LINK_MAX_REPORTS lowest ids, flagging the document when some were dropped."""
+    return {
+        "reports": {"$slice": [{"$sortArray": {"input": reports, "sortBy": 1}}, EMAIL_LINK_MAX_REPORTS]},
+        "reports_truncated": {"$gt": [{"$size": reports}, EMAIL_LINK_MAX_REPORTS]},
+    }
+
+
+async def record_officer_activity(upvote_docs):
+    """
+    Fold a batch of new upvotes into the view: one update per officer and one per email.
+
+    Updates are aggregation pipelines, so the area set and its size (and the shared flag of
+    an email) are recomputed in the same atomic write as the counters. Returns the area names
+    of the upvoted reports.
+    """
+    if not upvote_docs:
+        return {}
+    area_names = await report_area_names({upvote_data["report_id"] for upvote_data in upvote_docs})
+
+    officers, emails = {}, {}
+    for upvote_data in upvote_docs:
+        officer = officers.setdefault(upvote_data["officer_badge_number"], {"count": 0, "areas": set()})
+        officer["officer_name"] = upvote_data["officer_name"]
+        officer["officer_email"] = upvote_data["officer_email"]
+        officer["count"] += 1
+        if area_names.get(upvote_data["report_id"]) is not None:
+            officer["areas"].add(area_names[upvote_data["report_id"]])
+
+        links = emails.setdefault(upvote_data["officer_email"], {"badge_numbers": set(), "reports": set()})
+        links["badge_numbers"].add(upvote_data["officer_badge_number"])
+        links["reports"].add(upvote_data["report_id"])
+
+    officer_ops = [
+        UpdateOne({"_id": badge_number}, [
+            {"$set": {
+                "officer_name": officer["officer_name"],
+                "officer_email": officer["officer_email"],
+                "total_upvotes": {"$add": [{"$ifNull": ["$total_upvotes", 0]}, officer["count"]]},
+                "areas": _union("areas", sorted(officer["areas"])),
+            }},
+            {"$set": {"area_count": {"$size": "$areas"}}},
+        ], upsert=True)
+        for badge_number, officer in officers.items()
+    ]
+    email_ops = [
+        UpdateOne({"_id": email}, [
+            {"$set": {
+                "badge_numbers": _union("badge_numbers", sorted(links["badge_numbers"])),
+                "reports": _union("reports", sorted(links["reports"])),
+                "was_truncated": {"$ifNull": ["$reports_truncated", False]},
+            }},
+            {"$set": {"shared": {"$gt": [{"$size": "$badge_numbers"}, 1]}, **_capped_reports("$reports")}},
+            {"$set": {"reports_truncated": {"$or": ["$reports_truncated", "$was_truncated"]}}},
+            {"$unset": "was_truncated"},
+        ], upsert=True)
+        for email, links in emails.items()
+    ]
+    await officer_activity_collection().bulk_write(officer_ops, ordered=False)
+    await officer_email_links_collection().bulk_write(email_ops, ordered=False)
+    return area_names
+
+
+async def rebuild_officer_activity():
+    """Recompute both view collections from the stored upvotes ($out swaps each one in atomically)."""
+    collection, upvotes_path, report_id_field, collection_name = officer_upvote_source()
+    area_name = "$area_name"  # Buckets keep the area name; compact reports only have the area code
+    if collection_name == collection_reports_name and is_compact():
+        area_name = label_expression("area", "$area")
+    officer_pipeline = [
+        {"$unwind": f"${upvotes_path}"},
+        {"$sort": {f"{upvotes_path}.upvote_time": 1}},  # $last: name and email of the latest upvote
+        {"$group": {
+            "_id": f"${upvotes_path}.officer_badge_number",
+            "officer_name": {"$last": f"${upvotes_path}.officer_name"},
+            "officer_email": {"$last": f"${upvotes_path}.officer_email"},
+            "total_upvotes": {"$sum": 1},
+            "areas": {"$addToSet": area_name},
+        }},
+        {"$set": {"areas": {"$filter": {"input": "$areas", "cond": {"$ne": ["$$this", None]}}}}},
+        {"$set": {"area_count": {"$size": "$areas"}}},
+        {"$out": collection_officer_activity_name},
+    ]
+    email_pipeline = [
+        {"$unwind": f"${upvotes_path}"},
+        {"$sort": {report_id_field: 1}},
+        {"$group": {
+            "_id": f"${upvotes_path}.officer_email",
+            "badge_numbers": {"$addToSet": f"${upvotes_path}.officer_badge_number"},
+            # One more than kept, to tell whether reports were dropped (an unbounded set could pass 16MB)
+            "reports": {"$firstN": {"n": EMAIL_LINK_MAX_REPORTS + 1, "input": f"${report_id_field}"}},
+        }},
+        {"$set": {"shared": {"$gt": [{"$size": "$badge_numbers"}, 1]}, **_capped_reports({"$setUnion": ["$reports"]})}},
+        {"$out": collection_officer_email_links_name},
+    ]
+    for pipeline in (officer_pipeline, email_pipeline):
+        cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+        await cursor.to_list(length=None)
+    await ensure_officer_activity_indexes()
+    return await officer_activity_collection().estimated_document_count()
+
+
+async def ensure_officer_activity():
+    """Build the view once if it has never been built (called at startup)."""
+    if await officer_activity_collection().estimated_document_count() == 0:
+        await rebuild_officer_activity()
+    else:
+        await ensure_officer_activity_indexes()
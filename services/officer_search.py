@@ -0,0 +1,195 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from db import officers_collection
+
+# Fuzzy matches scoring below this (Dice coefficient of trigrams) are dropped
+MIN_FUZZY_SCORE = 0.3
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name):
+    """Lowercase, strip accents and collapse punctuation/whitespace: "O'Brien,  José" -> "o brien jose"."""
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub(" ", name.lower()).strip()
+
+
+def trigrams(normalized):
+    padded = f"  {normalized} "  # Padding lets the first letters of a name count as grams too
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def inner_trigrams(normalized):
+    """Trigrams without padding: every one of them occurs in any name containing `normalized`."""
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+
+def short_grams(normalized):
+    """Every 1 and 2 character substring, so one posting lookup answers queries shorter than a trigram."""
+    return {normalized[i:i + size] for size in (1, 2) for i in range(len(normalized) - size + 1)}
+
+
+class OfficerSearchIndex:
+    """
+    In-process name index over the `officer` collection.
+
+    Officers get dense integer positions. Sorted (key, position) lists serve prefix
+    autocomplete by bisection, and an inverted n-gram index (gram -> positions) serves
+    substring and fuzzy search by counting shared grams with `np.bincount`, so lookups never
+    touch MongoDB. It is loaded once at startup and kept current by `add`; officers inserted
+    by other processes show up after the next `load`.
+    """
+
+    def __init__(self):
+        self._records = []  # position -> {"_id", "name", "badge_number", "normalized"}
+        self._positions = {}  # officer _id -> position
+        self._name_keys = []  # Sorted (normalized full name, position)
+        self._token_keys = []  # Sorted (single name token, position)
+        self._postings = {}  # trigram, or 1-2 character substring -> list of positions
+        self._gram_counts = []  # position -> number of distinct trigrams in the name
+        self._arrays = {}  # trigram -> numpy copy of its postings, dropped when the gram changes
+        self._gram_count_array = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def clear(self):
+        self.__init__()
+
+    def _index(self, officer):
+        """Index one officer; returns its position, or None if it is already indexed."""
+        if officer["_id"] in self._positions:
+            return None
+        position = len(self._records)
+        normalized = normalize_name(officer.get("name"))
+        self._records.append({
+            "_id": officer["_id"],
+            "name": officer.get("name") or "",
+            "badge_number": officer.get("badge_number"),
+            "normalized": normalized,
+        })
+        self._positions[officer["_id"]] = position
+        grams = trigrams(normalized)
+        self._gram_counts.append(len(grams))
+        for gram in grams | short_grams(normalized):
+            self._postings.setdefault(gram, []).append(position)
+            self._arrays.pop(gram, None)
+        self._gram_count_array = None
+        return position
+
+    def _token_keys_of(self, position):
+        normalized = self._records[position]["normalized"]
+        return [(token, position) for token in set(normalized.split())]
+
+    def add(self, officer):
+        position = self._index(officer)
+        if position is None:
+            return
+        insort(self._name_keys, (self._records[position]["normalized"], position))
+        for key in self._token_keys_of(position):
+            insort(self._token_keys, key)
+
+    async def load(self):
+        """(Re)build the index from the `officer` collection."""
+        officers = await officers_collection().find({}, {"name": 1, "badge_number": 1}).to_list(length=None)
+        self.clear()
+        for officer in officers:
+            self._index(officer)
+        # One sort per list instead of an insort per key
+        self._name_keys = sorted((record["normalized"], position) for position, record in enumerate(self._records))
+        self._token_keys = sorted(key for position in range(len(self._records)) for key in self._token_keys_of(position))
+        return len(self._records)
+
+    def _postings_array(self, gram):
+        array = self._arrays.get(gram)
+        if array is None:
+            array = self._arrays[gram] = np.asarray(self._postings.get(gram, ()), dtype=np.int64)
+        return array
+
+    def _shared_counts(self, grams):
+        """Number of `grams` found in each officer's name, indexed by position."""
+        arrays = [self._postings_array(gram) for gram in grams]
+        arrays = [array for array in arrays if len(array)]
+        if not arrays:
+            return np.zeros(len(self._records), dtype=np.int64)
+        return np.bincount(np.concatenate(arrays), minlength=len(self._records))
+
+    def _result(self, position, score=None):
+        record = self._records[position]
+        result = {"_id": str(record["_id"]), "name": record["name"], "badge_number": record["badge_number"]}
+        if score is not None:
+            result["score"] = round(float(score), 3)
+        return result
+
+    @staticmethod
+    def _scan_prefix(keys, prefix, limit, seen):
+        matches = []
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and len(matches) < limit and keys[i][0].startswith(prefix):
+            position = keys[i][1]
+            if position not in seen:
+                seen.add(position)
+                matches.append(position)
+            i += 1
+        return matches
+
+    def autocomplete(self, prefix, limit=10):
+        """Officers whose full name, then any other name token, starts with `prefix`."""
+        prefix = normalize_name(prefix)
+        if not prefix or limit < 1:
+            return []
+        seen = set()
+        matches = self._scan_prefix(self._name_keys, prefix, limit, seen)
+        if len(matches) < limit:
+            matches += self._scan_prefix(self._token_keys, prefix, limit - len(matches), seen)
+        return [self._result(position) for position in matches]
+
+    def _containing(self, text):
+        """Positions of the officers whose normalized name contains the normalized `text` (none for empty text)."""
+        if not text:
+            return []
+        if len(text) < 3:
+            return self._postings.get(text, [])  # Exact: the text is itself an indexed short gram
+        # A name containing the text has every inner trigram of it; confirm the survivors
+        grams = inner_trigrams(text)
+        candidates = np.flatnonzero(self._shared_counts(grams) == len(grams))
+        return [int(position) for position in candidates if text in self._records[position]["normalized"]]
+
+    def matching_ids(self, text):
+        """_ids of the officers whose name contains `text` (case, accent and punctuation insensitive)."""
+        return [self._records[position]["_id"] for position in self._containing(normalize_name(text))]
+
+    def sorted_matches(self, text):
+        """(name, _id) of the officers matching `text` in the (name, _id) order used by /officers/find/."""
+        text = normalize_name(text)
+        return sorted((self._records[position]["name"], self._records[position]["_id"])
+                      for position in self._containing(text))
+
+    def search(self, query, limit=10, min_score=MIN_FUZZY_SCORE):
+        """
+        Ranked fuzzy search. The score is the Dice coefficient of the query's and the name's
+        trigrams, plus 1 for names containing the query, so exact substrings rank first.
+        """
+        query = normalize_name(query)
+        if not query or not self._records or limit < 1:
+            return []
+        query_grams = trigrams(query)
+        if self._gram_count_array is None:
+            self._gram_count_array = np.asarray(self._gram_counts, dtype=np.int64)
+        scores = 2 * self._shared_counts(query_grams) / (len(query_grams) + self._gram_count_array)
+        scores[self._containing(query)] += 1
+
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > limit:
+            # Keep everything tied with the limit-th score so the name tie-break stays deterministic
+            cutoff = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[scores[candidates] >= cutoff]
+        ranked = sorted(candidates.tolist(), key=lambda position: (-scores[position], self._records[position]["normalized"]))
+        return [self._result(position, scores[position]) for position in ranked[:limit]]
+
+
+# Loaded at startup, updated by POST /officers/add
+officer_search_index = OfficerSearchIndex()
@@ -0,0 +1,86 @@
+import base64
+
+from bson import json_util
+
+
+def _get_path(document, path):
+    for part in path.split("."):
+        document = document.get(part) if isinstance(document, dict) else None
+    return document
+
+
+def encode_page_token(last_item, sort_fields):
+    """Opaque continuation token holding the sort key of the last item of a page."""
+    key = {field: _get_path(last_item, field) for field, _ in sort_fields}
+    return base64.urlsafe_b64encode(json_util.dumps(key).encode()).decode()
+
+
+def decode_page_token(token, sort_fields):
+    """Return the sort key stored in `token`, or None for the first page."""
+    if not token:
+        return None
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid page token.")
+    if not isinstance(key, dict) or any(field not in key for field, _ in sort_fields):
+        raise ValueError("Invalid page token.")
+    return key
+
+
+def _after(field, direction, last):
+    """Filter on `field` for values strictly after `last`, with null (or missing) sorted first like BSON."""
+    if last is None:
+        # Everything is after null in ascending order, nothing in descending order
+        return {field: {"$ne": None}} if direction == 1 else None
+    if direction == 1:
+        return {field: {"$gt": last}}
+    return {"$or": [{field: {"$lt": last}}, {field: None}]}
+
+
+def keyset_filter(sort_fields, last_key):
+    """
+    Filter matching everything strictly after `last_key` in `sort_fields` order.
+
+    For a sort on (a desc, b asc) this is {a < last.a} OR {a == last.a AND b > last.b}, which the
+    planner can answer from an index on the same fields. Null sort values are ordered like MongoDB
+    does (before every other value), so a page may end on a report without the field.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort_fields):
+        after = _after(field, direction, last_key[field])
+        if after is None:
+            continue
+        clause = {previous: last_key[previous] for previous, _ in sort_fields[:i]}
+        clause.update(after)
+        clauses.append(clause)
+    if not clauses:
+        return {"_id": {"$exists": False}}  # Nothing comes after the last key
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _sort_value(value):
+    """Comparable sort value, null (or missing) first like MongoDB."""
+    return (value is not None, value)
+
+
+def rows_after(rows, sort_fields, last_key):
+    """In-memory counterpart of `keyset_filter` for rows already sorted in `sort_fields` order."""
+    if not last_key:
+        return rows
+
+    def after(row):
+        for field, direction in sort_fields:
+            value, last = _sort_value(_get_path(row, field)), _sort_value(last_key[field])
+            if value != last:
+                return value > last if direction == 1 else value < last
+        return False
+    return [row for row in rows if after(row)]
+
+
+def split_page(results, page_size, sort_fields):
+    """Results are fetched with limit page_size + 1; returns (page, next page token or None)."""
+    if len(results) <= page_size:
+        return results, None
+    page = results[:page_size]
+    return page, encode_page_token(page[-1], sort_fields)
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+
+from config import QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS
+
+
+class QueryCache:
+    """
+    In-process cache for analytic query results.
+
+    Entries expire after `ttl_seconds`, the least recently used entry is evicted once
+    `max_entries` is reached, and every entry is dropped as soon as one of the collections
+    it depends on is written through `invalidate`.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, depends_on, value)
+        self._generations = {}  # collection name -> number of writes seen
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(endpoint, **params):
+        return endpoint, tuple(sorted(params.items()))
+
+    def get(self, key):
+        """Return (value, age_seconds) or None if the key is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, _, value = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, age
+
+    def set(self, key, value, depends_on):
+        self._entries[key] = (time.monotonic(), frozenset(depends_on), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def generation(self, depends_on):
+        return tuple(self._generations.get(name, 0) for name in sorted(depends_on))
+
+    def invalidate(self, *collection_names):
+        """Drop every cached result that depends on one of the written collections."""
+        for name in collection_names:
+            self._generations[name] = self._generations.get(name, 0) + 1
+        names = set(collection_names)
+        for key in [key for key, (_, depends_on, _) in self._entries.items() if depends_on & names]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_compute(self, key, depends_on, compute):
+        """
+        Return (value, cache metadata), running `compute()` on a miss.
+
+        A result computed while one of its collections was written is returned but not stored,
+        so a slow query can never put a pre-write result back into the cache.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            value, age = cached
+            return value, {"hit": True, "age_seconds": round(age, 3), "ttl_seconds": self.ttl_seconds}
+
+        self.misses += 1
+        generation = self.generation(depends_on)
+        value = await compute()
+        if self.generation(depends_on) == generation:
+            self.set(key, value, depends_on)
+        return value, {"hit": False, "age_seconds": 0.0, "ttl_seconds": self.ttl_seconds}
+
+
+# Shared by all routers of this process
+query_cache = QueryCache()
+
+
+async def cached_aggregate(endpoint, collection, pipeline, depends_on, **params):
+    """Run `pipeline` on `collection` through the shared cache. Returns (results, cache metadata)."""
+    async def compute():
+        cursor = await collection.aggregate(pipeline)
+        return await cursor.to_list(length=None)
+
+    key = query_cache.make_key(endpoint, **params)
+    return await query_cache.get_or_compute(key, depends_on, compute)
@@ -0,0 +1,344 @@
+import asyncio
+import time
+from datetime import timedelta
+from types import MappingProxyType
+
+from pymongo import UpdateOne
+
+from config import REPORT_STORAGE, REFERENCE_REFRESH_SECONDS
+from db import get_database, reports_collection
+
+# One document per code: {"_id": "<kind>:<code>", "kind", "code", "label", "updated_at"}
+collection_reference_codes_name = "reference_codes"
+
+# Tables derived from the reports: kind -> (code field, label field); the crime label describes the first crime code
+REPORT_LABEL_FIELDS = {
+    "area": ("area", "area_name"),
+    "crime": ("crm_codes.crime_codes", "crm_codes.crm_cd_desc"),
+    "premis": ("premis.premis_cd", "premis.premis_desc"),
+    "weapon": ("weapon.weapon_used_cd", "weapon.weapon_desc"),
+    "status": ("status", "status_desc"),
+}
+# MO codes are derived from the reports too, but the feed carries no description for them (labels are null)
+MOCODE_KIND = "mocode"
+DERIVED_KINDS = tuple(REPORT_LABEL_FIELDS) + (MOCODE_KIND,)
+
+# Fixed code lists of the LAPD feed (not stored)
+SEX_LABELS = {"F": "Female", "M": "Male", "X": "Unknown"}
+DESCENT_LABELS = {
+    "A": "Other Asian",
+    "B": "Black",
+    "C": "Chinese",
+    "D": "Cambodian",
+    "F": "Filipino",
+    "G": "Guamanian",
+    "H": "Hispanic/Latin/Mexican",
+    "I": "American Indian/Alaskan Native",
+    "J": "Japanese",
+    "K": "Korean",
+    "L": "Laotian",
+    "O": "Other",
+    "P": "Pacific Islander",
+    "S": "Samoan",
+    "U": "Hawaiian",
+    "V": "Vietnamese",
+    "W": "White",
+    "X": "Unknown",
+    "Z": "Asian Indian",
+}
+BUILTIN_TABLES = {"sex": SEX_LABELS, "descent": DESCENT_LABELS}
+# Victim fields hold the label in expanded reports and the feed code in compact ones
+VICTIM_FIELDS = {"victim.vict_sex": "sex", "victim.vict_descent": "descent"}
+_VICTIM_CODES = {field: {label: code for code, label in BUILTIN_TABLES[kind].items()} for field, kind in VICTIM_FIELDS.items()}
+
+# An unknown code triggers a refresh, at most this often
+RELOAD_INTERVAL_SECONDS = 5.0
+# Incremental refreshes re-read this far back, for writes that committed out of `updated_at` order
+REFRESH_OVERLAP = timedelta(seconds=10)
+
+_MISSING = object()
+
+
+def reference_codes_collection():
+    return get_database()[collection_reference_codes_name]
+
+
+def is_compact():
+    return REPORT_STORAGE == "compact"
+
+
+def sex_label(code):
+    """Victim sex label of a feed code; anything but F/M is "Unknown"."""
+    return SEX_LABELS.get(code, "Unknown")
+
+
+def descent_label(code):
+    """Victim descent label of a feed code (None if missing or unknown)."""
+    return DESCENT_LABELS.get(code)
+
+
+def _get(document, path):
+    for key in path.split("."):
+        if not isinstance(document, dict) or key not in document:
+            return _MISSING
+        document = document[key]
+    return document
+
+
+def _parent(document, path):
+    """(dict holding the last key of `path`, that key); the dict is None when a level is missing."""
+    *parents, key = path.split(".")
+    for parent in parents:
+        document = document.get(parent) if isinstance(document, dict) else None
+    return (document if isinstance(document, dict) else None), key
+
+
+def report_code(report, kind):
+    """Code of `kind` in a report document or projection, `_MISSING` if the projection left it out."""
+    code = _get(report, REPORT_LABEL_FIELDS[kind][0])
+    if isinstance(code, list):  # Crime codes: the description is the first code's
+        return code[0] if code else ""
+    return code
+
+
+def collect_labels(reports):
+    """{(kind, code): label} of the report documents given (compact ones only contribute codes without labels)."""
+    labels = {}
+    for report in reports:
+        for kind, (_, label_field) in REPORT_LABEL_FIELDS.items():
+            code, label = report_code(report, kind), _get(report, label_field)
+            if code not in (_MISSING, None, "") and isinstance(label, str) and label:
+                labels.setdefault((kind, code), label)
+        for code in report.get("mocodes") or []:
+            labels.setdefault((MOCODE_KIND, code), None)
+    return labels
+
+
+def compact_report(report):
+    """Drop the labels of a report document in place, keeping the codes (victim labels go back to feed codes)."""
+    for _, label_field in REPORT_LABEL_FIELDS.values():
+        parent, key = _parent(report, label_field)
+        if parent is not None:
+            parent.pop(key, None)
+    for field, codes in _VICTIM_CODES.items():
+        parent, key = _parent(report, field)
+        if parent is not None and parent.get(key) in codes:
+            parent[key] = codes[parent[key]]
+    return report
+
+
+def _frozen(tables):
+    return MappingProxyType({kind: MappingProxyType(labels) for kind, labels in tables.items()})
+
+
+class ReferenceCodes:
+    """
+    In-process reference tables ({kind: {code: label}}) as read-only mappings.
+
+    Tables are never changed in place: a refresh copies the tables it changes and swaps the whole
+    snapshot, so a reader holding `tables` always sees one consistent version. Refreshes only read
+    the codes written since the previous one. Writers add the codes they haven't seen before
+    inserting reports, so the tables always cover the stored reports.
+    """
+
+    def __init__(self, refresh_interval=REFERENCE_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.tables = _frozen({**{kind: {} for kind in DERIVED_KINDS}, **BUILTIN_TABLES})
+        self._seen_until = None  # Latest `updated_at` read so far
+        self._refreshed_at = 0.0
+        self._task = None
+
+    def _merge(self, documents):
+        changed = {}
+        for document in documents:
+            kind, code, label = document["kind"], document["code"], document.get("label")
+            if self.tables.get(kind, {}).get(code, _MISSING) != label:
+                changed.setdefault(kind, {})[code] = label
+            if document.get("updated_at") and (self._seen_until is None or document["updated_at"] > self._seen_until):
+                self._seen_until = document["updated_at"]
+        if changed:
+            tables = {kind: dict(labels) for kind, labels in self.tables.items()}
+            for kind, labels in changed.items():
+                tables.setdefault(kind, {}).update(labels)
+            self.tables = _frozen(tables)
+        return sum(len(labels) for labels in changed.values())
+
+    def _refresh_query(self):
+        return {} if self._seen_until is None else {"updated_at": {"$gte": self._seen_until - REFRESH_OVERLAP}}
+
+    async def refresh(self):
+        """Read the codes written since the last refresh (every code the first time). Returns how many changed."""
+        documents = await reference_codes_collection().find(self._refresh_query()).to_list(length=None)
+        self._refreshed_at = time.monotonic()
+        return self._merge(documents)
+
+    def refresh_sync(self, database):
+        """Same as `refresh` for the offline scripts (blocking client)."""
+        documents = list(database[collection_reference_codes_name].find(self._refresh_query()))
+        self._refreshed_at = time.monotonic()
+        return self._merge(documents)
+
+    def _unknown(self, labels):
+        return {(kind, code): label for (kind, code), label in labels.items() if code not in self.tables.get(kind, {})}
+
+    @staticmethod
+    def _upserts(labels):
+        # $setOnInsert: the first label stored for a code wins, concurrent writers don't overwrite each other
+        return [
+            UpdateOne({"_id": f"{kind}:{code}"}, {
+                "$setOnInsert": {"kind": kind, "code": code, "label": label},
+                "$currentDate": {"updated_at": True},  # Server time, picked up by incremental refreshes
+            }, upsert=True)
+            for (kind, code), label in labels.items()
+        ]
+
+    async def save(self, labels):
+        """Store the {(kind, code): label} pairs this process doesn't know yet."""
+        new = self._unknown(labels)
+        if new:
+            await reference_codes_collection().bulk_write(self._upserts(new), ordered=False)
+            self._merge({"kind": kind, "code": code, "label": label} for (kind, code), label in new.items())
+
+    def save_sync(self, database, labels):
+        new = self._unknown(labels)
+        if new:
+            database[collection_reference_codes_name].bulk_write(self._upserts(new), ordered=False)
+            self._merge({"kind": kind, "code": code, "label": label} for (kind, code), label in new.items())
+
+    def label(self, kind, code):
+        """Label of a code (None if unknown or undescribed); empty codes have empty labels."""
+        if code is None or code == "":
+            return code
+        return self.tables.get(kind, {}).get(code)
+
+    def lookup(self, kind, code):
+        """Label of a code given as text (e.g. from a URL); raises KeyError for an unknown table or code."""
+        table = self.tables[kind]
+        if code not in table and code.isdigit() and int(code) in table:  # Area codes are numbers
+            code = int(code)
+        return code, table[code]
+
+    def expand(self, report):
+        """Add the labels missing from a report document or projection, in place. Expanded reports are unchanged."""
+        for kind, (_, label_field) in REPORT_LABEL_FIELDS.items():
+            code = report_code(report, kind)
+            parent, key = _parent(report, label_field)
+            if code is _MISSING or parent is None or key in parent:
+                continue
+            parent[key] = self.label(kind, code)
+        for field, kind in VICTIM_FIELDS.items():
+            parent, key = _parent(report, field)
+            if parent is not None and parent.get(key) in BUILTIN_TABLES[kind]:
+                parent[key] = BUILTIN_TABLES[kind][parent[key]]
+        return report
+
+    def with_crime_desc(self, row, code_field="crm_cd"):
+        """A result row with the description of its crime code, read from memory instead of a $lookup."""
+        return {**row, "crm_cd_desc": self.label("crime", row[code_field])}
+
+    async def ensure_known(self, codes_by_kind):
+        """Refresh when one of the {kind: codes} given is unknown here (added by another process or an ingest)."""
+        unknown = any(
+            code not in (None, "") and code not in self.tables.get(kind, {})
+            for kind, codes in codes_by_kind.items() for code in codes
+        )
+        if unknown and time.monotonic() - self._refreshed_at >= RELOAD_INTERVAL_SECONDS:
+            await self.refresh()
+
+    async def expand_all(self, reports):
+        """`expand` every report, refreshing first if one of them needs a code this process hasn't seen."""
+        codes = {}
+        for report in reports:
+            for kind, (_, label_field) in REPORT_LABEL_FIELDS.items():
+                code = report_code(report, kind)
+                if code is not _MISSING and _get(report, label_field) is _MISSING:
+                    codes.setdefault(kind, set()).add(code)
+        await self.ensure_known(codes)
+        return [self.expand(report) for report in reports]
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Reference data refresh failed, will retry: {e}")
+
+    def start(self):
+        if self._task is None and self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Shared by the routers, loaded and refreshed by main.startup_event
+reference_codes = ReferenceCodes()
+
+
+async def prepare_reports(reports):
+    """Before inserting report documents: record their new codes, then drop their labels in compact mode."""
+    await reference_codes.save(collect_labels(reports))
+    if is_compact():
+        for report in reports:
+            compact_report(report)
+    return reports
+
+
+def prepare_reports_sync(database, reports):
+    """`prepare_reports` for the offline loaders (blocking client)."""
+    reference_codes.save_sync(database, collect_labels(reports))
+    if is_compact():
+        for report in reports:
+            compact_report(report)
+    return reports
+
+
+def report_area_name(report):
+    """Area name of a report document in either storage mode (None for reports without an area)."""
+    if "area_name" in report:
+        return report["area_name"]
+    return reference_codes.label("area", report.get("area"))
+
+
+def label_expression(kind, code_expression):
+    """Aggregation expression turning a code into its label, for server-side groupings over compact reports."""
+    branches = [
+        {"case": {"$eq": [code_expression, code]}, "then": {"$literal": label}}
+        for code, label in reference_codes.tables.get(kind, {}).items()
+    ]
+    return {"$switch": {"branches": branches, "default": None}} if branches else None
+
+
+async def rebuild_reference_codes():
+    """Derive the tables from the reports in one $facet pass: labels of expanded reports and every MO code."""
+    facets = {}
+    for kind, (code_field, label_field) in REPORT_LABEL_FIELDS.items():
+        code = {"$arrayElemAt": [f"${code_field}", 0]} if kind == "crime" else f"${code_field}"
+        facets[kind] = [
+            {"$match": {label_field: {"$nin": ["", None]}}},
+            {"$group": {"_id": code, "label": {"$first": f"${label_field}"}}},
+        ]
+    facets[MOCODE_KIND] = [{"$unwind": "$mocodes"}, {"$group": {"_id": "$mocodes", "label": {"$first": None}}}]
+    labels = {}
+    cursor = await reports_collection().aggregate([{"$facet": facets}], allowDiskUse=True)
+    async for row in cursor:
+        for kind, groups in row.items():
+            labels.update({(kind, group["_id"]): group["label"] for group in groups if group["_id"] not in (None, "")})
+    await reference_codes.save(labels)
+    return len(labels)
+
+
+async def ensure_reference_codes():
+    """Load the tables, deriving them from the reports first if one was never built (called at startup)."""
+    cursor = await reference_codes_collection().aggregate([{"$group": {"_id": "$kind", "codes": {"$sum": 1}}}])
+    built = {row["_id"] async for row in cursor}
+    if not built.issuperset(DERIVED_KINDS):
+        await rebuild_reference_codes()
+    await reference_codes.refresh()
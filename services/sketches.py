@@ -0,0 +1,494 @@
+import asyncio
+import hashlib
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import ASCENDING, UpdateOne
+
+from config import SKETCHES_ENABLED, SKETCH_FLUSH_INTERVAL_SECONDS
+from db import get_database, collection_reports_name
+from scripts import time_utils
+from scripts.time_utils import MINUTES_PER_DAY
+from services.leaderboard import merge_top_entries
+from services.reference_codes import is_compact, label_expression
+from services.upvote_store import officer_upvote_source
+
+# Summaries for the approx=true analytics, fed by every report and upvote write through an
+# in-memory buffer flushed every SKETCH_FLUSH_INTERVAL_SECONDS (no extra round trip per write).
+# One document per kind and time bucket, for every day and every month:
+#   {"_id": "<kind>:<day|month>:<YYYY-MM-DD>", "kind", "granularity", "start",
+#    "weight": items counted, "cms": {row: {column: count}}, "candidates": [{"item", "estimate", ...}],
+#    day officer documents only: "areas": {badge: [area name, ...]}, "names": {badge: [name, email]}}
+# Count-Min sketches merge by addition, so a date range reads whole months and the days at both
+# ends instead of the reports or upvotes. Month documents stay a fixed size: the per-officer area
+# sets (an officer votes in at most ~21 areas, exact sets are smaller than a HyperLogLog) are only
+# kept per day.
+collection_sketches_name = "analytics_sketches"
+SKETCH_BUCKET_KEY = [("kind", ASCENDING), ("granularity", ASCENDING), ("start", ASCENDING)]
+CRIMES = "crimes"  # By date_occ: reports per crime code, and per crime code and hour of day
+OFFICERS = "officers"  # By upvote day: upvotes per badge number, areas per badge number
+DAY, MONTH = "day", "month"
+
+# Count-Min: estimates never undercount, and overcount by at most e / CMS_WIDTH * weight with
+# probability 1 - exp(-CMS_DEPTH)
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+# Heavy-hitter candidates kept per bucket, by Count-Min estimate. Items outside the candidates
+# of every bucket of a range are not reported
+CANDIDATES = 200
+CANDIDATE_SORT = {"estimate": -1, "item": 1}
+
+
+def sketches_collection():
+    return get_database()[collection_sketches_name]
+
+
+def cms_columns(item):
+    """The Count-Min column of `item` in each row (one 32-bit slice of a 128-bit hash per row)."""
+    digest = hashlib.blake2b(str(item).encode(), digest_size=4 * CMS_DEPTH).digest()
+    return [int.from_bytes(digest[4 * row:4 * row + 4], "little") % CMS_WIDTH for row in range(CMS_DEPTH)]
+
+
+class CountMinSketch:
+    epsilon = math.e / CMS_WIDTH
+    delta = math.exp(-CMS_DEPTH)
+
+    def __init__(self):
+        self.table = np.zeros((CMS_DEPTH, CMS_WIDTH), dtype=np.int64)
+        self.weight = 0
+
+    @classmethod
+    def from_document(cls, document):
+        sketch = cls()
+        for row, cells in (document.get("cms") or {}).items():
+            if cells:
+                columns = np.fromiter(map(int, cells), dtype=np.int64, count=len(cells))
+                sketch.table[int(row), columns] = np.fromiter(cells.values(), dtype=np.int64, count=len(cells))
+        sketch.weight = document.get("weight", 0)
+        return sketch
+
+    def add(self, item, count=1):
+        self.table[np.arange(CMS_DEPTH), cms_columns(item)] += count
+        self.weight += count
+
+    def merge(self, other):
+        self.table += other.table
+        self.weight += other.weight
+        return self
+
+    def estimate(self, item):
+        return int(self.table[np.arange(CMS_DEPTH), cms_columns(item)].min())
+
+    def max_overcount(self):
+        return math.ceil(self.epsilon * self.weight)
+
+    def document(self):
+        return {str(row): {str(column): int(self.table[row, column]) for column in np.flatnonzero(self.table[row])}
+                for row in range(CMS_DEPTH)}
+
+
+class SketchBucket:
+    """Additions to one time bucket, written as one atomic update or as a whole document."""
+
+    def __init__(self):
+        self.items = Counter()  # Count-Min item -> count
+        self.candidates = {}  # Heavy-hitter candidate -> fields stored with it
+        self.areas = {}  # Badge number -> area names (day documents only)
+        self.names = {}  # Badge number -> [name, email] (day documents only)
+
+    def add(self, item, count=1, candidate=None):
+        self.items[item] += count
+        if candidate is not None:
+            self.candidates[item] = candidate
+
+    def add_area(self, badge_number, area):
+        self.areas.setdefault(badge_number, set()).add(area)
+
+    def merge(self, other):
+        self.items.update(other.items)
+        self.candidates.update(other.candidates)
+        for badge_number, areas in other.areas.items():
+            self.areas.setdefault(badge_number, set()).update(areas)
+        self.names.update(other.names)
+
+    def increments(self):
+        increments = Counter({"weight": sum(self.items.values())})
+        for item, count in self.items.items():
+            for row, column in enumerate(cms_columns(item)):
+                increments[f"cms.{row}.{column}"] += count
+        return dict(increments)
+
+    def update(self, kind, granularity, start):
+        update = {"$inc": self.increments(), "$setOnInsert": {"kind": kind, "granularity": granularity, "start": start}}
+        if granularity == DAY and self.areas:
+            update["$addToSet"] = {f"areas.{badge_number}": {"$each": sorted(areas)}
+                                   for badge_number, areas in self.areas.items()}
+        if granularity == DAY and self.names:
+            update["$set"] = {f"names.{badge_number}": name for badge_number, name in self.names.items()}
+        return update
+
+    def document(self, kind, granularity, start):
+        cms = CountMinSketch()
+        for item, count in self.items.items():
+            cms.add(item, count)
+        candidates = sorted(({"item": item, "estimate": cms.estimate(item), **fields} for item, fields in self.candidates.items()),
+                            key=lambda candidate: (-candidate["estimate"], candidate["item"]))
+        document = {"_id": bucket_id(kind, granularity, start), "kind": kind, "granularity": granularity, "start": start,
+                    "weight": cms.weight, "cms": cms.document(), "candidates": candidates[:CANDIDATES]}
+        if granularity == DAY and kind == OFFICERS:
+            document["areas"] = {badge_number: sorted(areas) for badge_number, areas in self.areas.items()}
+            document["names"] = self.names
+        return document
+
+
+def bucket_id(kind, granularity, start):
+    return f"{kind}:{granularity}:{start:%Y-%m-%d}"
+
+
+def _day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def hour_item(crm_cd, hour):
+    return f"{crm_cd}@{hour}"
+
+
+def range_filter(kind, range_start=None, range_end=None):
+    """Buckets covering [range_start, range_end): whole months where they fit, days at both ends (all time if None)."""
+    if range_start is None:
+        return {"kind": kind, "granularity": MONTH}
+    first_month = range_start if range_start.day == 1 else _next_month(range_start)
+    last_month = _month(range_end)
+    if first_month >= last_month:
+        return {"kind": kind, "granularity": DAY, "start": {"$gte": range_start, "$lt": range_end}}
+    return {"kind": kind, "$or": [
+        {"granularity": MONTH, "start": {"$gte": first_month, "$lt": last_month}},
+        {"granularity": DAY, "start": {"$gte": range_start, "$lt": first_month}},
+        {"granularity": DAY, "start": {"$gte": last_month, "$lt": range_end}},
+    ]}
+
+
+def sketch_range(start_date=None, end_date=None):
+    """[start, end) of the optional MM/DD/YYYY dates of an approx=true request ((None, None) for all time)."""
+    if not SKETCHES_ENABLED:
+        raise ValueError("Approximate mode is disabled (LAPD_SKETCHES=false).")
+    if not (start_date or end_date):
+        return None, None
+    return time_utils.day_range(start_date or end_date, end_date)
+
+
+async def _write_buckets(pending):
+    """
+    Add buffered day buckets to their day and month documents: one bulk update of the counters,
+    one read of the candidates' Count-Min cells and one bulk merge of the candidate lists.
+
+    Counters are $inc'ed and area sets $addToSet'ed, so concurrent writers never conflict.
+    """
+    buckets = {}  # (kind, granularity, start) -> SketchBucket
+    for (kind, day), bucket in pending.items():
+        for granularity, start in ((DAY, day), (MONTH, _month(day))):
+            buckets.setdefault((kind, granularity, start), SketchBucket()).merge(bucket)
+    collection = sketches_collection()
+    await collection.bulk_write([UpdateOne({"_id": bucket_id(*key)}, bucket.update(*key), upsert=True)
+                                 for key, bucket in buckets.items()], ordered=False)
+
+    # Rank the candidates by their Count-Min estimates after the update
+
+    buckets = {bucket_id(*key): bucket for key, bucket in buckets.items()}
+    cells = {_id: {item: cms_columns(item) for item in bucket.candidates} for _id, bucket in buckets.items() if bucket.candidates}
+    if not cells:
+        return
+    projection = {f"cms.{row}.{column}": 1 for items in cells.values() for columns in items.values()
+                  for row, column in enumerate(columns)}
+    documents = {document["_id"]: document
+                 async for document in collection.find({"_id": {"$in": list(cells)}}, projection)}
+    merges = []
+    for _id, items in cells.items():
+        cms = documents[_id]["cms"]
+        candidates = [{"item": item, "estimate": min(cms[str(row)][str(column)] for row, column in enumerate(columns)),
+                       **buckets[_id].candidates[item]}
+                      for item, columns in items.items()]
+        merges.append(UpdateOne({"_id": _id}, [{"$set": {
+            "candidates": merge_top_entries("candidates", candidates, CANDIDATE_SORT, "item", CANDIDATES)}}]))
+    await collection.bulk_write(merges, ordered=False)
+
+
+class SketchBuffer:
+    """
+    Write-behind buffer for the sketches: report and upvote writes only add to in-memory day
+    buckets, written every `flush_interval` seconds with three round trips whatever the traffic.
+
+    A failed flush is dropped rather than retried (a partial retry could count twice); the
+    sketches are approximate and `rebuild_sketches` recomputes them.
+    """
+
+    def __init__(self, flush_interval=SKETCH_FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending = {}  # (kind, day) -> SketchBucket
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def bucket(self, kind, day):
+        return self._pending.setdefault((kind, day), SketchBucket())
+
+    async def flush(self):
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                await _write_buckets(pending)
+            except Exception as e:
+                print(f"Sketch flush failed, {len(pending)} day buckets dropped (scripts/build_rollups.py rebuilds them): {e}")
+                return 0
+            return len(pending)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if SKETCHES_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Fed by the report and upvote routers, started with the API
+sketch_buffer = SketchBuffer()
+
+
+def add_report(bucket, report):
+    """Count a report's crime codes, for the whole day and for its hour of the day."""
+    minute_occ = report.get("minute_occ")
+    for crm_cd in (report.get("crm_codes") or {}).get("crime_codes", []):
+        bucket.add(crm_cd, candidate={})
+        if isinstance(minute_occ, int):
+            bucket.add(hour_item(crm_cd, minute_occ // 60))
+
+
+def record_report_sketches(reports):
+    """Add newly inserted reports to the buffered crime sketches of their day."""
+    if not SKETCHES_ENABLED:
+        return
+    for report in reports:
+        if isinstance(report.get("date_occ"), datetime):
+            add_report(sketch_buffer.bucket(CRIMES, report["date_occ"]), report)
+
+
+def record_upvote_sketches(upvote_docs, area_names):
+    """Add new upvotes to the buffered officer sketches of their day (`area_names`: report id -> area name)."""
+    if not SKETCHES_ENABLED:
+        return
+    for upvote_data in upvote_docs:
+        bucket = sketch_buffer.bucket(OFFICERS, _day(upvote_data["upvote_time"]))
+        badge_number = upvote_data["officer_badge_number"]
+        bucket.add(badge_number, candidate={"officer_name": upvote_data["officer_name"],
+                                            "officer_email": upvote_data["officer_email"]})
+        bucket.names[badge_number] = [upvote_data["officer_name"], upvote_data["officer_email"]]
+        if area_names.get(upvote_data["report_id"]) is not None:
+            bucket.add_area(badge_number, area_names[upvote_data["report_id"]])
+
+
+async def _buckets(kind, range_start, range_end, projection):
+    cursor = sketches_collection().find(range_filter(kind, range_start, range_end), projection).sort("start", ASCENDING)
+    return await cursor.to_list(length=None)
+
+
+def _count_min_bounds(cms, buckets, terms=1):
+    """Error bounds of a sum of `terms` Count-Min estimates."""
+    return {
+        "method": "count-min",
+        "buckets": buckets,
+        "max_overcount": terms * cms.max_overcount(),
+        "max_undercount": 0,
+        "confidence": round(max(0.0, 1 - terms * cms.delta), 4),
+        "note": "Estimates never undercount. Items that are not a heavy-hitter candidate of any bucket are omitted.",
+        "max_staleness_seconds": SKETCH_FLUSH_INTERVAL_SECONDS,
+    }
+
+
+async def crime_counts(start_minute, end_minute, range_start=None, range_end=None):
+    """
+    Approximate Query1 rows: reports per crime code in [start_minute, end_minute] for the days of
+    the range (all time if None), with error bounds.
+
+    Partial hours are widened to whole hours; the window actually counted is returned.
+    """
+    documents = await _buckets(CRIMES, range_start, range_end, {"weight": 1, "cms": 1, "candidates.item": 1})
+    cms, codes = CountMinSketch(), set()
+    for document in documents:
+        cms.merge(CountMinSketch.from_document(document))
+        codes.update(candidate["item"] for candidate in document.get("candidates", []))
+
+    whole_day = start_minute == 0 and end_minute == MINUTES_PER_DAY - 1
+    hours = range(start_minute // 60, end_minute // 60 + 1)
+    rows = []
+    for crm_cd in codes:
+        total = cms.estimate(crm_cd) if whole_day else sum(cms.estimate(hour_item(crm_cd, hour)) for hour in hours)
+        if total:
+            rows.append({"crm_cd": crm_cd, "total_reports": total})
+    bounds = _count_min_bounds(cms, len(documents), 1 if whole_day else len(hours))
+    bounds["counted_window"] = [f"{hours.start:02d}:00", f"{hours.stop - 1:02d}:59"]
+    return rows, bounds
+
+
+async def top_officers(range_start=None, range_end=None, limit=50):
+    """Approximate Query7 rows: officers with most upvotes cast in the range, with error bounds."""
+    documents = await _buckets(OFFICERS, range_start, range_end, {"weight": 1, "cms": 1, "candidates": 1})
+    cms, officers = CountMinSketch(), {}
+    for document in documents:
+        cms.merge(CountMinSketch.from_document(document))
+        officers.update((candidate["item"], candidate) for candidate in document.get("candidates", []))
+    rows = [{"officer_name": officer.get("officer_name"), "officer_email": officer.get("officer_email"),
+             "officer_badge_number": badge_number, "total_upvotes": cms.estimate(badge_number)}
+            for badge_number, officer in officers.items()]
+    rows.sort(key=lambda row: (-row["total_upvotes"], row["officer_badge_number"]))
+    return rows[:limit], _count_min_bounds(cms, len(documents))
+
+
+async def officer_area_counts(range_start=None, range_end=None, limit=50):
+    """Query8 rows: officers by distinct areas upvoted in the range, from the exact area sets of the day documents."""
+    query = {"kind": OFFICERS, "granularity": DAY}
+    if range_start is not None:
+        query["start"] = {"$gte": range_start, "$lt": range_end}
+    cursor = sketches_collection().find(query, {"areas": 1, "names": 1})
+    areas, names, documents = {}, {}, 0
+    async for document in cursor:
+        documents += 1
+        for badge_number, badge_areas in (document.get("areas") or {}).items():
+            areas.setdefault(badge_number, set()).update(badge_areas)
+        names.update(document.get("names") or {})
+    rows = []
+    for badge_number, badge_areas in areas.items():
+        officer_name, officer_email = names.get(badge_number, [None, None])
+        rows.append({"officer_name": officer_name, "officer_email": officer_email, "officer_badge_number": badge_number,
+                     "area_count": len(badge_areas)})
+    rows.sort(key=lambda row: (-row["area_count"], row["officer_badge_number"]))
+    bounds = {
+        "method": "exact",
+        "buckets": documents,
+        "max_error": 0,
+        "note": "Areas of the upvotes cast in the range, by upvote day.",
+        "max_staleness_seconds": SKETCH_FLUSH_INTERVAL_SECONDS,
+    }
+    return rows[:limit], bounds
+
+
+async def _rebuild_kind(kind, rows):
+    """
+    Replace the documents of `kind` from (day, fill(bucket)) rows sorted by day.
+
+    Day documents are written as their day ends and month documents as their month ends, so
+    only one month of buckets is held in memory.
+    """
+    collection = sketches_collection()
+    await collection.delete_many({"kind": kind})
+    documents, day, day_bucket, month_bucket = 0, None, None, None
+
+    async def flush(granularity, start, bucket):
+        await collection.insert_one(bucket.document(kind, granularity, start))
+        return 1
+
+    async for row_day, fill in rows:
+        if row_day != day:
+            if day_bucket is not None:
+                documents += await flush(DAY, day, day_bucket)
+                month_bucket.merge(day_bucket)
+                if _month(row_day) != _month(day):
+                    documents += await flush(MONTH, _month(day), month_bucket)
+                    month_bucket = None
+            day, day_bucket = row_day, SketchBucket()
+            month_bucket = month_bucket or SketchBucket()
+        fill(day_bucket)
+    if day_bucket is not None:
+        documents += await flush(DAY, day, day_bucket)
+        month_bucket.merge(day_bucket)
+        documents += await flush(MONTH, _month(day), month_bucket)
+    return documents
+
+
+async def _crime_rows():
+    pipeline = [
+        {"$match": {"date_occ": {"$type": "date"}}},
+        {"$unwind": "$crm_codes.crime_codes"},
+        {"$group": {
+            "_id": {"day": "$date_occ", "crm_cd": "$crm_codes.crime_codes",
+                    "hour": {"$floor": {"$divide": ["$minute_occ", 60]}}},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"_id.day": 1}},
+    ]
+    cursor = await get_database()[collection_reports_name].aggregate(pipeline, allowDiskUse=True)
+    async for row in cursor:
+        crm_cd, hour, count = row["_id"]["crm_cd"], row["_id"].get("hour"), row["count"]
+
+        def fill(bucket, crm_cd=crm_cd, hour=hour, count=count):
+            bucket.add(crm_cd, count, candidate={})
+            if hour is not None:
+                bucket.add(hour_item(crm_cd, int(hour)), count)
+        yield row["_id"]["day"], fill
+
+
+async def _officer_rows():
+    collection, upvotes_path, _, collection_name = officer_upvote_source()
+    area_name = "$area_name"  # Same area source as the officer activity view
+    if collection_name == collection_reports_name and is_compact():
+        area_name = label_expression("area", "$area")
+    pipeline = [
+        {"$unwind": f"${upvotes_path}"},
+        {"$group": {
+            "_id": {"day": {"$dateTrunc": {"date": f"${upvotes_path}.upvote_time", "unit": "day"}},
+                    "badge_number": f"${upvotes_path}.officer_badge_number"},
+            "officer_name": {"$last": f"${upvotes_path}.officer_name"},
+            "officer_email": {"$last": f"${upvotes_path}.officer_email"},
+            "count": {"$sum": 1},
+            "areas": {"$addToSet": area_name},
+        }},
+        {"$sort": {"_id.day": 1}},
+    ]
+    cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+    async for row in cursor:
+        def fill(bucket, row=row):
+            badge_number = row["_id"]["badge_number"]
+            bucket.add(badge_number, row["count"],
+                       candidate={"officer_name": row["officer_name"], "officer_email": row["officer_email"]})
+            bucket.names[badge_number] = [row["officer_name"], row["officer_email"]]
+            for area in row["areas"]:
+                if area is not None:
+                    bucket.add_area(badge_number, area)
+        yield row["_id"]["day"], fill
+
+
+async def rebuild_sketches():
+    """Recompute every sketch document from the reports and the stored upvotes."""
+    documents = await _rebuild_kind(CRIMES, _crime_rows())
+    documents += await _rebuild_kind(OFFICERS, _officer_rows())
+    await sketches_collection().create_index(SKETCH_BUCKET_KEY)
+    return documents
+
+
+async def ensure_sketches():
+    """Build the sketches once if they have never been built (called at startup)."""
+    if SKETCHES_ENABLED and await sketches_collection().estimated_document_count() == 0:
+        await rebuild_sketches()
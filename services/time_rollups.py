@@ -0,0 +1,97 @@
+import numpy as np
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from db import get_database, collection_reports_name
+from scripts.time_utils import MINUTES_PER_DAY
+
+# One document per crime code: {"_id": crm_cd, "prefix": [MINUTES_PER_DAY + 1 ints]}
+# prefix[m] is the number of (report, crime code) pairs that occurred before minute m of the day,
+# so the count for [start_minute, end_minute] is prefix[end_minute + 1] - prefix[start_minute].
+collection_time_rollups_name = "crime_time_rollups"
+
+
+def time_rollups_collection():
+    return get_database()[collection_time_rollups_name]
+
+
+async def rebuild_time_rollups():
+    """Build the prefix-sum arrays from `reports` with one aggregation over (crime code, minute)."""
+    pipeline = [
+        {"$match": {"minute_occ": {"$type": "int"}}},
+        {"$unwind": "$crm_codes.crime_codes"},
+        {"$group": {"_id": {"crm_cd": "$crm_codes.crime_codes", "minute": "$minute_occ"}, "count": {"$sum": 1}}},
+    ]
+    histograms = {}
+    cursor = await get_database()[collection_reports_name].aggregate(pipeline, allowDiskUse=True)
+    async for row in cursor:
+        histogram = histograms.setdefault(row["_id"]["crm_cd"], np.zeros(MINUTES_PER_DAY, dtype=np.int64))
+        histogram[row["_id"]["minute"]] += row["count"]
+
+    operations = []
+    for crm_cd, histogram in histograms.items():
+        prefix = np.concatenate(([0], np.cumsum(histogram))).tolist()
+        operations.append(ReplaceOne({"_id": crm_cd}, {"_id": crm_cd, "prefix": prefix}, upsert=True))
+
+    collection = time_rollups_collection()
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+    await collection.delete_many({"_id": {"$nin": list(histograms)}})  # Codes that no longer exist
+    return len(operations)
+
+
+async def ensure_time_rollups():
+    """Build the rollups once if they have never been built (called at startup)."""
+    if await time_rollups_collection().estimated_document_count() == 0:
+        await rebuild_time_rollups()
+
+
+async def record_reports_time(reports):
+    """
+    Incrementally add new reports: one merged $inc per crime code.
+
+    A report at minute m adds one to every prefix entry after m, so the increments of a batch
+    are the cumulative sum of its per-minute histogram.
+    """
+    histograms = {}
+    for report in reports:
+        minute_occ = report.get("minute_occ")
+        if minute_occ is None:
+            continue
+        for crm_cd in report["crm_codes"]["crime_codes"]:
+            histogram = histograms.setdefault(crm_cd, np.zeros(MINUTES_PER_DAY, dtype=np.int64))
+            histogram[minute_occ] += 1
+
+    collection = time_rollups_collection()
+    for crm_cd, histogram in histograms.items():
+        prefix = np.concatenate(([0], np.cumsum(histogram))).tolist()
+        increments = {f"prefix.{m}": value for m, value in enumerate(prefix) if value}
+        result = await collection.update_one({"_id": crm_cd}, {"$inc": increments})
+        if result.matched_count:
+            continue
+        # First reports for this code: create the array (a concurrent creator wins the race, then retry the $inc)
+        try:
+            await collection.insert_one({"_id": crm_cd, "prefix": prefix})
+        except DuplicateKeyError:
+            await collection.update_one({"_id": crm_cd}, {"$inc": increments})
+
+
+async def count_reports_between(start_minute, end_minute):
+    """
+    Number of reports per crime code in [start_minute, end_minute].
+
+    Reads two array elements per crime code, so the cost depends on the number of codes,
+    not on the number of reports.
+    """
+    if start_minute > end_minute:
+        return []
+    projection = {
+        "start": {"$arrayElemAt": ["$prefix", start_minute]},
+        "end": {"$arrayElemAt": ["$prefix", end_minute + 1]},
+    }
+    results = []
+    async for rollup in time_rollups_collection().find({}, projection):
+        total_reports = rollup["end"] - rollup["start"]
+        if total_reports > 0:
+            results.append({"crm_cd": rollup["_id"], "total_reports": total_reports})
+    return results
@@ -0,0 +1,118 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from config import UPVOTE_BUFFER_LIMIT, UPVOTE_FLUSH_INTERVAL_SECONDS, UPVOTE_FLUSH_MAX_PENDING
+from services.leaderboard import record_leaderboard_upvotes
+from services.query_cache import query_cache
+from services.upvote_store import REPORT_UPVOTE_COLLECTIONS, report_upvote_writes
+
+
+async def _write_unapplied(collection, operations):
+    """Unordered bulk write of `operations`; returns the ones that weren't applied."""
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        return [operations[error["index"]] for error in e.details.get("writeErrors", [])]
+    except Exception as e:
+        # No reply (e.g. a lost connection): which operations were applied is unknown, all are retried
+        print(f"Upvote flush to {collection.name} failed, will retry: {e}")
+        return operations
+    return []
+
+
+class ReportUpvoteBuffer:
+    """
+    Write-behind buffer for the per-report upvote counter and list.
+
+    Upvotes are still inserted into `upvotes` right away; only the report-side update is
+    buffered. Buffered upvotes are flushed as one merged update per report every
+    `flush_interval` seconds or as soon as `max_pending` upvotes are waiting, so report
+    counters are never more than about `flush_interval` seconds behind `upvotes`.
+
+    Only the operations a flush failed to apply are retried, so a partly written batch is
+    never counted twice. At most `limit` upvotes and failed operations are held; past it, new
+    report updates are dropped (the upvotes themselves are stored).
+    """
+
+    def __init__(self, flush_interval=UPVOTE_FLUSH_INTERVAL_SECONDS, max_pending=UPVOTE_FLUSH_MAX_PENDING,
+                 limit=UPVOTE_BUFFER_LIMIT):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.limit = limit
+        self._pending = []  # Upvotes not written to their reports yet
+        self._failed = []  # (collection, operation) a previous flush didn't apply
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def pending(self):
+        return len(self._pending) + len(self._failed)
+
+    async def add(self, upvote_docs):
+        room = max(self.limit - self.pending, 0)
+        if len(upvote_docs) > room:
+            print(f"⚠️ Upvote buffer full: {len(upvote_docs) - room} report updates dropped.")
+            upvote_docs = upvote_docs[:room]
+        self._pending.extend(upvote_docs)
+        if len(self._pending) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:  # The upvotes are stored; their report updates stay buffered
+                print(f"Upvote flush failed, will retry: {e}")
+
+    async def flush(self):
+        """Write every buffered upvote to its report. Operations that fail are kept for the next flush."""
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            failed, self._failed = self._failed, []
+            if not batch and not failed:
+                return 0
+            writes = {}  # collection name -> (collection, operations), retried operations first
+            for collection, operation in failed:
+                writes.setdefault(collection.name, (collection, []))[1].append(operation)
+            try:
+                for collection, operations in await report_upvote_writes(batch):
+                    writes.setdefault(collection.name, (collection, []))[1].extend(operations)
+            except Exception:
+                self._pending[:0] = batch  # Nothing of the batch was written: keep the order, retry it
+                self._failed[:0] = failed
+                raise
+            for collection, operations in writes.values():
+                self._failed += [(collection, operation) for operation in await _write_unapplied(collection, operations)]
+            # After the counters are written: a failure here must not replay the batch
+            await record_leaderboard_upvotes({upvote_data["report_id"] for upvote_data in batch})
+            query_cache.invalidate(*REPORT_UPVOTE_COLLECTIONS)
+            return len(batch)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Upvote flush failed, will retry: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:  # Shutdown goes on: the rest of the cleanup must still run
+            print(f"Final upvote flush failed: {e}")
+        if self.pending:
+            print(f"⚠️ {self.pending} buffered report upvote updates were not written.")
+
+
+# Shared by the upvote router; only started when UPVOTE_WRITE_BEHIND is enabled
+upvote_buffer = ReportUpvoteBuffer()
@@ -0,0 +1,132 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from config import UPVOTE_STORAGE, UPVOTE_BUCKET_SIZE, UPVOTE_RECENT_VOTERS
+from db import (reports_collection, upvote_buckets_collection, collection_reports_name,
+                collection_upvote_buckets_name)
+from services.reference_codes import report_area_name
+
+# Unique (officer, report) pair: duplicate votes are rejected by the insert itself
+UPVOTE_UNIQUE_KEY = [("officer_badge_number", ASCENDING), ("report_id", ASCENDING)]
+# Finds the open (not yet full) bucket of a report
+UPVOTE_BUCKET_KEY = [("report_id", ASCENDING), ("count", ASCENDING)]
+
+
+# Collections whose contents change when a report receives upvotes
+REPORT_UPVOTE_COLLECTIONS = (collection_reports_name, collection_upvote_buckets_name)
+
+
+def is_bucketed():
+    return UPVOTE_STORAGE == "bucketed"
+
+
+def officer_upvote_source():
+    """(collection, upvote array path, report id field, collection name) read by the officer analytics."""
+    if is_bucketed():
+        return upvote_buckets_collection(), "upvotes", "report_id", collection_upvote_buckets_name
+    return reports_collection(), "upvotes.list", "dr_no", collection_reports_name
+
+
+def upvote_document(upvote):
+    """Build the stored upvote document from a validated `Upvote`."""
+    return {
+        "_id": ObjectId(),  # Ensure unique ID
+        "officer_name": upvote.officer_name,
+        "officer_email": upvote.officer_email,
+        "officer_badge_number": upvote.officer_badge_number,
+        "report_id": upvote.report_id,
+        "upvote_time": datetime.utcnow()
+    }
+
+
+def recent_voter(upvote_data):
+    """Small voter summary kept on the report in bucketed mode."""
+    return {
+        "officer_name": upvote_data["officer_name"],
+        "officer_badge_number": upvote_data["officer_badge_number"],
+        "upvote_time": upvote_data["upvote_time"]
+    }
+
+
+def group_by_report(upvote_docs):
+    upvotes_by_report = {}
+    for upvote_data in upvote_docs:
+        upvotes_by_report.setdefault(upvote_data["report_id"], []).append(upvote_data)
+    return upvotes_by_report
+
+
+def report_upvote_update(report_upvotes):
+    """Merged update of a report for a batch of its new upvotes."""
+    if is_bucketed():
+        return {
+            "$inc": {"upvotes.count": len(report_upvotes)},
+            "$push": {"upvotes.recent": {  # Keep only the most recent voters
+                "$each": [recent_voter(upvote_data) for upvote_data in report_upvotes],
+                "$slice": -UPVOTE_RECENT_VOTERS
+            }}
+        }
+    return {
+        "$inc": {"upvotes.count": len(report_upvotes)},
+        "$addToSet": {"upvotes.list": {"$each": report_upvotes}}  # Prevent duplicate votes
+    }
+
+
+def bucket_operations(report_id, report_upvotes, area_name):
+    """
+    Append upvotes to the report's open bucket, starting a new one when it is full.
+
+    The upsert filter only matches a bucket with room for the whole batch, so a bucket
+    never holds more than UPVOTE_BUCKET_SIZE upvotes.
+    """
+    operations = []
+    for start in range(0, len(report_upvotes), UPVOTE_BUCKET_SIZE):
+        batch = report_upvotes[start:start + UPVOTE_BUCKET_SIZE]
+        operations.append(UpdateOne(
+            {"report_id": report_id, "count": {"$lte": UPVOTE_BUCKET_SIZE - len(batch)}},
+            {
+                "$push": {"upvotes": {"$each": batch}},
+                "$inc": {"count": len(batch)},
+                "$setOnInsert": {"area_name": area_name}  # Officer analytics group buckets by area
+            },
+            upsert=True
+        ))
+    return operations
+
+
+async def report_area_names(report_ids):
+    """dr_no -> area_name of the given reports (None for reports without an area)."""
+    cursor = reports_collection().find({"dr_no": {"$in": list(report_ids)}},
+                                       {"_id": 0, "dr_no": 1, "area": 1, "area_name": 1})
+    return {report["dr_no"]: report_area_name(report) async for report in cursor}
+
+
+async def report_upvote_writes(upvote_docs):
+    """
+    (collection, operations) writes applying upvotes to their reports: one merged counter (and list)
+    update per report, then the bucket appends in bucketed mode.
+
+    No operation depends on another, so each one can be retried on its own.
+    """
+    upvotes_by_report = group_by_report(upvote_docs)
+    if not upvotes_by_report:
+        return []
+    writes = [(reports_collection(), [
+        UpdateOne({"dr_no": report_id}, report_upvote_update(report_upvotes), upsert=True)
+        for report_id, report_upvotes in upvotes_by_report.items()
+    ])]
+    if is_bucketed():
+        area_names = await report_area_names(upvotes_by_report)
+        writes.append((upvote_buckets_collection(), [
+            operation
+            for report_id, report_upvotes in upvotes_by_report.items()
+            for operation in bucket_operations(report_id, report_upvotes, area_names.get(report_id))
+        ]))
+    return writes
+
+
+async def apply_report_upvotes(upvote_docs):
+    """Update the upvote counter (and list or buckets) of every affected report, one merged update per report."""
+    for collection, operations in await report_upvote_writes(upvote_docs):
+        await collection.bulk_write(operations, ordered=False)